@@ -1 +1 @@
- version = '0.4.12'
+ version = '0.5.0'
@@ -19,6 +19,21 @@ CACHE_DIR_ENV_VAR = "HELM_CACHE_HOME"
 AWS_CLI_TO_INSTALL = "awscli==1.19.35"
 CONFIG_DIR_ENV_VAR = "HELM_CONFIG_HOME"
 USE_EXTERNAL_RESOURCE = "use_external_resource"
+DESIRED_STATE_DIGEST = "desired_state_digest"
+DESIRED_STATE_REVISION = "desired_state_revision"
+UPGRADE_SKIPPED = "upgrade_skipped"
+RELEASES_FIELD = "releases"
+DEPENDS_ON_FIELD = "depends_on"
+MAX_CONCURRENCY = "max_concurrency"
+CLUSTER_CONCURRENCY = "cluster_concurrency"
+REPOSITORIES_FIELD = "repositories"
+REPO_UPDATE = "repo_update"
+HEALTH_REPORT = "health_report"
+PREFETCH = "prefetch"
+AWS_CLI_VENV_DIR = "aws-cli-venv"
+DEFAULT_OPERATION_TIMEOUT = 300
+HELM_RETRIES = "helm_retries"
+CONCURRENCY_LIMITS = "concurrency_limits"
 HELM_ENV_VARS_LIST = [DATA_DIR_ENV_VAR, CACHE_DIR_ENV_VAR,
                       CONFIG_DIR_ENV_VAR]
 AWS_ENV_VAR_LIST = ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY",
@@ -7,12 +7,31 @@ from nativeedge.exceptions import NonRecoverableError
 from nativeedge.utils import exception_to_error_cause
 
 from helm_sdk._compat import text_type
+from helm_sdk.retry import is_transient, is_unauthorized
+from helm_sdk.deadline import DeadlineExceeded
+from helm_sdk.circuit_breaker import CircuitOpenError
 from helm_sdk.kubernetes import Kubernetes
+from helm_sdk.kubeconfig import parse_kubeconfig
 
+from .token_cache import invalidate_token
 from .utils import (
     helm_from_ctx,
     get_values_file,
-    prepare_aws_env)
+    prepare_aws_env,
+    generate_eks_token,
+    operation_deadline,
+    store_retry_counts,
+    get_exec_credential_token)
+
+
+def retry_operation_on(error):
+    """
+    :return True if the operation should be retried on error instead of
+    failing: its deadline passed, the cluster is unreachable, or a helm
+    command still failed with a transient error after its retries.
+    """
+    return isinstance(error, (DeadlineExceeded, CircuitOpenError)) or \
+        is_transient(error)
 
 
 def with_kubernetes(fn):
@@ -23,7 +42,8 @@ def with_kubernetes(fn):
                     kwargs['ctx'].logger,
                     kwargs.get('host'),
                     kwargs.get('token'),
-                    kwargs.get('kubeconfig')
+                    kwargs.get('kubeconfig'),
+                    getattr(kwargs.get('helm'), 'deadline', None)
                 )
             }
         )
@@ -39,26 +59,37 @@ def with_helm(ignore_properties_values_file=False):
     path resides under properties->resource_config
     (used by upgrade release operation in order avoid collisions between node
     properties and user inputs).
+    The client gets the deadline of the operation, when it passes, or a
+    helm command fails with a transient error, the operation is retried
+    instead of failing.
     """
 
     def decorator(func):
         @wraps(func)
         def f(*args, **kwargs):
             ctx = kwargs['ctx']
+            # The budget starts before the values file, aws cli and exec
+            # credentials are prepared, they are part of the operation.
+            deadline = operation_deadline(ctx)
             with get_values_file(
                     ctx,
                     ignore_properties_values_file,
                     kwargs.get('values_file')) as values_file:
                 helm = helm_from_ctx(ctx)
+                helm.deadline = deadline
                 kwargs['helm'] = helm
                 kwargs['values_file'] = values_file
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
+                    if retry_operation_on(e):
+                        return ctx.operation.retry(text_type(e))
                     _, _, tb = sys.exc_info()
                     raise NonRecoverableError(
                         '{0}'.format(text_type(e)),
                         causes=[exception_to_error_cause(e, tb)])
+                finally:
+                    store_retry_counts(ctx, helm)
         return f
 
     return decorator
@@ -66,18 +97,45 @@ def with_helm(ignore_properties_values_file=False):
 
 def prepare_aws(func):
     """
-    This decorator prepares AWS environment.
-    Check if AWS CLI is needed in order to authenticate with kubernetes and
-    prepare the environment variables.
+    This decorator prepares AWS environment and exec credentials.
+    If the kubeconfig authenticates with `aws eks get-token`, generate the
+    token in-process. Otherwise, check if AWS CLI is needed in order to
+    authenticate with kubernetes, prepare the environment variables and run
+    the exec credential plugin once. The token is cached and passed on as
+    the bearer token for helm and kubernetes calls. The aws cli
+    installation and the plugin run are bounded by the operation deadline.
+    If the API server rejects a cached token, it is dropped from the cache
+    and the operation is retried with a new one.
+    Kubeconfig content is parsed once per process and passed to helm as a
+    file written once per content digest.
     """
     @wraps(func)
     def f(*args, **kwargs):
+        token = None
+        deadline = getattr(kwargs.get('helm'), 'deadline', None)
         kubeconfig = kwargs.get('kubeconfig')
-        if isinstance(kubeconfig, (dict, str)):
-            kwargs['env_vars'] = prepare_aws_env(kubeconfig)
+        if isinstance(kubeconfig, dict):
+            kubeconfig = kwargs['kubeconfig'] = parse_kubeconfig(
+                kubeconfig).path
+        if isinstance(kubeconfig, str):
+            if not kwargs.get('token'):
+                token = generate_eks_token(kubeconfig)
+            if not token:
+                kwargs['env_vars'] = prepare_aws_env(kubeconfig, deadline)
+            if not token and not kwargs.get('token'):
+                token = get_exec_credential_token(
+                    kubeconfig, kwargs['env_vars'], deadline)
+            if token:
+                kwargs['token'] = token
         try:
             return func(*args, **kwargs)
         except Exception as e:
+            if token and is_unauthorized(e) and invalidate_token(token):
+                return kwargs['ctx'].operation.retry(
+                    'The cached token was rejected, retrying with a new '
+                    'one: {0}'.format(text_type(e)))
+            if retry_operation_on(e):
+                raise
             _, _, tb = sys.exc_info()
             raise NonRecoverableError(
                 '{0}'.format(text_type(e)),
@@ -0,0 +1,191 @@
+# Copyright © 2024 Dell Inc. or its subsidiaries. All Rights Reserved.
+
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+from nativeedge.exceptions import HttpException
+from nativeedge_common_sdk.utils import get_deployment_dir
+
+RESOURCE_CACHE_DIR = 'helm_resource_cache'
+INDEX_FILE = 'index.json'
+LOCK_FILE = '.lock'
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class BlueprintResourceCache(object):
+    """
+    Per deployment cache of resources downloaded from the blueprint.
+    Blueprint resources don't change for a given blueprint ID, so an entry
+    is keyed by blueprint ID and resource path, and the file is stored by its
+    content digest. Entries of other blueprints (after deployment update) are
+    evicted, and the whole cache lives inside the deployment directory, so
+    it's removed together with the deployment. Without a deployment
+    directory, resources are downloaded on each call.
+    """
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.blueprint_id = ctx.blueprint.id
+        self._directory = None
+
+    @property
+    def directory(self):
+        """:return cache directory, empty if there is no deployment dir."""
+        if self._directory is None:
+            self._directory = ''
+            deployment_id = getattr(self.ctx.deployment, 'id', None)
+            try:
+                if deployment_id:
+                    self._directory = os.path.join(
+                        get_deployment_dir(deployment_id),
+                        RESOURCE_CACHE_DIR)
+            except Exception as e:
+                self.ctx.logger.debug(
+                    'No deployment directory, blueprint resources are not '
+                    'cached: {0}'.format(e))
+        return self._directory
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    @contextmanager
+    def _locked_index(self):
+        """Lock the index for concurrent operations of the deployment."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                index_path = os.path.join(self.directory, INDEX_FILE)
+                try:
+                    with open(index_path) as index_file:
+                        index = json.load(index_file)
+                except (IOError, OSError, ValueError):
+                    index = {}
+                original = json.dumps(index, sort_keys=True)
+                yield index
+                if json.dumps(index, sort_keys=True) != original:
+                    fd, temp_path = tempfile.mkstemp(dir=self.directory)
+                    with os.fdopen(fd, 'w') as index_file:
+                        json.dump(index, index_file)
+                    os.replace(temp_path, index_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _key(self, resource_path):
+        return hashlib.sha256(json.dumps(
+            [self.blueprint_id, resource_path]).encode('utf-8')).hexdigest()
+
+    def _is_valid(self, entry):
+        """Check the materialized file wasn't removed or modified."""
+        path = entry.get('path', '')
+        if not os.path.isfile(path):
+            return False
+        stat = os.stat(path)
+        if [stat.st_size, stat.st_mtime_ns] == entry.get('stat'):
+            return True
+        return file_digest(path) == entry.get('digest')
+
+    def _evict(self, index, keys):
+        in_use = set(entry.get('path') for key, entry in index.items()
+                     if key not in keys)
+        for key in keys:
+            path = index.pop(key).get('path')
+            if path and path not in in_use and os.path.isfile(path):
+                os.remove(path)
+
+    def _download(self, resource_path, missing_ok):
+        try:
+            return self.ctx.download_resource(resource_path)
+        except HttpException:
+            if not missing_ok:
+                raise
+            self.ctx.logger.debug(
+                '{0} not found inside blueprint package.'.format(
+                    resource_path))
+
+    def get(self, resource_path, suffix='', missing_ok=False):
+        """
+        Get local path of a blueprint resource, downloading it only if it
+        was not downloaded before for this blueprint.
+        :param resource_path: path of the resource in the blueprint.
+        :param suffix: suffix of the materialized file, e.g. '.yaml'.
+        :param missing_ok: return None if the resource is not in the
+        blueprint, the miss is cached as well.
+        :return path of the materialized file.
+        Raises the ctx.download_resource exception if it doesn't exist
+        and missing_ok is False.
+        """
+        if not self.enabled:
+            return self._download(resource_path, missing_ok)
+        key = self._key(resource_path)
+        with self._locked_index() as index:
+            self._evict(index, [k for k, entry in index.items()
+                                if entry.get('blueprint_id') !=
+                                self.blueprint_id])
+            entry = index.get(key)
+            if entry and entry.get('missing') and missing_ok:
+                return
+            if entry and not entry.get('missing') and self._is_valid(entry):
+                self.ctx.logger.debug(
+                    'Using cached blueprint resource {0}: {1}'.format(
+                        resource_path, entry['path']))
+                return entry['path']
+            fd, temp_path = tempfile.mkstemp(dir=self.directory)
+            os.close(fd)
+            try:
+                try:
+                    self.ctx.download_resource(
+                        resource_path, target_path=temp_path)
+                except HttpException:
+                    if not missing_ok:
+                        raise
+                    self.ctx.logger.debug(
+                        '{0} not found inside blueprint package.'.format(
+                            resource_path))
+                    index[key] = {
+                        'blueprint_id': self.blueprint_id,
+                        'missing': True,
+                    }
+                    return
+                digest = file_digest(temp_path)
+                path = os.path.join(self.directory, digest + suffix)
+                os.replace(temp_path, path)
+            finally:
+                if os.path.isfile(temp_path):
+                    os.remove(temp_path)
+            stat = os.stat(path)
+            index[key] = {
+                'blueprint_id': self.blueprint_id,
+                'resource_path': resource_path,
+                'digest': digest,
+                'path': path,
+                'stat': [stat.st_size, stat.st_mtime_ns],
+            }
+            return path
+
+    def evict(self, resource_path):
+        """Remove the resource of this blueprint from the cache."""
+        if not self.enabled:
+            return
+        key = self._key(resource_path)
+        with self._locked_index() as index:
+            if key in index:
+                self._evict(index, [key])
+
+    def clear(self):
+        if self.enabled and os.path.isdir(self.directory):
+            shutil.rmtree(self.directory, ignore_errors=True)
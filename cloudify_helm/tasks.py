@@ -1,25 +1,44 @@
 # Copyright © 2024 Dell Inc. or its subsidiaries. All Rights Reserved.
 
 import os
+import time
 from deepdiff import DeepDiff
 
 from urllib.parse import urlparse
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 from nativeedge_common_sdk.utils import get_deployment_dir
 from nativeedge_kubernetes_sdk.connection import decorators
 
+from helm_sdk.chart_cache import archive_flags
+from helm_sdk.repository import is_natively_refreshable
+from helm_sdk.flags import flag_key
+from helm_sdk.deadline import DeadlineExceeded
+from helm_sdk.exceptions import CloudifyHelmSDKError
+from helm_sdk.batch import (
+    ReleaseSpec,
+    ACTION_STATUS,
+    RESULT_SKIPPED,
+    ACTION_INSTALL,
+    ACTION_UPGRADE,
+    ACTION_UNINSTALL,
+    DEFAULT_MAX_WORKERS)
+
 from nativeedge.decorators import operation
 from nativeedge.exceptions import NonRecoverableError
 
 from .decorators import (with_helm, with_kubernetes, prepare_aws)
+from .resource_cache import BlueprintResourceCache
 from .utils import (
     get_binary,
     copy_binary,
+    create_venv,
     helm_from_ctx,
     get_release_name,
     is_using_existing,
     get_resource_config,
+    desired_state_digest,
     convert_string_to_dict,
     get_helm_executable_path,
     use_existing_repo_on_helm,
@@ -29,9 +48,20 @@ from .constants import (
     FLAGS_FIELD,
     VALUES_FILE,
     HELM_CONFIG,
+    REPO_UPDATE,
+    PREFETCH,
+    HEALTH_REPORT,
+    RELEASES_FIELD,
+    UPGRADE_SKIPPED,
+    MAX_CONCURRENCY,
     EXECUTABLE_PATH,
+    DEPENDS_ON_FIELD,
     HELM_ENV_VARS_LIST,
-    USE_EXTERNAL_RESOURCE)
+    REPOSITORIES_FIELD,
+    DESIRED_STATE_DIGEST,
+    CLUSTER_CONCURRENCY,
+    USE_EXTERNAL_RESOURCE,
+    DESIRED_STATE_REVISION)
 
 
 @operation
@@ -88,6 +118,45 @@ def check_status_binary(ctx, **_):
         executable_path))
 
 
+@operation
+def prefetch(ctx, **_):
+    """
+    Warm the caches of the helm client while other nodes are created: the
+    helm version, flag schemas, repository indexes and chart archives, and
+    the AWS CLI virtualenv. Failures are reported, not raised, release
+    operations fetch what is missing.
+    """
+    config = ctx.node.properties.get(PREFETCH) or {}
+    if not config:
+        return
+    helm = helm_from_ctx(ctx)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # The virtualenv is created with the operation context, which is
+        # bound to this thread, so the helm downloads run next to it.
+        future = executor.submit(
+            helm.prefetch,
+            charts=config.get('charts'),
+            max_workers=config.get(MAX_CONCURRENCY) or DEFAULT_MAX_WORKERS)
+        aws_cli = None
+        if config.get('aws_cli'):
+            start = time.monotonic()
+            try:
+                create_venv()
+                aws_cli = {'status': 'succeeded', 'error': None}
+            except Exception as e:
+                aws_cli = {'status': 'failed', 'error': str(e)}
+            aws_cli['duration'] = round(time.monotonic() - start, 3)
+        results = future.result()
+    if aws_cli:
+        results['aws_cli'] = aws_cli
+    for name, result in sorted(results.items()):
+        log = ctx.logger.warning if result['error'] else ctx.logger.info
+        log('Prefetch {0} {1} in {2}s{3}'.format(
+            name, result['status'], result['duration'],
+            ': ' + result['error'] if result['error'] else '.'))
+    ctx.instance.runtime_properties[PREFETCH] = results
+
+
 def prepare_args(resource_config, flags=None, max_sleep_time=None):
     """
     Prepare arguments dictionary to helm  sdk function(like:helm.install,
@@ -105,9 +174,12 @@ def prepare_args(resource_config, flags=None, max_sleep_time=None):
     all_flags = args_dict[FLAGS_FIELD] + flags
     args_dict[FLAGS_FIELD] = []
     # de-duplicate
+    seen = set()
     for value in all_flags:
-        if value in args_dict[FLAGS_FIELD]:
+        key = flag_key(value)
+        if key in seen:
             continue
+        seen.add(key)
         args_dict[FLAGS_FIELD].append(value)
     if 'additional_args' not in args_dict:
         additional_args = {
@@ -118,13 +190,25 @@ def prepare_args(resource_config, flags=None, max_sleep_time=None):
 
 
 @contextmanager
-def install_target(ctx, url, args_dict):
+def install_target(ctx, url, args_dict, helm=None):
     ctx.logger.debug(
         "install_target with {url}".format(url=url))
     if url.path and not any([url.path.endswith('.tgz'),
                              url.path.endswith('.zip'),
                              url.path.endswith('.tar.gz')]):
         # this is a <repo>/<chart>
+        if helm and not url.scheme:
+            try:
+                cached = helm.cached_chart(
+                    args_dict.get('chart'), args_dict.get(FLAGS_FIELD))
+            except CloudifyHelmSDKError as e:
+                ctx.logger.debug(
+                    'Unable to cache chart, helm fetches it: {0}'.format(e))
+                cached = None
+            if cached:
+                args_dict['chart'] = cached
+                args_dict[FLAGS_FIELD] = archive_flags(
+                    args_dict.get(FLAGS_FIELD))
         yield args_dict
     elif url.path and url.scheme.startswith("http"):
         # let helm use the url
@@ -132,13 +216,97 @@ def install_target(ctx, url, args_dict):
     elif url.path and '' in url.scheme:
         # use the local file as input and create the copy
         # resources/package.tgz
-        source_tmp_path = ctx.download_resource(url.path)
+        source_tmp_path = BlueprintResourceCache(ctx).get(
+            url.path, suffix='-' + os.path.basename(url.path))
         ctx.logger.debug('Downloaded temporary source path {}'
                          .format(source_tmp_path))
         args_dict['chart'] = source_tmp_path
         yield args_dict
 
 
+def resolve_chart(ctx, helm, args_dict):
+    """
+    :return (repository URL, index entry) of the chart version helm
+    installs or upgrades to, None if it can't be resolved.
+    """
+    try:
+        return helm.resolve_chart(
+            args_dict.get('chart'), args_dict.get(FLAGS_FIELD))
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        ctx.logger.debug('Unable to resolve chart {0}: {1}'.format(
+            args_dict.get('chart'), e))
+
+
+def upgrade_unless_up_to_date(ctx, helm, release_name, digest, **kwargs):
+    """
+    Execute helm upgrade, unless the desired state digest is the one of the
+    revision we deployed and the release is still in deployed status.
+    :param ctx: nativeedge context.
+    :param helm: helm client object.
+    :param release_name: name of the release.
+    :param digest: desired state digest, see utils.desired_state_digest,
+    None never skips.
+    :return output of `helm upgrade` command, or of `helm status` if the
+    upgrade was skipped.
+    """
+    runtime_properties = ctx.instance.runtime_properties
+    runtime_properties[UPGRADE_SKIPPED] = False
+    if digest and runtime_properties.get(DESIRED_STATE_DIGEST) == digest:
+        try:
+            helm_state = helm.status(release_name, **kwargs)
+        except Exception as e:
+            ctx.logger.debug(
+                'Unable to get status of {0}: {1}'.format(release_name, e))
+            helm_state = {}
+        if helm_state.get('info', {}).get('status') == 'deployed' and \
+                helm_state.get('version') == runtime_properties.get(
+                    DESIRED_STATE_REVISION):
+            ctx.logger.info(
+                'Release {0} revision {1} is already in the desired state, '
+                'skipping helm upgrade.'.format(
+                    release_name, helm_state.get('version')))
+            runtime_properties[UPGRADE_SKIPPED] = True
+            return helm_state
+    return helm.upgrade(release_name, **kwargs)
+
+
+def install_unless_deployed(ctx, helm, release_name, **kwargs):
+    """
+    Execute helm install, unless a previous attempt of the operation, e.g.
+    one retried when its deadline passed, already deployed the release.
+    :param ctx: nativeedge context.
+    :param helm: helm client object.
+    :param release_name: name of the release.
+    :return output of `helm install` command, or of `helm status` if the
+    install was skipped.
+    """
+    runtime_properties = ctx.instance.runtime_properties
+    runtime_properties[UPGRADE_SKIPPED] = False
+    if ctx.operation.retry_number:
+        try:
+            helm_state = helm.status(release_name, **kwargs)
+        except Exception as e:
+            ctx.logger.debug(
+                'Unable to get status of {0}: {1}'.format(release_name, e))
+            helm_state = {}
+        if helm_state.get('info', {}).get('status') == 'deployed':
+            ctx.logger.info(
+                'Release {0} was deployed by a previous attempt, skipping '
+                'helm install.'.format(release_name))
+            runtime_properties[UPGRADE_SKIPPED] = True
+            return helm_state
+    return helm.install(release_name, **kwargs)
+
+
+def store_desired_state(ctx, digest, helm_state):
+    """Store desired state digest with the revision it was deployed as."""
+    ctx.instance.runtime_properties[DESIRED_STATE_DIGEST] = digest
+    ctx.instance.runtime_properties[DESIRED_STATE_REVISION] = \
+        helm_state.get('version')
+
+
 @operation
 @with_helm()
 def add_repo(ctx, helm, **kwargs):
@@ -195,6 +363,12 @@ def show_chart(helm, release_name, repo_url):
     type: application
     version: x.x.x
     """
+    try:
+        return helm.repo_chart(release_name, repo_url)
+    except CloudifyHelmSDKError as e:
+        helm.logger.debug(
+            'Reading the repository index failed, falling back to helm show '
+            'chart: {0}'.format(e))
     output = helm.show_chart(release_name, repo_url)
     return convert_string_to_dict(output)
 
@@ -247,18 +421,76 @@ def inject_env_properties(ctx, **_):
             dir_property_name] = value
 
 
+def update_repos_concurrently(ctx, helm, names, flags=None,
+                              max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Update the index of each repository concurrently. Indexes of HTTP(S)
+    repositories without credentials are refreshed with conditional
+    requests, one per repository, the other repositories are updated by
+    one `helm repo update`.
+    Repositories of the same helm config share the index cache, each
+    repository writes its own index file.
+    :param names: repository names.
+    :return dictionary of repository name to status, error, duration and
+    whether the index was modified.
+    """
+    def update(names):
+        # Each thread uses its own client, execute updates the environment.
+        client = helm.copy()
+        start = time.monotonic()
+        try:
+            refreshed = client.repo_update(flags=flags, names=names) or {}
+        except Exception as e:
+            return [{'status': 'failed', 'error': str(e),
+                     'duration': round(time.monotonic() - start, 3),
+                     'modified': None} for _ in names]
+        return [{'status': 'succeeded', 'error': None,
+                 'duration': round(time.monotonic() - start, 3),
+                 'modified': getattr(refreshed.get(name), 'modified', None)}
+                for name in names]
+
+    names = sorted(set(names))
+    native = [name for name in names
+              if is_natively_refreshable(helm.repo_entry(name) or {})]
+    groups = [[name] for name in native]
+    others = [name for name in names if name not in native]
+    if others:
+        groups.append(others)
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for group, group_results in zip(groups, executor.map(update, groups)):
+            results.update(zip(group, group_results))
+    for name, result in results.items():
+        ctx.logger.info('Repository {0} update {1} in {2}s.'.format(
+            name, result['status'], result['duration']))
+    return results
+
+
 @operation
 def update_repo(ctx, **kwargs):
     helm = helm_from_ctx(ctx)
-    helm.repo_update(flags=kwargs.get(FLAGS_FIELD))
+    names = kwargs.get(REPOSITORIES_FIELD)
+    if names:
+        results = update_repos_concurrently(
+            ctx, helm, names, kwargs.get(FLAGS_FIELD),
+            kwargs.get(MAX_CONCURRENCY) or DEFAULT_MAX_WORKERS)
+        ctx.instance.runtime_properties[REPO_UPDATE] = results
+        failed = dict((name, result['error'])
+                      for name, result in results.items()
+                      if result['error'])
+        if failed:
+            raise NonRecoverableError(
+                'Failed to update repositories: {0}'.format(failed))
+    else:
+        helm.repo_update(flags=kwargs.get(FLAGS_FIELD))
     ctx.instance.runtime_properties['repo_list'] = helm.repo_list()
 
 
 @operation
 @decorators.with_connection_details
 @with_helm()
-@with_kubernetes
 @prepare_aws
+@with_kubernetes
 def install_release(ctx,
                     helm,
                     kubernetes,
@@ -287,10 +519,16 @@ def install_release(ctx,
     url = urlparse(args_dict.get('chart', None))
     release_name = get_release_name(args_dict)
 
-    with install_target(ctx, url, args_dict) as args_dict:
+    with install_target(ctx, url, args_dict, helm) as args_dict:
+        digest = desired_state_digest(
+            release_name, args_dict, values_file, host,
+            resolve_chart(ctx, helm, args_dict))
         if ctx.workflow_id == 'update':
-            output = helm.upgrade(
+            output = upgrade_unless_up_to_date(
+                ctx,
+                helm,
                 release_name,
+                digest,
                 values_file=values_file,
                 kubeconfig=kubeconfig,
                 token=token,
@@ -299,7 +537,9 @@ def install_release(ctx,
                 ca_file=ca_file,
                 **args_dict)
         else:
-            output = helm.install(
+            output = install_unless_deployed(
+                ctx,
+                helm,
                 release_name,
                 values_file=values_file,
                 kubeconfig=kubeconfig,
@@ -308,18 +548,22 @@ def install_release(ctx,
                 additional_env=env_vars,
                 ca_file=ca_file,
                 **args_dict)
-        ctx.instance.runtime_properties['install_output'] = output
-        helm_state = helm.status(
-            release_name,
-            values_file=values_file,
-            kubeconfig=kubeconfig,
-            token=token,
-            apiserver=host,
-            additional_env=env_vars,
-            ca_file=ca_file,
-            **args_dict,
-        )
+        if ctx.instance.runtime_properties[UPGRADE_SKIPPED]:
+            helm_state = output
+        else:
+            ctx.instance.runtime_properties['install_output'] = output
+            helm_state = helm.status(
+                release_name,
+                values_file=values_file,
+                kubeconfig=kubeconfig,
+                token=token,
+                apiserver=host,
+                additional_env=env_vars,
+                ca_file=ca_file,
+                **args_dict,
+            )
         ctx.instance.runtime_properties['status_output'] = helm_state
+        store_desired_state(ctx, digest, helm_state)
         k8s_state = kubernetes.multiple_resource_status(helm_state)
         ctx.instance.runtime_properties['kubernetes_status'] = k8s_state
 
@@ -355,13 +599,15 @@ def uninstall_release(ctx,
         additional_env=env_vars,
         ca_file=ca_file,
         **args_dict)
+    if resource_config.get(VALUES_FILE):
+        BlueprintResourceCache(ctx).evict(resource_config[VALUES_FILE])
 
 
 @operation
 @decorators.with_connection_details
 @with_helm(ignore_properties_values_file=True)
-@with_kubernetes
 @prepare_aws
+@with_kubernetes
 def upgrade_release(ctx,
                     helm,
                     kubernetes,
@@ -394,8 +640,13 @@ def upgrade_release(ctx,
         ctx.node.properties.get('max_sleep_time')
     )
     release_name = get_release_name(args_dict)
-    output = helm.upgrade(
+    digest = desired_state_digest(release_name, args_dict, values_file, host,
+                                  resolve_chart(ctx, helm, args_dict))
+    output = upgrade_unless_up_to_date(
+        ctx,
+        helm,
         release_name,
+        digest,
         values_file=values_file,
         kubeconfig=kubeconfig,
         token=token,
@@ -404,18 +655,22 @@ def upgrade_release(ctx,
         ca_file=ca_file,
         **args_dict,
     )
-    ctx.instance.runtime_properties['install_output'] = output
-    helm_state = helm.status(
-        release_name=release_name,
-        values_file=values_file,
-        kubeconfig=kubeconfig,
-        token=token,
-        apiserver=host,
-        additional_env=env_vars,
-        ca_file=ca_file,
-        **args_dict,
-    )
+    if ctx.instance.runtime_properties[UPGRADE_SKIPPED]:
+        helm_state = output
+    else:
+        ctx.instance.runtime_properties['install_output'] = output
+        helm_state = helm.status(
+            release_name=release_name,
+            values_file=values_file,
+            kubeconfig=kubeconfig,
+            token=token,
+            apiserver=host,
+            additional_env=env_vars,
+            ca_file=ca_file,
+            **args_dict,
+        )
     ctx.instance.runtime_properties['status_output'] = helm_state
+    store_desired_state(ctx, digest, helm_state)
     k8s_state = kubernetes.multiple_resource_status(helm_state)
     ctx.instance.runtime_properties['kubernetes_status'] = k8s_state
 
@@ -423,8 +678,8 @@ def upgrade_release(ctx,
 @operation
 @decorators.with_connection_details
 @with_helm(ignore_properties_values_file=True)
-@with_kubernetes
 @prepare_aws
+@with_kubernetes
 def check_release_status(ctx,
                          helm,
                          kubernetes,
@@ -498,8 +753,8 @@ def check_release_status(ctx,
 @operation
 @decorators.with_connection_details
 @with_helm(ignore_properties_values_file=True)
-@with_kubernetes
 @prepare_aws
+@with_kubernetes
 def check_release_drift(ctx,
                         helm,
                         kubernetes,
@@ -592,3 +847,283 @@ def push_chart(ctx, helm, **kwargs):
         if 'set_values' in args_dict:
             del args_dict['set_values']
         helm.push(**args_dict)
+
+
+def release_set_specs(ctx, action, flags=None, **helm_kwargs):
+    """
+    Build batch specs for the releases of a ReleaseSet node.
+    Values files and packaged charts from the blueprint are downloaded once
+    per deployment, see resource_cache.
+    :param ctx: nativeedge context.
+    :param action: batch action, install, upgrade, uninstall or status.
+    :param flags: operation flags, added to the flags of every release.
+    :param helm_kwargs: connection parameters shared by all releases.
+    :return list of ReleaseSpec.
+    """
+    resource_config = get_resource_config()
+    cache = BlueprintResourceCache(ctx)
+    specs = []
+    for release in resource_config.get(RELEASES_FIELD) or []:
+        args_dict = prepare_args(
+            {FLAGS_FIELD: (resource_config.get(FLAGS_FIELD) or []) +
+             (release.get(FLAGS_FIELD) or [])},
+            flags,
+            ctx.node.properties.get('max_sleep_time'))
+        if action == ACTION_UNINSTALL:
+            args_dict[FLAGS_FIELD] = [
+                flag for flag in args_dict[FLAGS_FIELD]
+                if not isinstance(flag, dict) or
+                flag.get('name') != 'version']
+        chart = release.get('chart')
+        url = urlparse(chart or '')
+        if url.path and not url.scheme and not os.path.isfile(chart) and \
+                url.path.endswith(('.tgz', '.zip', '.tar.gz')):
+            chart = cache.get(
+                url.path, suffix='-' + os.path.basename(url.path))
+        values_file = release.get(VALUES_FILE)
+        if values_file and not os.path.isfile(values_file):
+            values_file = cache.get(values_file, suffix='.yaml')
+        specs.append(ReleaseSpec(
+            get_release_name(dict(release)),
+            chart,
+            values_file=values_file,
+            set_values=release.get('set_values'),
+            flags=args_dict[FLAGS_FIELD],
+            depends_on=release.get(DEPENDS_ON_FIELD),
+            set_values_as_file=release.get('set_values_as_file', False),
+            additional_args=args_dict['additional_args'],
+            **helm_kwargs))
+    return specs
+
+
+def run_release_set(ctx, helm, action, flags=None, **helm_kwargs):
+    """
+    Run a helm action on all releases of a ReleaseSet node in one batch.
+    Compact per release state is stored in the "releases" runtime property.
+    :return OrderedDict of release name to ReleaseResult.
+    """
+    resource_config = get_resource_config()
+    specs = release_set_specs(ctx, action, flags, **helm_kwargs)
+    state = dict(ctx.instance.runtime_properties.get(RELEASES_FIELD) or {})
+    if action == ACTION_UNINSTALL:
+        # Releases that were never attempted don't exist.
+        specs = [spec for spec in specs
+                 if state.get(spec.name, {}).get('status') !=
+                 RESULT_SKIPPED]
+    max_workers = resource_config.get(MAX_CONCURRENCY) or \
+        DEFAULT_MAX_WORKERS
+    results = helm.batch(
+        specs,
+        max_workers=max_workers,
+        cluster_limit=resource_config.get(CLUSTER_CONCURRENCY) or
+        max_workers).run(action)
+    for name, result in results.items():
+        entry = result.to_dict()
+        del entry['name']
+        output = result.output if isinstance(result.output, dict) else {}
+        entry['revision'] = output.get('version')
+        entry['release_status'] = output.get('info', {}).get('status')
+        if entry['duration'] is not None:
+            entry['duration'] = round(entry['duration'], 2)
+        state[name] = entry
+    if action == ACTION_UNINSTALL:
+        for name, result in results.items():
+            if result.succeeded:
+                del state[name]
+    ctx.instance.runtime_properties[RELEASES_FIELD] = state
+    ctx.logger.info('{0} of releases: {1}'.format(
+        action, dict((name, result.status)
+                     for name, result in results.items())))
+    failed = [name for name, result in results.items()
+              if not result.succeeded]
+    if failed:
+        raise NonRecoverableError(
+            'helm {0} failed for releases {1}: {2}'.format(
+                action, failed, dict(
+                    (name, str(results[name].error)) for name in failed)))
+    return results
+
+
+@operation
+@decorators.with_connection_details
+@with_helm()
+@prepare_aws
+def install_release_set(ctx,
+                        helm,
+                        kubeconfig=None,
+                        token=None,
+                        env_vars=None,
+                        ca_file=None,
+                        host=None,
+                        **kwargs):
+    """
+    Install all releases of a ReleaseSet node, or upgrade them under the
+    update workflow.
+    """
+    action = ACTION_UPGRADE if ctx.workflow_id == 'update' \
+        else ACTION_INSTALL
+    run_release_set(ctx,
+                    helm,
+                    action,
+                    kwargs.get(FLAGS_FIELD),
+                    kubeconfig=kubeconfig,
+                    token=token,
+                    apiserver=host,
+                    ca_file=ca_file,
+                    additional_env=env_vars)
+
+
+@operation
+@decorators.with_connection_details
+@with_helm()
+@prepare_aws
+def upgrade_release_set(ctx,
+                        helm,
+                        kubeconfig=None,
+                        token=None,
+                        env_vars=None,
+                        ca_file=None,
+                        host=None,
+                        **kwargs):
+    run_release_set(ctx,
+                    helm,
+                    ACTION_UPGRADE,
+                    kwargs.get(FLAGS_FIELD),
+                    kubeconfig=kubeconfig,
+                    token=token,
+                    apiserver=host,
+                    ca_file=ca_file,
+                    additional_env=env_vars)
+
+
+@operation
+@decorators.with_connection_details
+@with_helm()
+@prepare_aws
+def check_release_set_status(ctx,
+                             helm,
+                             kubeconfig=None,
+                             token=None,
+                             env_vars=None,
+                             ca_file=None,
+                             host=None,
+                             **kwargs):
+    results = run_release_set(ctx,
+                              helm,
+                              ACTION_STATUS,
+                              kwargs.get(FLAGS_FIELD),
+                              kubeconfig=kubeconfig,
+                              token=token,
+                              apiserver=host,
+                              ca_file=ca_file,
+                              additional_env=env_vars)
+    not_deployed = dict(
+        (name, result.output.get('info', {}).get('status'))
+        for name, result in results.items()
+        if result.output.get('info', {}).get('status') != 'deployed')
+    if not_deployed:
+        raise RuntimeError(
+            'Unexpected Helm Status. Expected "deployed", '
+            'received: {}'.format(not_deployed))
+
+
+@operation
+@decorators.with_connection_details
+@with_helm()
+@prepare_aws
+def uninstall_release_set(ctx,
+                          helm,
+                          kubeconfig=None,
+                          token=None,
+                          env_vars=None,
+                          ca_file=None,
+                          host=None,
+                          **kwargs):
+    run_release_set(ctx,
+                    helm,
+                    ACTION_UNINSTALL,
+                    kwargs.get(FLAGS_FIELD),
+                    kubeconfig=kubeconfig,
+                    token=token,
+                    apiserver=host,
+                    ca_file=ca_file,
+                    additional_env=env_vars)
+
+
+def release_health(helm, kubernetes, release, max_workers=1, **helm_kwargs):
+    """
+    Read the helm status and the live resources of one release.
+    :param helm: helm client, copied so concurrent calls don't share it.
+    :param kubernetes: kubernetes client, shared by concurrent calls.
+    :param release: dictionary with name and flags.
+    :return health dictionary of the release.
+    """
+    client = helm.copy()
+    start = time.monotonic()
+    report = {'name': release['name'],
+              'status': None,
+              'healthy': False,
+              'errors': []}
+    try:
+        helm_state = client.status(release_name=release['name'],
+                                   flags=release.get(FLAGS_FIELD),
+                                   **helm_kwargs)
+        report['status'] = helm_state.get('info', {}).get('status')
+        _, report['errors'] = kubernetes.multiple_resource_check_status(
+            helm_state, max_workers)
+        report['healthy'] = \
+            report['status'] == 'deployed' and not report['errors']
+    except Exception as e:
+        report['errors'].append(str(e))
+    report['duration'] = round(time.monotonic() - start, 3)
+    return report
+
+
+@operation
+@decorators.with_connection_details
+@with_helm(ignore_properties_values_file=True)
+@prepare_aws
+@with_kubernetes
+def check_releases_health(ctx,
+                          helm,
+                          kubernetes,
+                          kubeconfig=None,
+                          token=None,
+                          env_vars=None,
+                          ca_file=None,
+                          host=None,
+                          **kwargs):
+    """
+    Check the health of many releases of the same cluster, using the
+    connection of this node instance. Releases and their resources are read
+    concurrently with one shared kubernetes client.
+    The report is stored in the health_report runtime property, unhealthy
+    releases don't fail the operation.
+    """
+    releases = kwargs.get(RELEASES_FIELD) or []
+    max_workers = kwargs.get(MAX_CONCURRENCY) or DEFAULT_MAX_WORKERS
+
+    def health(release):
+        return release_health(helm,
+                              kubernetes,
+                              release,
+                              max_workers,
+                              kubeconfig=kubeconfig,
+                              token=token,
+                              apiserver=host,
+                              additional_env=env_vars,
+                              ca_file=ca_file)
+
+    # Build the API client once, before the releases share it.
+    kubernetes.kubeconfig
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        reports = list(executor.map(health, releases))
+    report = {}
+    for release, release_report in zip(releases, reports):
+        report[release['instance']] = release_report
+        ctx.logger.info('Release {0} of {1} {2} in {3}s.'.format(
+            release['name'],
+            release['instance'],
+            'healthy' if release_report['healthy'] else 'unhealthy',
+            release_report['duration']))
+    ctx.instance.runtime_properties[HEALTH_REPORT] = report
@@ -0,0 +1,112 @@
+# Copyright © 2024 Dell Inc. or its subsidiaries. All Rights Reserved.
+
+import os
+import mock
+import shutil
+import tempfile
+import unittest
+
+from nativeedge.exceptions import HttpException
+
+from .. import resource_cache
+
+
+class TestBlueprintResourceCache(unittest.TestCase):
+
+    def setUp(self):
+        super(TestBlueprintResourceCache, self).setUp()
+        self.deployment_dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(
+            resource_cache, 'get_deployment_dir',
+            return_value=self.deployment_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.content = {'values.yaml': b'replicaCount: 1\n'}
+
+    def tearDown(self):
+        shutil.rmtree(self.deployment_dir)
+        super(TestBlueprintResourceCache, self).tearDown()
+
+    def mock_ctx(self, blueprint_id='bp'):
+        ctx = mock.Mock()
+        ctx.blueprint.id = blueprint_id
+        ctx.deployment.id = 'dep'
+
+        def download_resource(resource_path, target_path):
+            if resource_path not in self.content:
+                raise HttpException(resource_path, 404, 'Not found')
+            with open(target_path, 'wb') as f:
+                f.write(self.content[resource_path])
+            return target_path
+        ctx.download_resource.side_effect = download_resource
+        return ctx
+
+    def test_get_downloads_once(self):
+        ctx = self.mock_ctx()
+        path = resource_cache.BlueprintResourceCache(ctx).get(
+            'values.yaml', suffix='.yaml')
+        self.assertTrue(path.endswith('.yaml'))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), self.content['values.yaml'])
+        # Another operation of the same deployment.
+        self.assertEqual(
+            resource_cache.BlueprintResourceCache(ctx).get(
+                'values.yaml', suffix='.yaml'), path)
+        ctx.download_resource.assert_called_once()
+
+    def test_get_downloads_again_when_file_modified(self):
+        ctx = self.mock_ctx()
+        cache = resource_cache.BlueprintResourceCache(ctx)
+        path = cache.get('values.yaml')
+        with open(path, 'wb') as f:
+            f.write(b'modified: true\n')
+        path = cache.get('values.yaml')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), self.content['values.yaml'])
+        self.assertEqual(ctx.download_resource.call_count, 2)
+
+    def test_get_evicts_other_blueprints(self):
+        path = resource_cache.BlueprintResourceCache(
+            self.mock_ctx('bp1')).get('values.yaml')
+        self.content['values.yaml'] = b'replicaCount: 2\n'
+        new_path = resource_cache.BlueprintResourceCache(
+            self.mock_ctx('bp2')).get('values.yaml')
+        self.assertNotEqual(path, new_path)
+        self.assertFalse(os.path.exists(path))
+
+    def test_evict(self):
+        ctx = self.mock_ctx()
+        cache = resource_cache.BlueprintResourceCache(ctx)
+        path = cache.get('values.yaml')
+        cache.evict('values.yaml')
+        self.assertFalse(os.path.exists(path))
+        cache.get('values.yaml')
+        self.assertEqual(ctx.download_resource.call_count, 2)
+
+    def test_get_missing_resource_cached(self):
+        ctx = self.mock_ctx()
+        cache = resource_cache.BlueprintResourceCache(ctx)
+        self.assertIsNone(cache.get('ca.crt', missing_ok=True))
+        self.assertIsNone(cache.get('ca.crt', missing_ok=True))
+        ctx.download_resource.assert_called_once()
+        self.assertRaises(HttpException, cache.get, 'ca.crt')
+
+    def test_get_without_deployment_dir(self):
+        ctx = self.mock_ctx()
+        ctx.deployment.id = None
+        ctx.download_resource.side_effect = ['/tmp/values.yaml',
+                                             HttpException('ca.crt', 404,
+                                                           'Not found')]
+        cache = resource_cache.BlueprintResourceCache(ctx)
+        self.assertEqual(cache.get('values.yaml'), '/tmp/values.yaml')
+        self.assertIsNone(cache.get('ca.crt', missing_ok=True))
+        ctx.download_resource.assert_called_with('ca.crt')
+        resource_cache.get_deployment_dir.assert_not_called()
+        # The deployment has no directory on this host.
+        ctx = self.mock_ctx()
+        ctx.download_resource.side_effect = None
+        ctx.download_resource.return_value = '/tmp/values.yaml'
+        resource_cache.get_deployment_dir.side_effect = OSError('no dir')
+        self.assertEqual(
+            resource_cache.BlueprintResourceCache(ctx).get('values.yaml'),
+            '/tmp/values.yaml')
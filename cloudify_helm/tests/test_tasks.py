@@ -5,6 +5,7 @@ import mock
 import json
 import shutil
 import tempfile
+from urllib.parse import urlparse
 
 from nativeedge.state import current_ctx
 from nativeedge.exceptions import NonRecoverableError
@@ -15,11 +16,16 @@ from ne_helm.tasks import (
     pull_chart,
     push_chart,
     remove_repo,
+    prefetch,
+    update_repo,
     prepare_args,
+    install_target,
     install_binary,
     registry_login,
     install_release,
     upgrade_release,
+    install_release_set,
+    check_releases_health,
     uninstall_binary,
     uninstall_release)
 from ..constants import (
@@ -29,10 +35,13 @@ from ..constants import (
     CONFIGURATION,
     CLIENT_CONFIG,
     RESOURCE_CONFIG,
+    UPGRADE_SKIPPED,
     EXECUTABLE_PATH,
     CONFIG_DIR_ENV_VAR,
     CACHE_DIR_ENV_VAR,
-    DATA_DIR_ENV_VAR)
+    DATA_DIR_ENV_VAR,
+    DESIRED_STATE_DIGEST,
+    DESIRED_STATE_REVISION)
 
 mock_install_response = {
     "name": "my_release",
@@ -193,6 +202,22 @@ class TestTasks(TestBase):
         expected['additional_args'] = {'max_sleep_time': 300}
         assert result == expected
 
+    def test_install_target_cached_chart(self):
+        ctx = self.mock_ctx({}, self.mock_runtime_properties())
+        helm = mock.Mock()
+        helm.cached_chart.return_value = '/tmp/cloudify-helm-charts/d.tgz'
+        args_dict = {
+            'chart': 'nginx',
+            'flags': [{'name': 'repo', 'value': 'https://charts.example.com'},
+                      {'name': 'version', 'value': '1.0.0'},
+                      {'name': 'namespace', 'value': 'web'}]}
+        with install_target(
+                ctx, urlparse('nginx'), args_dict, helm) as args_dict:
+            self.assertEqual(args_dict['chart'],
+                             '/tmp/cloudify-helm-charts/d.tgz')
+            self.assertEqual(args_dict['flags'],
+                             [{'name': 'namespace', 'value': 'web'}])
+
     @mock.patch('helm_sdk.Helm.execute')
     @mock.patch('ne_helm.utils.os.path.exists')
     @mock.patch('helm_sdk.Helm.repo_add')
@@ -234,6 +259,81 @@ class TestTasks(TestBase):
             flags=[],
             additional_args='{max_sleep_time: 300}')
 
+    @mock.patch('helm_sdk.Helm.repo_entry')
+    @mock.patch('helm_sdk.Helm.repo_list')
+    @mock.patch('ne_helm.utils.os.path.exists')
+    @mock.patch('helm_sdk.Helm.repo_update', autospec=True)
+    def test_update_repo_concurrently(self,
+                                      mock_repo_update,
+                                      mock_exists,
+                                      mock_repo_list,
+                                      mock_repo_entry):
+        def repo_update(helm, flags=None, names=None, **_):
+            if names == ['broken']:
+                raise RuntimeError('index not found')
+
+        def repo_entry(name):
+            entry = {'name': name,
+                     'url': 'https://charts.example.com/' + name}
+            if name.startswith('private'):
+                entry['username'] = 'user'
+            return entry
+        mock_repo_update.side_effect = repo_update
+        mock_repo_entry.side_effect = repo_entry
+        mock_exists.return_value = True
+        mock_repo_list.return_value = []
+        properties = {
+            "helm_config": {
+                "executable_path": "/path/to/helm"
+            },
+            "resource_config": {
+                "name": "stable",
+                "repo_url": "https://charts.example.com/",
+                "flags": []
+            }
+        }
+        ctx = self.mock_ctx(properties, self.mock_runtime_properties())
+        current_ctx.set(ctx)
+        with self.assertRaisesRegex(NonRecoverableError, 'broken'):
+            update_repo(ctx=ctx,
+                        flags=[],
+                        repositories=['stable', 'private2', 'broken',
+                                      'private1', 'stable'])
+        # Repositories with credentials share one helm repo update.
+        self.assertEqual(
+            sorted(call[1]['names']
+                   for call in mock_repo_update.call_args_list),
+            [['broken'], ['private1', 'private2'], ['stable']])
+        results = ctx.instance.runtime_properties['repo_update']
+        self.assertEqual(results['stable']['status'], 'succeeded')
+        self.assertEqual(results['private1']['status'], 'succeeded')
+        self.assertEqual(results['broken']['status'], 'failed')
+
+    @mock.patch('ne_helm.tasks.create_venv')
+    @mock.patch('ne_helm.utils.os.path.exists')
+    @mock.patch('helm_sdk.Helm.prefetch')
+    def test_prefetch(self, mock_prefetch, mock_exists, mock_create_venv):
+        mock_exists.return_value = True
+        mock_prefetch.return_value = {
+            'version': {'status': 'succeeded', 'error': None,
+                        'duration': 0.1}}
+        mock_create_venv.side_effect = RuntimeError('no network')
+        charts = [{'chart': 'nginx',
+                   'repo_url': 'https://charts.example.com/'}]
+        properties = {
+            "helm_config": {
+                "executable_path": "/path/to/helm"
+            },
+            "prefetch": {"charts": charts, "aws_cli": True}
+        }
+        ctx = self.mock_ctx(properties, self.mock_runtime_properties())
+        current_ctx.set(ctx)
+        prefetch(ctx=ctx)
+        mock_prefetch.assert_called_once_with(charts=charts, max_workers=4)
+        results = ctx.instance.runtime_properties['prefetch']
+        self.assertEqual(results['version']['status'], 'succeeded')
+        self.assertEqual(results['aws_cli']['error'], 'no network')
+
     @mock.patch('ne_helm.utils.get_stored_property')
     def test_add_repo_use_external_resource(self, get_stored_property):
         properties = {
@@ -381,6 +481,112 @@ class TestTasks(TestBase):
             additional_env=None,
             additional_args={'max_sleep_time': 300})
 
+    @mock.patch('ne_helm.decorators.Kubernetes')
+    @mock.patch(
+        'nativeedge_kubernetes_sdk.connection.decorators.get_kubeconfig_file')
+    @mock.patch('helm_sdk.Helm.status')
+    @mock.patch('helm_sdk.Helm.install')
+    @mock.patch('ne_helm.utils.os.path.isfile')
+    @mock.patch('ne_helm.utils.os.path.exists')
+    @mock.patch('ne_helm.utils.get_stored_property')
+    def test_install_release_retry_deployed(self,
+                                            get_stored_property,
+                                            os_path_exists,
+                                            os_path_isfile,
+                                            fake_install,
+                                            fake_status,
+                                            *_):
+        fake_status.return_value = mock_install_response
+        os_path_exists.return_value = True
+        os_path_isfile.return_value = True
+        properties = self.mock_install_release_properties()
+        get_stored_property.return_value = properties.get('resource_config')
+        ctx = self.mock_ctx(properties,
+                            self.mock_runtime_properties(),
+                            test_operation={'name': 'install',
+                                            'retry_number': 1})
+        install_release(ctx=ctx)
+        fake_install.assert_not_called()
+        self.assertEqual(ctx.instance.runtime_properties['status_output'],
+                         mock_install_response)
+
+    @mock.patch('ne_helm.decorators.Kubernetes')
+    @mock.patch(
+        'nativeedge_kubernetes_sdk.connection.decorators.get_kubeconfig_file')
+    @mock.patch('helm_sdk.Helm.status', autospec=True)
+    @mock.patch('ne_helm.utils.os.path.exists')
+    @mock.patch('ne_helm.utils.get_stored_property')
+    def test_check_releases_health(self,
+                                   get_stored_property,
+                                   os_path_exists,
+                                   fake_status,
+                                   _,
+                                   fake_kubernetes):
+        os_path_exists.return_value = True
+        fake_status.side_effect = lambda helm, release_name, **_: {
+            'info': {'status': 'deployed' if release_name == 'a'
+                     else 'failed'},
+            'manifest': {}}
+        fake_kubernetes.return_value.multiple_resource_check_status.\
+            return_value = ({}, [])
+        properties = self.mock_install_release_properties()
+        get_stored_property.return_value = properties[RESOURCE_CONFIG]
+        ctx = self.mock_ctx(properties, self.mock_runtime_properties())
+        check_releases_health(
+            ctx=ctx,
+            releases=[{'instance': 'a_1', 'name': 'a', 'flags': []},
+                      {'instance': 'b_1', 'name': 'b', 'flags': []}],
+            max_concurrency=2)
+        report = ctx.instance.runtime_properties['health_report']
+        self.assertTrue(report['a_1']['healthy'])
+        self.assertFalse(report['b_1']['healthy'])
+        self.assertEqual(report['b_1']['status'], 'failed')
+        self.assertEqual(fake_kubernetes.call_count, 1)
+
+    @mock.patch(
+        'nativeedge_kubernetes_sdk.connection.decorators.get_kubeconfig_file')
+    @mock.patch('helm_sdk.Helm.install', autospec=True)
+    @mock.patch('ne_helm.utils.os.path.isfile')
+    @mock.patch('ne_helm.utils.os.path.exists')
+    @mock.patch('ne_helm.utils.get_stored_property')
+    def test_install_release_set(self,
+                                 get_stored_property,
+                                 os_path_exists,
+                                 os_path_isfile,
+                                 fake_install,
+                                 *_):
+        os_path_exists.return_value = True
+        os_path_isfile.return_value = True
+        fake_install.return_value = {
+            'version': 1, 'info': {'status': 'deployed'}}
+        properties = self.mock_install_release_properties()
+        properties[RESOURCE_CONFIG] = {
+            'releases': [
+                {'name': 'app', 'chart': 'example/app',
+                 'depends_on': ['db'],
+                 'flags': [{'name': 'version', 'value': '1.0.0'}]},
+                {'name': 'db', 'chart': 'example/db'},
+            ],
+            'flags': [{'name': 'namespace', 'value': 'ns'}],
+            'max_concurrency': 2,
+        }
+        get_stored_property.return_value = properties.get('resource_config')
+        ctx = self.mock_ctx(properties,
+                            self.mock_runtime_properties())
+        install_release_set(ctx=ctx)
+        self.assertEqual(
+            [call[0][1] for call in fake_install.call_args_list],
+            ['db', 'app'])
+        self.assertEqual(
+            fake_install.call_args_list[1][0][3],
+            [{'name': 'namespace', 'value': 'ns'},
+             {'name': 'version', 'value': '1.0.0'}])
+        releases = ctx.instance.runtime_properties['releases']
+        self.assertEqual(sorted(releases), ['app', 'db'])
+        self.assertEqual(releases['app']['status'], 'succeeded')
+        self.assertEqual(releases['app']['revision'], 1)
+        self.assertEqual(releases['app']['release_status'], 'deployed')
+
     @mock.patch('ne_helm.utils.get_stored_property')
     def test_install_release_general(self, get_stored_property):
         properties = self.mock_install_release_properties()
@@ -492,6 +698,46 @@ class TestTasks(TestBase):
             additional_args={'max_sleep_time': 300}
         )
 
+    @mock.patch('ne_helm.decorators.Kubernetes')
+    @mock.patch(
+        'nativeedge_kubernetes_sdk.connection.decorators.get_kubeconfig_file')
+    @mock.patch('ne_helm.tasks.desired_state_digest')
+    @mock.patch('helm_sdk.Helm.execute')
+    @mock.patch('helm_sdk.Helm.upgrade')
+    @mock.patch('ne_helm.utils.os.path.isfile')
+    @mock.patch('ne_helm.utils.os.path.exists')
+    @mock.patch('ne_helm.utils.get_stored_property')
+    def test_upgrade_release_up_to_date(self,
+                                        get_stored_property,
+                                        os_path_exists,
+                                        os_path_isfile,
+                                        fake_upgrade,
+                                        mock_execute,
+                                        mock_digest,
+                                        *_):
+        mock_execute.return_value = json.dumps(mock_install_response)
+        mock_digest.return_value = 'desired-state'
+        os_path_exists.return_value = True
+        os_path_isfile.return_value = True
+        properties = self.mock_install_release_properties()
+        get_stored_property.return_value = properties.get('resource_config')
+        runtime_properties = self.mock_runtime_properties()
+        runtime_properties[DESIRED_STATE_DIGEST] = 'desired-state'
+        runtime_properties[DESIRED_STATE_REVISION] = 1
+        ctx = self.mock_ctx(properties, runtime_properties)
+        upgrade_release(ctx=ctx)
+        fake_upgrade.assert_not_called()
+        self.assertTrue(ctx.instance.runtime_properties[UPGRADE_SKIPPED])
+
+        # A change of the desired state upgrades the release.
+        mock_digest.return_value = 'new-desired-state'
+        upgrade_release(ctx=ctx)
+        fake_upgrade.assert_called_once()
+        self.assertFalse(ctx.instance.runtime_properties[UPGRADE_SKIPPED])
+        self.assertEqual(
+            ctx.instance.runtime_properties[DESIRED_STATE_DIGEST],
+            'new-desired-state')
+
     @mock.patch('ne_helm.decorators.helm_from_ctx')
     @mock.patch('ne_helm.utils.os.path.isfile')
     @mock.patch('ne_helm.utils.os.path.exists')
@@ -0,0 +1,140 @@
+# Copyright © 2024 Dell Inc. or its subsidiaries. All Rights Reserved.
+
+import sys
+import json
+import mock
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from nativeedge.state import current_ctx
+from nativeedge.mocks import MockNativeEdgeContext
+
+from helm_sdk.retry import is_unauthorized
+from helm_sdk.exceptions import CloudifyHelmSDKError
+
+from .. import token_cache
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        super(TestTokenCache, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(
+            token_cache, 'TOKEN_CACHE_DIR', self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token_cache._tokens.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        super(TestTokenCache, self).tearDown()
+
+    def test_get_token_cached_until_expiry(self):
+        key = token_cache.cache_key('user', 'https://cluster')
+        expiration = datetime.utcnow() + timedelta(minutes=10)
+        factory = mock.Mock(return_value=('token1', expiration))
+        self.assertEqual(token_cache.get_token(key, factory), 'token1')
+        self.assertEqual(token_cache.get_token(key, factory), 'token1')
+        factory.assert_called_once()
+
+    def test_get_token_persisted_across_processes(self):
+        key = token_cache.cache_key('user', 'https://cluster')
+        expiration = datetime.utcnow() + timedelta(minutes=10)
+        token_cache.get_token(key, lambda: ('token1', expiration))
+        # Simulate another operation process.
+        token_cache._tokens.clear()
+        factory = mock.Mock(return_value=('token2', expiration))
+        self.assertEqual(token_cache.get_token(key, factory), 'token1')
+        factory.assert_not_called()
+
+    def test_get_token_refreshed_shortly_before_expiry(self):
+        key = token_cache.cache_key('user', 'https://cluster')
+        expiration = datetime.utcnow() + timedelta(seconds=30)
+        token_cache.get_token(key, lambda: ('token1', expiration))
+        factory = mock.Mock(return_value=('token2', None))
+        self.assertEqual(token_cache.get_token(key, factory), 'token2')
+        factory.assert_called_once()
+
+    def test_get_token_without_expiry_not_reused(self):
+        key = token_cache.cache_key('user', 'https://cluster')
+        factory = mock.Mock(side_effect=[('token1', None),
+                                         ('token2', 'not a timestamp')])
+        self.assertEqual(token_cache.get_token(key, factory), 'token1')
+        self.assertEqual(token_cache.get_token(key, factory), 'token2')
+        self.assertEqual(factory.call_count, 2)
+
+    def test_get_token_factory_holds_only_its_key(self):
+        expiration = datetime.utcnow() + timedelta(minutes=10)
+        other_key = token_cache.cache_key('other', 'https://cluster')
+
+        def factory():
+            # Would deadlock if the factory ran under a global lock.
+            return token_cache.get_token(
+                other_key, lambda: ('token2', expiration)), expiration
+
+        key = token_cache.cache_key('user', 'https://cluster')
+        self.assertEqual(token_cache.get_token(key, factory), 'token2')
+
+    def test_invalidate_token(self):
+        key = token_cache.cache_key('user', 'https://cluster')
+        expiration = datetime.utcnow() + timedelta(minutes=10)
+        token_cache.get_token(key, lambda: ('token1', expiration))
+        self.assertTrue(token_cache.invalidate_token('token1'))
+        self.assertFalse(token_cache.invalidate_token('token1'))
+        factory = mock.Mock(return_value=('token2', expiration))
+        self.assertEqual(token_cache.get_token(key, factory), 'token2')
+        factory.assert_called_once()
+
+    def test_get_token_no_token(self):
+        key = token_cache.cache_key('user', 'https://cluster')
+        self.assertIsNone(token_cache.get_token(key, lambda: None))
+        self.assertIsNone(
+            token_cache.get_token(key, lambda: (None, None)))
+
+    def test_to_epoch(self):
+        self.assertEqual(token_cache.to_epoch('1970-01-01T00:01:00Z'), 60)
+        self.assertEqual(
+            token_cache.to_epoch(datetime(1970, 1, 1, 0, 2)), 120)
+        self.assertIsNone(token_cache.to_epoch(None))
+        self.assertEqual(
+            token_cache.to_epoch('1970-01-01T01:01:00+01:00'), 60)
+        self.assertEqual(
+            token_cache.to_epoch('1970-01-01T00:00:00-00:01'), 60)
+        self.assertEqual(
+            token_cache.to_epoch('1970-01-01T00:01:00.500000000Z'), 60.5)
+        self.assertIsNone(token_cache.to_epoch('tomorrow'))
+
+    def test_run_exec_plugin(self):
+        current_ctx.set(MockNativeEdgeContext())
+        self.addCleanup(current_ctx.clear)
+        credential = {
+            'apiVersion': 'client.authentication.k8s.io/v1beta1',
+            'kind': 'ExecCredential',
+            'status': {'token': 'exec-token',
+                       'expirationTimestamp': '2030-01-01T00:00:00Z'}
+        }
+        exec_config = {
+            'apiVersion': 'client.authentication.k8s.io/v1beta1',
+            'command': sys.executable,
+            'args': ['-c', 'import os; print(os.environ["CREDENTIAL"])'],
+            'env': [{'name': 'CREDENTIAL', 'value': json.dumps(credential)}]
+        }
+        self.assertEqual(
+            token_cache.run_exec_plugin(exec_config),
+            ('exec-token', '2030-01-01T00:00:00Z'))
+
+    def test_run_exec_plugin_error(self):
+        current_ctx.set(MockNativeEdgeContext())
+        self.addCleanup(current_ctx.clear)
+        exec_config = {
+            'command': sys.executable,
+            'args': ['-c', 'import sys; sys.exit("Unauthorized")']
+        }
+        with self.assertRaisesRegex(CloudifyHelmSDKError,
+                                    'exit code 1') as error:
+            token_cache.run_exec_plugin(exec_config)
+        self.assertIn('Unauthorized', error.exception.stderr)
+        self.assertTrue(is_unauthorized(error.exception))
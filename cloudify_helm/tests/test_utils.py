@@ -2,6 +2,8 @@
 
 import os
 import mock
+import shutil
+import tempfile
 
 from nativeedge.state import current_ctx
 from nativeedge.exceptions import (
@@ -9,13 +11,21 @@ from nativeedge.exceptions import (
     NonRecoverableError
 )
 
+from helm_sdk.deadline import Deadline, DeadlineExceeded
+
 from . import TestBase
 from ..utils import (create_venv,
+                     convert_string_to_dict,
                      get_ssl_ca_file,
+                     subprocess_args,
+                     desired_state_digest,
+                     store_retry_counts,
+                     generate_eks_token,
                      install_aws_cli_if_needed,
                      handle_missing_executable,
                      check_aws_cmd_in_kubeconfig)
 from ..constants import (API_OPTIONS,
+                         HELM_RETRIES,
                          SSL_CA_CERT,
                          AWS_CLI_VENV,
                          CLIENT_CONFIG,
@@ -87,23 +97,90 @@ class TestUtils(TestBase):
         self.assertEqual(check_aws_cmd_in_kubeconfig(self.gke_kubeconfig),
                          False)
 
+    def test_generate_eks_token(self):
+        current_ctx.set(self.mock_ctx(test_properties=self.mock_properties()))
+        token = generate_eks_token(self.eks_kubeconfig)
+        self.assertTrue(token.startswith('k8s-aws-v1.'))
+        current_ctx.set(self.mock_ctx(test_properties=self.mock_properties()))
+        self.assertEqual(generate_eks_token(self.gke_kubeconfig), None)
+
+    def test_generate_eks_token_missing_credentials(self):
+        properties = self.mock_properties()
+        del properties[CLIENT_CONFIG][AUTHENTICATION]['aws_access_key_id']
+        current_ctx.set(self.mock_ctx(test_properties=properties))
+        self.assertEqual(generate_eks_token(self.eks_kubeconfig), None)
+
     def test_create_venv(self):
-        fake_deployment_dir = os.path.join('/opt',
-                                           'mgmtworker',
-                                           'work',
-                                           'deployments',
-                                           'default-tenant',
-                                           'test-deployment')
-        with mock.patch('ne_helm.utils.get_deployment_dir'):
-            with mock.patch('ne_helm.utils.tempfile.mkdtemp',
-                            return_value=fake_deployment_dir):
-                with mock.patch('ne_helm.utils.run_subprocess'):
-                    ctx = self.mock_ctx(test_properties={})
-                    current_ctx.set(ctx)
-                    create_venv()
-                    self.assertEqual(
-                        ctx.instance.runtime_properties.get(AWS_CLI_VENV),
-                        fake_deployment_dir)
+        fake_deployment_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, fake_deployment_dir)
+        with mock.patch('ne_helm.utils.get_deployment_dir',
+                        return_value=fake_deployment_dir):
+            with mock.patch('ne_helm.utils.run_subprocess') as run:
+                ctx = self.mock_ctx(test_properties={})
+                current_ctx.set(ctx)
+                create_venv()
+                self.assertEqual(
+                    ctx.instance.runtime_properties.get(AWS_CLI_VENV),
+                    os.path.join(fake_deployment_dir, 'aws-cli-venv'))
+                calls = run.call_count
+                # Other instances of the deployment share the venv.
+                ctx = self.mock_ctx(test_properties={})
+                current_ctx.set(ctx)
+                create_venv()
+                self.assertEqual(
+                    ctx.instance.runtime_properties.get(AWS_CLI_VENV),
+                    os.path.join(fake_deployment_dir, 'aws-cli-venv'))
+                self.assertEqual(run.call_count, calls)
+
+    def test_subprocess_args(self):
+        current_ctx.set(self.mock_ctx(test_properties={'max_sleep_time': 900}))
+        self.assertEqual(subprocess_args('creating virtualenv'),
+                         {'max_sleep_time': 900})
+        self.assertEqual(
+            subprocess_args('creating virtualenv', Deadline(60)),
+            {'max_sleep_time': 60})
+        with self.assertRaises(DeadlineExceeded):
+            subprocess_args('creating virtualenv', Deadline(0))
+
+    def test_desired_state_digest(self):
+        args_dict = {'chart': 'example/nginx', 'flags': []}
+        # The version helm upgrades to is unknown, never skip.
+        self.assertIsNone(desired_state_digest('release', args_dict))
+        resolved = ('https://charts.example.com',
+                    {'version': '1.0.0', 'digest': 'a'})
+        digest = desired_state_digest('release', args_dict,
+                                      resolved_chart=resolved)
+        self.assertEqual(
+            digest, desired_state_digest('release', args_dict,
+                                         resolved_chart=resolved))
+        # A new chart version was published.
+        self.assertNotEqual(
+            digest, desired_state_digest(
+                'release', args_dict,
+                resolved_chart=('https://charts.example.com',
+                                {'version': '1.1.0', 'digest': 'b'})))
+        with tempfile.NamedTemporaryFile(suffix='.tgz') as archive:
+            self.assertIsNotNone(desired_state_digest(
+                'release', {'chart': archive.name}))
+
+    def test_store_retry_counts(self):
+        ctx = self.mock_ctx(test_properties={})
+        helm = mock.Mock()
+        helm.retry_policy.counts.return_value = {
+            'status': {'calls': 1, 'retries': 2, 'recovered': 1,
+                       'exhausted': 0},
+            'install': {'calls': 1, 'retries': 0, 'recovered': 0,
+                        'exhausted': 0}}
+        store_retry_counts(ctx, helm)
+        self.assertEqual(
+            ctx.instance.runtime_properties[HELM_RETRIES],
+            {'status': {'calls': 1, 'retries': 2, 'recovered': 1,
+                        'exhausted': 0}})
+        # A mocked helm or one without a policy is not an error.
+        ctx = self.mock_ctx(test_properties={})
+        store_retry_counts(ctx, mock.Mock())
+        store_retry_counts(ctx, None)
+        self.assertNotIn(HELM_RETRIES, ctx.instance.runtime_properties)
 
     def test_get_ssl_ca_file_content_in_blueprint(self):
         properties = self.mock_properties()
@@ -111,8 +188,8 @@ class TestUtils(TestBase):
         properties[CLIENT_CONFIG][CONFIGURATION][API_OPTIONS][
             SSL_CA_CERT] = ca_content
         current_ctx.set(self.mock_ctx(test_properties=properties))
-        with mock.patch('ne_helm.utils.check_if_resource_inside_'
-                        'blueprint_folder', return_value=False):
+        with mock.patch('ne_helm.utils.get_blueprint_resource',
+                        return_value=None):
             with get_ssl_ca_file() as ca_file:
                 with open(ca_file, 'r') as temp_ca_file:
                     self.assertEqual(temp_ca_file.read(), ca_content)
@@ -125,18 +202,29 @@ class TestUtils(TestBase):
         properties[CLIENT_CONFIG][CONFIGURATION][API_OPTIONS][
             SSL_CA_CERT] = ca_file_path
         current_ctx.set(self.mock_ctx(test_properties=properties))
-        with mock.patch('ne_helm.utils.check_if_resource_inside_'
-                        'blueprint_folder', return_value=False):
+        with mock.patch('ne_helm.utils.get_blueprint_resource',
+                        return_value=None):
             with get_ssl_ca_file() as ca_file:
                 self.assertEqual(os.path.abspath(ca_file), ca_file_path)
 
+    def test_get_ssl_ca_file_inside_blueprint(self):
+        properties = self.mock_properties()
+        properties[CLIENT_CONFIG][CONFIGURATION][API_OPTIONS][
+            SSL_CA_CERT] = 'ca.crt'
+        current_ctx.set(self.mock_ctx(test_properties=properties))
+        with mock.patch('ne_helm.utils.get_blueprint_resource',
+                        return_value='/path/to/cached/ca.crt') as resolve:
+            with get_ssl_ca_file() as ca_file:
+                self.assertEqual(ca_file, '/path/to/cached/ca.crt')
+            resolve.assert_called_once_with('ca.crt')
+
     def test_get_ssl_ca_file_no_ca(self):
         properties = self.mock_properties()
         properties[CLIENT_CONFIG][CONFIGURATION][API_OPTIONS][
             SSL_CA_CERT] = ''
         current_ctx.set(self.mock_ctx(test_properties=properties))
-        with mock.patch('ne_helm.utils.check_if_resource_inside_'
-                        'blueprint_folder', return_value=False):
+        with mock.patch('ne_helm.utils.get_blueprint_resource',
+                        return_value=None):
             with get_ssl_ca_file() as ca_file:
                 self.assertEqual(ca_file, None)
 
@@ -183,3 +271,21 @@ class TestUtils(TestBase):
                 'ne_helm.utils.os.path.exists', return_value=True):
             result = handle_missing_executable('foo')
             self.assertEqual(result, 'foo')
+
+    def test_convert_string_to_dict(self):
+        self.assertEqual(
+            convert_string_to_dict(
+                'apiVersion: v2\n'
+                'home: https://github.com/example/charts\n'
+                'description: "time: 10:00"\n'
+                'name: example\n'),
+            {'apiVersion': 'v2',
+             'home': 'https://github.com/example/charts',
+             'description': 'time: 10:00',
+             'name': 'example'})
+        self.assertEqual(
+            convert_string_to_dict('version: 1.10\n'
+                                   'appVersion: 1.2.0\n'
+                                   'deprecated: yes\n'),
+            {'version': '1.10', 'appVersion': '1.2.0', 'deprecated': 'yes'})
+        self.assertEqual(convert_string_to_dict('not a chart'), {})
@@ -0,0 +1,203 @@
+# Copyright © 2024 Dell Inc. or its subsidiaries. All Rights Reserved.
+
+import os
+import re
+import json
+import time
+import shlex
+import logging
+import hashlib
+import calendar
+import tempfile
+import threading
+
+from cloudify_common_sdk.processes import ProcessException
+
+from helm_sdk.utils import run_subprocess
+from helm_sdk.governor import host_governor
+from helm_sdk.exceptions import CloudifyHelmSDKError
+
+TOKEN_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'cloudify-helm-tokens')
+# Refresh tokens this many seconds before they expire, so a token is not
+# rejected in the middle of a long helm command.
+EXPIRY_MARGIN = 120
+EXEC_PLUGIN_TIMEOUT = 60
+EXEC_INFO_ENV_VAR = 'KUBERNETES_EXEC_INFO'
+# RFC3339 date-time: fractions of any precision, Z or numeric offset.
+TIMESTAMP_PATTERN = re.compile(
+    r'^(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(\.\d+)?'
+    r'(Z|([+-])(\d\d):(\d\d))$',
+    re.IGNORECASE)
+
+_tokens = {}
+_key_locks = {}
+_lock = threading.Lock()
+
+
+def cache_key(*parts):
+    """Create a cache key from the kubeconfig user, cluster and anything
+    else that identifies the credentials (exec config, access key id).
+    """
+    serialized = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def to_epoch(expiration):
+    """Convert naive UTC datetime or RFC3339 string to epoch seconds.
+    :return epoch seconds, or None if there is no expiration or it can't be
+    parsed.
+    """
+    if not expiration:
+        return
+    if not isinstance(expiration, str):
+        return calendar.timegm(expiration.utctimetuple())
+    match = TIMESTAMP_PATTERN.match(expiration.strip())
+    if not match:
+        return
+    (year, month, day, hour, minute, second, fraction, _,
+     sign, offset_hours, offset_minutes) = match.groups()
+    epoch = calendar.timegm((int(year), int(month), int(day),
+                             int(hour), int(minute), int(second)))
+    if fraction:
+        epoch += float(fraction)
+    if sign:
+        offset = int(offset_hours) * 3600 + int(offset_minutes) * 60
+        epoch -= offset if sign == '+' else -offset
+    return epoch
+
+
+def _is_valid(entry):
+    """Tokens without a known expiration are never reused from the
+    cache, see get_token.
+    """
+    if not entry or not entry.get('token'):
+        return False
+    expiration = entry.get('expiration')
+    return expiration is not None and \
+        expiration - EXPIRY_MARGIN > time.time()
+
+
+def _cache_file(key):
+    return os.path.join(TOKEN_CACHE_DIR, key + '.json')
+
+
+def _read_entry(key):
+    try:
+        with open(_cache_file(key)) as cache_file:
+            return json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return
+
+
+def _write_entry(key, entry):
+    """Persist the entry so other operations on this agent can use it.
+    The token is a secret, so only the owner may read it.
+    """
+    try:
+        os.makedirs(TOKEN_CACHE_DIR, mode=0o700, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=TOKEN_CACHE_DIR)
+        with os.fdopen(fd, 'w') as cache_file:
+            json.dump(entry, cache_file)
+        os.replace(path, _cache_file(key))
+    except (IOError, OSError):
+        pass
+
+
+def _key_lock(key):
+    with _lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def get_token(key, factory):
+    """Get token from the cache, or create it with factory.
+    Only callers of the same key wait for a running factory.
+    :param key: cache key, see cache_key.
+    :param factory: callable returning (token, expiration) where expiration
+    is a naive UTC datetime, RFC3339 string or None.
+    :return token or None if factory did not return a token.
+    """
+    with _key_lock(key):
+        entry = _tokens.get(key)
+        if not _is_valid(entry):
+            entry = _read_entry(key)
+        if _is_valid(entry):
+            _tokens[key] = entry
+            return entry['token']
+        token, expiration = factory() or (None, None)
+        if not token:
+            return
+        entry = {'token': token, 'expiration': to_epoch(expiration)}
+        # Without a known expiration the token is only used by the current
+        # operation, the next one runs the factory again.
+        if entry['expiration'] is not None:
+            _tokens[key] = entry
+            _write_entry(key, entry)
+        return token
+
+
+def invalidate(key):
+    """Drop the cached token of key, e.g. when the API server rejected it."""
+    with _key_lock(key):
+        _tokens.pop(key, None)
+        try:
+            os.remove(_cache_file(key))
+        except OSError:
+            pass
+
+
+def invalidate_token(token):
+    """Drop every cached entry of token.
+    :return True if the token was cached.
+    """
+    with _lock:
+        keys = [key for key, entry in _tokens.items()
+                if entry.get('token') == token]
+    for key in keys:
+        invalidate(key)
+    return bool(keys)
+
+
+def run_exec_plugin(exec_config,
+                    env=None,
+                    timeout=EXEC_PLUGIN_TIMEOUT,
+                    logger=None):
+    """Run kubeconfig exec credential plugin and parse its ExecCredential.
+    :param exec_config: the exec section of a kubeconfig user.
+    :param env: additional environment variables.
+    :param timeout: seconds to wait for a slot, and for the plugin.
+    :return tuple of (token, expirationTimestamp), token is None if the
+    plugin did not return a bearer token (e.g. client certificates).
+    :raise CloudifyHelmSDKError with the stderr of a failed plugin.
+    """
+    logger = logger or logging.getLogger(__name__)
+    command_env = dict(env or {})
+    for variable in exec_config.get('env') or []:
+        command_env[variable['name']] = variable['value']
+    command_env[EXEC_INFO_ENV_VAR] = json.dumps({
+        'apiVersion': exec_config.get('apiVersion'),
+        'kind': 'ExecCredential',
+        'spec': {'interactive': False}
+    })
+    # The command runs in a shell, and its stdout (the token) is not logged.
+    command = [shlex.quote(arg) for arg in
+               [exec_config['command']] + list(exec_config.get('args') or [])]
+    # Token helpers like aws run alongside the helm processes of the host.
+    with host_governor().slot(os.path.basename(exec_config['command']),
+                              logger,
+                              timeout=timeout):
+        try:
+            output = run_subprocess(
+                command,
+                logger,
+                additional_env=command_env,
+                additional_args={'max_sleep_time': timeout} if timeout
+                else None)
+        except ProcessException as e:
+            error = CloudifyHelmSDKError(
+                'Exec credential plugin {0} failed with exit code {1}: '
+                '{2}'.format(exec_config['command'], e.exit_code, e.stderr))
+            error.exit_code = e.exit_code
+            error.stderr = e.stderr
+            raise error
+    status = json.loads(output).get('status') or {}
+    return status.get('token'), status.get('expirationTimestamp')
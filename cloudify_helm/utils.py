@@ -2,7 +2,10 @@
 
 import os
 import sys
+import json
 import yaml
+import fcntl
+import hashlib
 import shutil
 import tarfile
 import tempfile
@@ -12,7 +15,6 @@ from subprocess import CalledProcessError
 
 from nativeedge import ctx, exceptions
 from nativeedge.exceptions import (
-    HttpException,
     OperationRetry,
     NonRecoverableError
 )
@@ -20,17 +22,22 @@ from nativeedge_common_sdk.resource_downloader import (unzip_archive,
                                                      untar_archive,
                                                      TAR_FILE_EXTENSTIONS)
 
-from nativeedge_common_sdk.utils import (
-    delete_debug,
-    get_deployment_dir)
+from nativeedge_common_sdk.utils import get_deployment_dir
 from nativeedge_common_sdk.secure_property_management import get_stored_property
 
 from helm_sdk import Helm
+from helm_sdk.deadline import Deadline, step_timeout
+from helm_sdk.governor import host_governor
 from helm_sdk.utils import run_subprocess
+from helm_sdk.eks import get_eks_token, parse_get_token_args
+from helm_sdk.kubeconfig import parse_kubeconfig
+from . import token_cache
+from .resource_cache import BlueprintResourceCache, file_digest
 from .constants import (
     API_OPTIONS,
     HELM_CONFIG,
     SSL_CA_CERT,
+    FLAGS_FIELD,
     AWS_CLI_VENV,
     CONFIGURATION,
     CLIENT_CONFIG,
@@ -42,11 +49,16 @@ from .constants import (
     CACHE_DIR_ENV_VAR,
     CONFIG_DIR_ENV_VAR,
     HELM_ENV_VARS_LIST,
+    AWS_CLI_VENV_DIR,
     AWS_CLI_TO_INSTALL,
-    USE_EXTERNAL_RESOURCE)
+    HELM_RETRIES,
+    CONCURRENCY_LIMITS,
+    USE_EXTERNAL_RESOURCE,
+    DEFAULT_OPERATION_TIMEOUT)
 
 CLUSTER_TYPE = 'nativeedge.kubernetes.resources.SharedCluster'
 CLUSTER_REL = 'nativeedge.relationships.helm.connected_to_shared_cluster'
+VENV_MARKER = '.installed'
 
 
 def get_resource_config(target=False, force=None):
@@ -105,13 +117,57 @@ def helm_from_ctx(ctx):
     executable_path = get_helm_executable_path(
         ctx.node.properties, ctx.instance.runtime_properties)
     env_variables = get_helm_env_vars_dict(ctx)
+    limits = ctx.node.properties.get(HELM_CONFIG, {}).get(CONCURRENCY_LIMITS)
     helm = Helm(
         ctx.logger,
         executable_path,
-        environment_variables=env_variables)
+        environment_variables=env_variables,
+        governor=host_governor(limits))
     return helm
 
 
+def operation_deadline(ctx):
+    """
+    The max_sleep_time of the node is the time budget of the operation,
+    shared by all its helm commands and Kubernetes reads.
+    :return helm_sdk.deadline.Deadline of the operation.
+    """
+    return Deadline(ctx.node.properties.get('max_sleep_time') or
+                    DEFAULT_OPERATION_TIMEOUT)
+
+
+def subprocess_args(step, deadline=None):
+    """
+    :param step: description of the subprocess, for the deadline error.
+    :param deadline: deadline of the operation, see operation_deadline.
+    :return additional_args of run_subprocess, its max_sleep_time is
+    bounded by the time left of the operation.
+    """
+    return {'max_sleep_time': step_timeout(
+        deadline, step, ctx.node.properties.get('max_sleep_time'))}
+
+
+def store_retry_counts(ctx, helm):
+    """
+    Keep the retry counts of the helm commands that were retried.
+    Called when the operation ends, so it never raises: the metrics must
+    not hide the result or the error of the operation.
+    """
+    try:
+        retry_policy = getattr(helm, 'retry_policy', None)
+        counts = retry_policy.counts() if retry_policy else {}
+        if not isinstance(counts, dict):
+            return
+        retried = dict((command, command_counts)
+                       for command, command_counts in counts.items()
+                       if command_counts.get('retries'))
+        if retried:
+            ctx.logger.info('Retried helm commands: {0}'.format(retried))
+            ctx.instance.runtime_properties[HELM_RETRIES] = retried
+    except Exception as e:
+        ctx.logger.debug('Failed to store helm retry counts: {0}'.format(e))
+
+
 def get_helm_env_vars_dict(ctx):
     env_vars = {}
     for property_name in HELM_ENV_VARS_LIST:
@@ -142,18 +198,13 @@ def get_values_file(ctx, ignore_properties_values_file, values_file=None):
 
     ctx.logger.debug('values file path:{path}'.format(path=values_file))
     if values_file and not ignore_properties_values_file:
-        # It means we took values file path from resource_config
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.yaml') as f:
-            f.close()
-            ctx.download_resource(
-                values_file,
-                target_path=f.name)
-            try:
-                ctx.logger.info('using values file:{file}'.format(file=f.name))
-                yield f.name
-            finally:
-                if delete_debug:
-                    os.remove(f.name)
+        # It means we took values file path from resource_config.
+        # The file is cached per blueprint, so it's downloaded only once.
+        # It outlives the operation, it is removed when evicted or with the
+        # deployment directory.
+        path = BlueprintResourceCache(ctx).get(values_file, suffix='.yaml')
+        ctx.logger.info('using values file:{file}'.format(file=path))
+        yield path
     elif values_file:
         # It means we have local values file.Check if cfyuser can access it.
         if not os.path.isfile(values_file):
@@ -172,20 +223,15 @@ def get_ssl_ca_file(ca_from_shared_cluster=None):
     current_value = ca_from_shared_cluster or configuration_property.get(
         API_OPTIONS, {}).get(SSL_CA_CERT)
 
-    if current_value and check_if_resource_inside_blueprint_folder(
-            current_value):
-        with tempfile.NamedTemporaryFile(delete=False) as f:
-            f.close()
-            ctx.download_resource(
-                current_value,
-                target_path=f.name)
-            try:
-                ctx.logger.info(
-                    'using CA file:{file}'.format(file=f.name))
-                yield f.name
-            finally:
-                if delete_debug:
-                    os.remove(f.name)
+    blueprint_ca_file = None
+    if current_value:
+        # One download answers both whether it's a blueprint resource and
+        # what its content is, and the answer is cached for the deployment.
+        blueprint_ca_file = get_blueprint_resource(current_value)
+
+    if blueprint_ca_file:
+        ctx.logger.info('using CA file:{file}'.format(file=blueprint_ca_file))
+        yield blueprint_ca_file
 
     elif current_value and os.path.isfile(current_value):
         ctx.logger.info('using CA file located at: {path}'.format(
@@ -209,17 +255,15 @@ def get_ssl_ca_file(ca_from_shared_cluster=None):
         yield
 
 
-def check_if_resource_inside_blueprint_folder(path):
-    with tempfile.NamedTemporaryFile(delete=True) as f:
-        f.close()
-        try:
-            ctx.download_resource(
-                path,
-                target_path=f.name)
-            return True
-        except HttpException:
-            ctx.logger.debug('ssl_ca file not found inside blueprint package.')
-            return False
+def get_blueprint_resource(path, suffix=''):
+    """
+    Get local path of a resource inside the blueprint package.
+    :param path: path of the resource in the blueprint.
+    :param suffix: suffix of the materialized file.
+    :return path of the materialized file, or None if the blueprint does
+    not contain the resource.
+    """
+    return BlueprintResourceCache(ctx).get(path, suffix, missing_ok=True)
 
 
 @contextmanager
@@ -339,14 +383,15 @@ def delete_temporary_env_of_helm(ctx):
                     dir=dir_to_delete))
 
 
-def prepare_aws_env(kubeconfig):
+def prepare_aws_env(kubeconfig, deadline=None):
     """
     Install aws cli if needed.
     If the cli installed, return aws credentials dictionary to append to helm
     command invocation.
     :param kubeconfig: kubeconfig path
+    :param deadline: deadline of the operation, bounds the installation.
     """
-    install_aws_cli_if_needed(kubeconfig)
+    install_aws_cli_if_needed(kubeconfig, deadline)
     return prepare_aws_env_vars_dict()
 
 
@@ -370,11 +415,12 @@ def prepare_aws_env_vars_dict():
     return aws_env_dict
 
 
-def install_aws_cli_if_needed(kubeconfig=None):
+def install_aws_cli_if_needed(kubeconfig=None, deadline=None):
     """
     Install AWS cli inside virtual environment to support native use of
     authentication for aws.
     :param kubeconfig: kubeconfig path
+    :param deadline: deadline of the operation, bounds the installation.
     """
     if not kubeconfig or not check_aws_cmd_in_kubeconfig(kubeconfig):
         return
@@ -388,12 +434,11 @@ def install_aws_cli_if_needed(kubeconfig=None):
                                       'aws_secret_access_key, '
                                       'aws_default_region is missing under '
                                       'client_config.authentication ')
-    create_venv()
+    create_venv(deadline)
 
 
 def check_aws_cmd_in_kubeconfig(kubeconfig):
-    with open(kubeconfig) as kube_file:
-        kubeconfig_dict = yaml.safe_load(kube_file)
+    kubeconfig_dict = parse_kubeconfig(kubeconfig).data
     users = kubeconfig_dict.get('users', {})
     for user in users:
         command = user.get('user', {}).get('exec', {}).get('command', None)
@@ -409,23 +454,143 @@ def check_aws_cmd_in_kubeconfig(kubeconfig):
     return False
 
 
-def create_venv():
+def exec_credential_cache_key(parsed_kubeconfig, *extra):
+    """
+    Cache key of the current context's credentials: kubeconfig user,
+    cluster and exec configuration.
+    """
+    return token_cache.cache_key(
+        parsed_kubeconfig.user_name,
+        parsed_kubeconfig.server,
+        parsed_kubeconfig.exec_config,
+        *extra)
+
+
+def generate_eks_token(kubeconfig):
+    """
+    Generate EKS bearer token in-process, instead of letting helm and
+    kubernetes client run `aws eks get-token` on every invocation.
+    The token is cached until shortly before it expires.
+    :param kubeconfig: kubeconfig path
+    :return token, or None if the token can't be generated natively (the
+    current user is not `aws eks get-token`, assumes a role or credentials
+    are missing) and the aws cli should be used.
+    """
+    parsed_kubeconfig = parse_kubeconfig(kubeconfig)
+    exec_config = parsed_kubeconfig.exec_config or {}
+    exec_args = exec_config.get('args') or []
+    if exec_config.get('command') != 'aws' or 'get-token' not in exec_args:
+        return
+    token_args = parse_get_token_args(exec_args)
+    if token_args['role_arn']:
+        ctx.logger.debug('EKS token requires assuming role {0}, using aws '
+                         'cli.'.format(token_args['role_arn']))
+        return
+    authentication_property = ctx.node.properties.get(CLIENT_CONFIG, {}).get(
+        AUTHENTICATION, {})
+    credentials = [authentication_property.get(aws_env_var.lower())
+                   for aws_env_var in AWS_ENV_VAR_LIST]
+    if not all(credentials) or not token_args['cluster_name']:
+        return
+    access_key_id, secret_access_key, default_region = credentials
+    region = token_args['region'] or default_region
+
+    def _generate():
+        ctx.logger.debug('Generating EKS token for cluster {0}.'.format(
+            token_args['cluster_name']))
+        return get_eks_token(token_args['cluster_name'],
+                             region,
+                             access_key_id,
+                             secret_access_key)
+
+    return token_cache.get_token(
+        exec_credential_cache_key(
+            parsed_kubeconfig, access_key_id, region),
+        _generate)
+
+
+def get_exec_credential_token(kubeconfig, env=None, deadline=None):
+    """
+    Run the exec credential plugin of the current kubeconfig user once and
+    cache the returned token until shortly before it expires, so helm and
+    kubernetes client calls use it as bearer token instead of running the
+    plugin again.
+    :param kubeconfig: kubeconfig path
+    :param env: additional environment variables for the plugin (aws cli).
+    :param deadline: deadline of the operation, bounds the plugin run.
+    :return token, or None if the user has no exec plugin or the plugin
+    didn't return a token.
+    """
+    parsed_kubeconfig = parse_kubeconfig(kubeconfig)
+    exec_config = parsed_kubeconfig.exec_config
+    if not exec_config or not exec_config.get('command'):
+        return
+
+    def _run():
+        ctx.logger.debug('Running exec credential plugin {0}.'.format(
+            exec_config['command']))
+        timeout = step_timeout(deadline,
+                               'running exec credential plugin',
+                               token_cache.EXEC_PLUGIN_TIMEOUT)
+        try:
+            return token_cache.run_exec_plugin(
+                exec_config, env, timeout, ctx.logger)
+        except Exception as e:
+            ctx.logger.warning(
+                'Failed to get token from exec credential plugin {0}, '
+                'leaving authentication to helm: {1}'.format(
+                    exec_config['command'], e))
+
+    # The env holds the credentials the plugin authenticates with (aws
+    # keys), tokens of other identities must not be shared.
+    return token_cache.get_token(
+        exec_credential_cache_key(
+            parsed_kubeconfig, token_cache.cache_key(env or {})),
+        _run)
+
+
+def create_venv(deadline=None):
     """
         Handle creation of virtual environment.
-        Create the virtual environment in deployment directory.
+        The virtual environment is created once in the deployment directory
+        and shared by the node instances of the deployment.
         Save the path of the virtual environment in runtime properties.
-       :param packages_to_install: list of python packages to install
-        inside venv.
+       :param deadline: deadline of the operation, bounds the creation.
     """
     if not ctx.instance.runtime_properties.get(AWS_CLI_VENV):
-        deployment_dir = get_deployment_dir(ctx.deployment.id)
-        venv_path = tempfile.mkdtemp(dir=deployment_dir)
-        make_virtualenv(path=venv_path)
-        install_packages_to_venv(venv_path, [AWS_CLI_TO_INSTALL])
-        ctx.instance.runtime_properties[AWS_CLI_VENV] = venv_path
+        ctx.instance.runtime_properties[AWS_CLI_VENV] = \
+            create_shared_venv(
+                AWS_CLI_VENV_DIR, [AWS_CLI_TO_INSTALL], deadline)
 
 
-def make_virtualenv(path):
+def create_shared_venv(name, packages_to_install, deadline=None):
+    """
+        Create a virtual environment in the deployment directory, unless
+        another operation already did. Concurrent operations wait for the
+        one creating it.
+       :param name: directory name of the virtual environment.
+       :param packages_to_install: list of python packages to install
+        inside venv.
+       :param deadline: deadline of the operation, bounds the subprocesses.
+       :return path of the virtual environment.
+    """
+    venv_path = os.path.join(get_deployment_dir(ctx.deployment.id), name)
+    with open(venv_path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        marker = os.path.join(venv_path, VENV_MARKER)
+        if not os.path.isfile(marker):
+            # Leftovers of an interrupted creation.
+            shutil.rmtree(venv_path, ignore_errors=True)
+            make_virtualenv(path=venv_path, deadline=deadline)
+            install_packages_to_venv(
+                venv_path, packages_to_install, deadline)
+            os.makedirs(venv_path, exist_ok=True)
+            with open(marker, 'w') as marker_file:
+                marker_file.write('\n'.join(packages_to_install))
+    return venv_path
+
+
+def make_virtualenv(path, deadline=None):
     """
         Make a venv for installing aws cli inside.
     """
@@ -440,41 +605,39 @@ def make_virtualenv(path):
     else:
         exception = Exception
     ctx.logger.debug('Creating virtualenv at: {path}'.format(path=path))
-    additional_args = {
-        'max_sleep_time': ctx.node.properties.get('max_sleep_time')
-    }
+    step = 'creating virtualenv {0}'.format(path)
     try:
         run_subprocess(
             [sys.executable, '-m', 'virtualenv', path],
             ctx.logger,
-            additional_args=additional_args
+            additional_args=subprocess_args(step, deadline)
         )
     except exception:
         try:
             run_subprocess(
                 [sys.executable, '-m', 'pip', 'install', 'virtualenv'],
                 ctx.logger,
-                additional_args=additional_args
+                additional_args=subprocess_args(step, deadline)
             )
             run_subprocess(
                 [sys.executable, '-m', 'virtualenv', path],
                 ctx.logger,
-                additional_args=additional_args
+                additional_args=subprocess_args(step, deadline)
             )
         except exception:
             run_subprocess(
                 [sys.executable, '-m', 'pip', 'install', 'venv'],
                 ctx.logger,
-                additional_args=additional_args
+                additional_args=subprocess_args(step, deadline)
             )
             run_subprocess(
                 [sys.executable, '-m', 'venv', path],
                 ctx.logger,
-                additional_args=additional_args
+                additional_args=subprocess_args(step, deadline)
             )
 
 
-def install_packages_to_venv(venv, packages_list):
+def install_packages_to_venv(venv, packages_list, deadline=None):
     # Force reinstall inside venv in order to make sure
     # packages being installed on specified environment .
     if packages_list:
@@ -486,9 +649,8 @@ def install_packages_to_venv(venv, packages_list):
         ctx.logger.info('Installing {packages} inside venv: {venv}.'.format(
             packages=packages_list,
             venv=venv))
-        additional_args = {
-            'max_sleep_time': ctx.node.properties.get('max_sleep_time')
-        }
+        additional_args = subprocess_args(
+            'installing {0}'.format(packages_list), deadline)
         try:
             run_subprocess(
                 command=command,
@@ -525,6 +687,55 @@ def get_release_name(args_dict):
     return release_name
 
 
+def desired_state_digest(release_name, args_dict, values_file=None,
+                         host=None, resolved_chart=None):
+    """
+    Canonical digest of everything helm upgrade gets as input, so an
+    upgrade to the same desired state can be skipped.
+    Local chart packages and values files are digested by content, charts
+    of a repository by the version helm resolves.
+    :param release_name: name of the release.
+    :param args_dict: arguments dictionary, see tasks.prepare_args.
+    :param values_file: values file path.
+    :param host: API server address.
+    :param resolved_chart: (repository URL, index entry) of the chart, see
+    helm_sdk.Helm.resolve_chart.
+    :return sha256 hex digest, None if the chart is neither a local file
+    nor resolved, an upgrade is then never skipped.
+    """
+    def content(path):
+        if path and os.path.isfile(path):
+            try:
+                return {'file_digest': file_digest(path)}
+            except (IOError, OSError):
+                pass
+        return path
+
+    chart = content(args_dict.get('chart'))
+    if not isinstance(chart, dict):
+        if not resolved_chart:
+            return
+        repo_url, entry = resolved_chart
+        chart = {'chart': chart,
+                 'repo_url': repo_url,
+                 'version': entry.get('version'),
+                 'digest': entry.get('digest')}
+    flags = sorted(args_dict.get(FLAGS_FIELD) or [],
+                   key=lambda flag: json.dumps(flag, sort_keys=True))
+    state = {
+        'release_name': release_name,
+        'chart': chart,
+        'flags': flags,
+        # Order matters, the last --set of a key wins.
+        'set_values': args_dict.get('set_values') or [],
+        'set_values_as_file': args_dict.get('set_values_as_file', False),
+        'values_file': content(values_file),
+        'host': host,
+    }
+    serialized = json.dumps(state, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
 def v1_equal_v2(v1, v2):
     return version.parse(str(v1)) == version.parse(str(v2))
 
@@ -541,16 +752,13 @@ def find_rels_by_node_type(node_instance, node_type):
 def convert_string_to_dict(txt):
     """
     :param txt: string type
-    :return: dict
-    """
-    output = {}
-    rows = txt.split('\n')
-    for row in rows:
-        words = row.split(':')
-        # Make sure it's not empty like ['']
-        if len(words) == 2:
-            output[words[0]] = words[1]
-    return output
+    :return: dict, scalars are kept as strings (version 1.10 is not 1.1).
+    """
+    try:
+        output = yaml.load(txt, Loader=yaml.BaseLoader)
+    except yaml.YAMLError:
+        return {}
+    return output if isinstance(output, dict) else {}
 
 
 def find_repo_nodes():
@@ -1,10 +1,26 @@
 # Copyright © 2024 Dell Inc. or its subsidiaries. All Rights Reserved.
 
 import os
+import json
+import hashlib
 
+from nativeedge_common_sdk.utils import get_deployment_dir
 from nativeedge.exceptions import NonRecoverableError
+from nativeedge.workflows.tasks import HandlerResult
 
 from . import utils
+from .constants import (
+    FLAGS_FIELD,
+    HEALTH_REPORT,
+    RELEASES_FIELD,
+    RESOURCE_CONFIG,
+    MAX_CONCURRENCY,
+    CONFIG_DIR_ENV_VAR,
+    REPOSITORIES_FIELD)
+
+RELEASE_TYPE = 'nativeedge.nodes.helm.Release'
+REPO_TYPE = 'nativeedge.nodes.helm.Repo'
+HEALTH_REPORT_FILE = 'helm_health_report.json'
 
 
 def _helm_operation(ctx,
@@ -35,15 +51,60 @@ def _helm_operation(ctx,
     return graph
 
 
-def update_repositories(ctx, node_instance_id, flags):
+def _repo_groups(ctx):
+    """
+    Group the Repo node instances of the deployment by helm config
+    directory. Repositories of the same config directory are updated by one
+    operation, so each repository is refreshed once.
+    :return dictionary of config directory to list of node instances.
+    """
+    groups = {}
+    for node in ctx.nodes:
+        if REPO_TYPE not in node.type_hierarchy:
+            continue
+        for instance in node.instances:
+            config_dir = instance.runtime_properties.get(
+                CONFIG_DIR_ENV_VAR) or instance.id
+            groups.setdefault(config_dir, []).append(instance)
+    return groups
+
+
+def _update_all_repositories(ctx, flags, max_concurrency):
+    groups = _repo_groups(ctx)
+    if not groups:
+        raise NonRecoverableError(
+            'No node instances of type {type} in the deployment.'.format(
+                type=REPO_TYPE))
+    graph = ctx.graph_mode()
+    for config_dir, instances in sorted(groups.items()):
+        instances = sorted(instances, key=lambda instance: instance.id)
+        names = sorted(set(
+            instance.node.properties[RESOURCE_CONFIG]['name']
+            for instance in instances))
+        ctx.logger.info(
+            'Updating repositories {names} of {dir} through node instance: '
+            '{id}'.format(names=names, dir=config_dir, id=instances[0].id))
+        graph.add_task(instances[0].execute_operation(
+            'helm.update_repo',
+            kwargs={FLAGS_FIELD: flags,
+                    REPOSITORIES_FIELD: names,
+                    MAX_CONCURRENCY: max_concurrency},
+            allow_kwargs_override=True))
+    return graph
+
+
+def update_repositories(ctx, node_instance_id, flags, max_concurrency=None):
     # TODO: Remove the check when 4.X is not supported, add to flags
     #  parameter type: list in plugin.yaml
     if type(flags) is not list:
         raise NonRecoverableError('Flags parameter must be a list.')
+    if not node_instance_id:
+        _update_all_repositories(ctx, flags, max_concurrency).execute()
+        return
     _helm_operation(ctx,
                     "helm.update_repo",
                     node_instance_id,
-                    'nativeedge.nodes.helm.Repo',
+                    REPO_TYPE,
                     flags=flags).execute()
 
 
@@ -58,7 +119,7 @@ def upgrade_release(ctx,
         release_instance_ids = []
         for node in ctx.nodes:
             for i in node.instances:
-                if 'nativeedge.nodes.helm.Release' in i.node.type_hierarchy:
+                if RELEASE_TYPE in i.node.type_hierarchy:
                     release_instance_ids.append(i.id)
         if len(release_instance_ids) != 1:
             raise NonRecoverableError(
@@ -83,7 +144,7 @@ def upgrade_release(ctx,
             _helm_operation(ctx,
                             "helm.upgrade_release",
                             node_instance_id,
-                            'nativeedge.nodes.helm.Release',
+                            RELEASE_TYPE,
                             chart=chart,
                             flags=flags,
                             set_values=set_values,
@@ -92,8 +153,268 @@ def upgrade_release(ctx,
         _helm_operation(ctx,
                         "helm.upgrade_release",
                         node_instance_id,
-                        'nativeedge.nodes.helm.Release',
+                        RELEASE_TYPE,
                         chart=chart,
                         flags=flags,
                         set_values=set_values,
                         values_file=values_file).execute()
+
+
+class ReleaseFailureThreshold(object):
+    """
+    on_failure handler of the release subgraphs of upgrade_releases.
+    Failed releases are ignored, so the other releases keep upgrading,
+    until more than max_failures releases failed. Then the workflow fails
+    and releases that did not start yet are not upgraded.
+    """
+
+    def __init__(self, max_failures=0, failed=None):
+        self.max_failures = max_failures
+        self.failed = failed or []
+
+    def dump(self):
+        return {'max_failures': self.max_failures, 'failed': self.failed}
+
+    def __call__(self, subgraph):
+        self.failed.append(subgraph.name)
+        logger = subgraph.workflow_context.logger
+        if len(self.failed) > self.max_failures:
+            logger.error(
+                'Releases {0} failed to upgrade, more than the allowed {1}, '
+                'stopping.'.format(self.failed, self.max_failures))
+            return HandlerResult.fail()
+        logger.error('Release {0} failed to upgrade, continuing ({1} of {2} '
+                     'allowed failures).'.format(subgraph.name,
+                                                 len(self.failed),
+                                                 self.max_failures))
+        return HandlerResult.ignore()
+
+
+def _release_instances(ctx, node_ids, node_types, labels):
+    """
+    Find the node instances to upgrade.
+    :param node_ids: node ids to select, all nodes if empty.
+    :param node_types: an instance matches if it is of one of these types.
+    :param labels: dictionary that must be contained in the node labels
+    property.
+    :return list of node instances, sorted by id.
+    """
+    instances = []
+    for node in ctx.nodes:
+        if node_ids and node.id not in node_ids:
+            continue
+        if not any(node_type in node.type_hierarchy
+                   for node_type in node_types):
+            continue
+        node_labels = node.properties.get('labels') or {}
+        if any(node_labels.get(key) != value
+               for key, value in labels.items()):
+            continue
+        instances.extend(node.instances)
+    return sorted(instances, key=lambda instance: instance.id)
+
+
+def _upgrade_releases_graph(ctx,
+                            instances,
+                            concurrency,
+                            batch_size,
+                            max_failures,
+                            **kwargs):
+    """
+    Add an upgrade subgraph per release. A release waits for the release
+    concurrency places before it, so at most concurrency releases upgrade
+    at once, and for all the releases of the previous batch.
+    """
+    graph = ctx.graph_mode()
+    on_failure = ReleaseFailureThreshold(max_failures)
+    previous_batch = []
+    for start in range(0, len(instances), batch_size):
+        batch = []
+        for instance in instances[start:start + batch_size]:
+            ctx.logger.info('Adding node instance: {id}'.format(
+                id=instance.id))
+            subgraph = graph.subgraph(instance.id)
+            subgraph.on_failure = on_failure
+            subgraph.add_task(instance.execute_operation(
+                'helm.upgrade_release',
+                kwargs=kwargs,
+                allow_kwargs_override=True))
+            for dependency in previous_batch:
+                graph.add_dependency(subgraph, dependency)
+            if len(batch) >= concurrency:
+                graph.add_dependency(subgraph, batch[-concurrency])
+            batch.append(subgraph)
+        previous_batch = batch
+    return graph
+
+
+def upgrade_releases(ctx,
+                     node_ids,
+                     node_types,
+                     labels,
+                     chart,
+                     flags,
+                     set_values,
+                     values_file,
+                     concurrency,
+                     batch_size,
+                     max_failures):
+    """
+    Upgrade every matching release of the deployment in one execution.
+    :param node_ids: node ids to upgrade, all nodes if empty.
+    :param node_types: node types to upgrade.
+    :param labels: only upgrade nodes whose labels property contains these.
+    :param concurrency: maximum number of releases upgrading at once.
+    :param batch_size: number of releases per batch, a batch starts after
+    the previous batch finished. 0 means one batch.
+    :param max_failures: number of failed releases tolerated before the
+    workflow stops.
+    """
+    if type(flags) is not list:
+        raise NonRecoverableError('Flags parameter must be a list.')
+    if type(node_ids) is not list or type(node_types) is not list:
+        raise NonRecoverableError(
+            'node_ids and node_types parameters must be lists.')
+    if not isinstance(labels, dict):
+        raise NonRecoverableError('labels parameter must be a dictionary.')
+    if concurrency < 1 or batch_size < 0 or max_failures < 0:
+        raise NonRecoverableError(
+            'concurrency must be positive, batch_size and max_failures '
+            'must not be negative.')
+    instances = _release_instances(
+        ctx, node_ids, node_types or [RELEASE_TYPE], labels)
+    if not instances:
+        raise NonRecoverableError(
+            'No node instances match node_ids: {0}, node_types: {1}, '
+            'labels: {2}.'.format(node_ids, node_types, labels))
+    ctx.logger.info('Upgrading {0} releases, {1} at a time.'.format(
+        len(instances), concurrency))
+    kwargs = dict(flags=flags, set_values=set_values)
+    if chart:
+        kwargs['chart'] = chart
+    if values_file and not os.path.isabs(values_file):
+        with utils.get_values_file(ctx,
+                                   False,
+                                   values_file) as temp_values_file:
+            _upgrade_releases_graph(ctx,
+                                    instances,
+                                    concurrency,
+                                    batch_size or len(instances),
+                                    max_failures,
+                                    values_file=temp_values_file,
+                                    **kwargs).execute()
+    else:
+        _upgrade_releases_graph(ctx,
+                                instances,
+                                concurrency,
+                                batch_size or len(instances),
+                                max_failures,
+                                values_file=values_file,
+                                **kwargs).execute()
+
+
+def _cluster_key(instance):
+    """
+    Key of the cluster a release instance connects to: its client config
+    and the shared clusters it is connected to. Releases with the same key
+    can share one connection.
+    """
+    shared_clusters = sorted(
+        relationship.target_id for relationship in instance.relationships
+        if relationship.type == utils.CLUSTER_REL)
+    return hashlib.sha256(json.dumps(
+        [instance.node.properties.get('client_config'), shared_clusters],
+        sort_keys=True,
+        default=str).encode('utf-8')).hexdigest()
+
+
+def _release_config(instance):
+    """
+    Release name and flags of a release instance, read like the operations
+    read them: the runtime resource_config and the install output first,
+    then the node properties.
+    """
+    runtime_properties = instance.runtime_properties or {}
+    resource_config = dict(
+        instance.node.properties.get(RESOURCE_CONFIG) or {})
+    resource_config.update(runtime_properties.get(RESOURCE_CONFIG) or {})
+    install_output = runtime_properties.get('install_output')
+    if not isinstance(install_output, dict):
+        install_output = {}
+    return {
+        'instance': instance.id,
+        'name': install_output.get('name') or
+        resource_config.get('name') or
+        resource_config.get('release_name'),
+        FLAGS_FIELD: resource_config.get(FLAGS_FIELD) or [],
+    }
+
+
+def _check_releases_health_graph(ctx, instances, max_concurrency):
+    groups = {}
+    for instance in instances:
+        groups.setdefault(_cluster_key(instance), []).append(instance)
+    graph = ctx.graph_mode()
+    for group in groups.values():
+        releases = [_release_config(instance) for instance in group]
+        ctx.logger.info(
+            'Checking {count} releases through node instance: {id}'.format(
+                count=len(releases), id=group[0].id))
+        graph.add_task(group[0].execute_operation(
+            'helm.check_releases_health',
+            kwargs={RELEASES_FIELD: releases,
+                    MAX_CONCURRENCY: max_concurrency},
+            allow_kwargs_override=True))
+    return graph, groups
+
+
+def check_releases_health(ctx,
+                          node_ids,
+                          labels,
+                          max_concurrency,
+                          fail_on_unhealthy=True):
+    """
+    Check the health of every release of the deployment. Releases are
+    grouped by cluster, each group is checked by one operation and the
+    reports are merged into one report, written to the deployment
+    directory.
+    :param node_ids: node ids to check, all Release nodes if empty.
+    :param labels: only check nodes whose labels property contains these.
+    :param max_concurrency: releases checked at the same time per cluster.
+    :param fail_on_unhealthy: fail the workflow if a release is unhealthy.
+    """
+    if type(node_ids) is not list:
+        raise NonRecoverableError('node_ids parameter must be a list.')
+    if not isinstance(labels, dict):
+        raise NonRecoverableError('labels parameter must be a dictionary.')
+    instances = _release_instances(ctx, node_ids, [RELEASE_TYPE], labels)
+    if not instances:
+        raise NonRecoverableError(
+            'No node instances match node_ids: {0}, labels: {1}.'.format(
+                node_ids, labels))
+    graph, groups = _check_releases_health_graph(
+        ctx, instances, max_concurrency)
+    graph.execute()
+    ctx.refresh_node_instances()
+    report = {}
+    for group in groups.values():
+        instance = ctx.get_node_instance(group[0].id)
+        report.update(instance.runtime_properties.get(HEALTH_REPORT) or {})
+    path = os.path.join(get_deployment_dir(ctx.deployment.id),
+                        HEALTH_REPORT_FILE)
+    with open(path, 'w') as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+    unhealthy = sorted(instance_id for instance_id, release in report.items()
+                       if not release.get('healthy'))
+    ctx.logger.info(
+        'Checked {count} releases in {groups} clusters, {unhealthy} '
+        'unhealthy. Report: {path}'.format(count=len(report),
+                                           groups=len(groups),
+                                           unhealthy=len(unhealthy),
+                                           path=path))
+    if unhealthy and fail_on_unhealthy:
+        raise NonRecoverableError(
+            'Unhealthy releases: {0}'.format(
+                dict((instance_id, report[instance_id]['errors'] or
+                      report[instance_id]['status'])
+                     for instance_id in unhealthy)))
@@ -17,17 +17,49 @@ import os
 import re
 import json
 import yaml
+import base64
+import time
+import shutil
+import tempfile
 from tempfile import NamedTemporaryFile
+from concurrent.futures import ThreadPoolExecutor
 
 from cloudify_common_sdk.utils import v1_gteq_v2
 
+from .values import set_values_file
+from .kubeconfig import parse_kubeconfig
+from .circuit_breaker import endpoint_breaker, guarded
+from .deadline import MIN_STEP_TIMEOUT
+from .retry import RetryPolicy, is_release_not_found
+from .governor import host_governor
+from .semver import version_key
+from .oci import (
+    OCI_SCHEME,
+    Registry,
+    chart_metadata,
+    archive_digest,
+    parse_reference)
+from .chart_index import open_index
+from .chart_cache import ChartCache, chart_key
+from .helm_config import (
+    read_repositories,
+    repositories_path,
+    read_registry_config,
+    registry_config_path)
+from .repository import (
+    index_path,
+    refresh_index,
+    is_natively_refreshable,
+    url_repo_name,
+    default_cache_home)
+from .batch import ReleaseBatch, DEFAULT_MAX_WORKERS, DEFAULT_CLUSTER_LIMIT
+from .flags import get_schema, get_version, compile_flags
 from .exceptions import CloudifyHelmSDKError
 from helm_sdk.utils import (
+    STATUS_FLAGS,
     run_subprocess,
-    prepare_parameter,
     prepare_set_parameters,
-    validate_flags_for_status,
-    validate_no_collisions_between_params_and_flags)
+    FLAGS_LIST_TO_VALIDATE)
 
 
 # Helm cli flags names
@@ -67,6 +99,7 @@ PUSH_FLAGS = [
     'ca-file',
     'key-file',
     'cert-file',
+    'plain-http',
     'insecure-skip-tls-verify'
 ]
 PULL_FLAGS = [
@@ -81,20 +114,47 @@ PULL_FLAGS = [
     'password',
     'untardir',
     'username',
-    'cert-file',
+    'version',
     'destination',
+    'cert-file',
+    'plain-http',
     'pass-credentials',
     'insecure-skip-tls-verify'
 ]
 
+# Commands that drop flags they don't support, with the flags they support
+# when the schema can't be read from the helm binary help.
+FLAGS_SCHEMA_DEFAULTS = {
+    'status': STATUS_FLAGS,
+    'pull': PULL_FLAGS + PARENT_FLAGS,
+    'push': PUSH_FLAGS + PARENT_FLAGS,
+    'registry logout': PARENT_FLAGS,
+}
+# Commands release operations compile flags for, warmed by prefetch.
+PREFETCH_COMMANDS = ['status', 'pull']
+# Helm waits for resources this many seconds less than the time left, so it
+# stops waiting, and rolls back an atomic upgrade, before it is killed.
+HELM_TIMEOUT_MARGIN = 10
+
 
 class Helm(object):
 
     def __init__(self,
                  logger,
                  binary_path,
-                 environment_variables
+                 environment_variables,
+                 deadline=None,
+                 retry_policy=None,
+                 governor=None
                  ):
+        """
+        :param deadline: helm_sdk.deadline.Deadline of the operation, the
+        commands get the time left instead of their max_sleep_time.
+        :param retry_policy: helm_sdk.retry.RetryPolicy of the commands
+        against the cluster.
+        :param governor: helm_sdk.governor.Governor of the helm processes
+        of the host, the one with the default limits if None.
+        """
         self.binary_path = binary_path
         self.logger = logger
         if not isinstance(environment_variables, dict):
@@ -104,8 +164,40 @@ class Helm(object):
                     environment_variables)))
 
         self.env = environment_variables
+        self.deadline = deadline
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.governor = governor or host_governor()
+
+    def copy(self):
+        """
+        :return client for another thread, execute updates the environment
+        so concurrent commands must not share a client. The copy shares the
+        deadline, the retry metrics and the governor.
+        """
+        return self.__class__(self.logger,
+                              self.binary_path,
+                              dict(self.env),
+                              self.deadline,
+                              self.retry_policy,
+                              self.governor)
 
     def execute(self, command, additional_args=None, return_output=False):
+        if command[0] != self.binary_path or len(command) < 2:
+            return self._run(command, additional_args, return_output)
+        # Helm processes of the host queue for a slot, the wait counts
+        # against the deadline.
+        with self.governor.slot(
+                command[1],
+                self.logger,
+                self.deadline.remaining() if self.deadline else None):
+            return self._run(command, additional_args, return_output)
+
+    def _run(self, command, additional_args, return_output):
+        if self.deadline:
+            additional_args = dict(additional_args or {})
+            additional_args['max_sleep_time'] = self.deadline.timeout(
+                ' '.join([os.path.basename(command[0])] + command[1:2]),
+                additional_args.get('max_sleep_time'))
         return run_subprocess(
             command,
             self.logger,
@@ -114,6 +206,29 @@ class Helm(object):
             additional_args=additional_args,
             return_output=return_output)
 
+    def _call(self, command, circuit, fn, verify=None):
+        """
+        Run fn, that executes a helm command against a cluster, under the
+        circuit breaker of the cluster and the retry policy.
+        """
+        def attempt():
+            with guarded(circuit):
+                return fn()
+        return self.retry_policy.call(
+            command, attempt, verify, self.deadline, self.logger)
+
+    def _wait_timeout(self, cmd, flags):
+        """
+        Limit the wait of helm for the release resources to the time left,
+        unless the user set --timeout.
+        """
+        if self.deadline and 'timeout' not in flags.names:
+            cmd.append(APPEND_FLAG_STRING.format(
+                name='timeout',
+                value='{0}s'.format(max(
+                    MIN_STEP_TIMEOUT,
+                    int(self.deadline.remaining()) - HELM_TIMEOUT_MARGIN))))
+
     def _helm_command(self, args):
         if not os.access(self.binary_path, os.X_OK):
             self.execute(['chmod', 'u+x', self.binary_path])
@@ -121,6 +236,39 @@ class Helm(object):
         cmd.extend(args)
         return cmd
 
+    def batch(self,
+              specs=None,
+              max_workers=DEFAULT_MAX_WORKERS,
+              cluster_limit=DEFAULT_CLUSTER_LIMIT):
+        """
+        Create a batch of release operations, see helm_sdk.batch.
+        :param specs: list of ReleaseSpec.
+        :param max_workers: maximum number of concurrent helm commands.
+        :param cluster_limit: maximum number of concurrent helm commands
+        against the same cluster.
+        :return ReleaseBatch, call run(action) to execute it.
+        """
+        return ReleaseBatch(self, specs, max_workers, cluster_limit)
+
+    def compile_flags(self, command, flags, reserved=None):
+        """
+        Compile flags for a helm command, see helm_sdk.flags.compile_flags.
+        :param command: helm command, e.g. 'install' or 'registry logout'.
+        :param flags: list of flags dictionaries or CompiledFlags.
+        :param reserved: flag names that must be passed as parameters.
+        :return CompiledFlags
+        """
+        schema = None
+        if command in FLAGS_SCHEMA_DEFAULTS:
+            schema = get_schema(
+                self.binary_path,
+                command,
+                lambda: self.execute(
+                    self._helm_command(command.split() + ['--help']),
+                    return_output=True),
+                frozenset(FLAGS_SCHEMA_DEFAULTS[command]))
+        return compile_flags(flags, schema, reserved, self.logger)
+
     def handle_auth_params(self,
                            cmd,
                            kubeconfig=None,
@@ -135,6 +283,7 @@ class Helm(object):
             :param: token: bearer token used for authentication.
             :param: apiserver: the address and the port for the Kubernetes API
             server.
+            :return circuit breaker of the API server, see circuit.
         """
 
         if not kubeconfig and not (token and apiserver):
@@ -164,6 +313,23 @@ class Helm(object):
             cmd.append(
                 APPEND_FLAG_STRING.format(
                     name=ca_file_key or HELM_KUBE_CA_FILE_FLAG, value=ca_file))
+        return self.circuit(kubeconfig, apiserver)
+
+    def circuit(self, kubeconfig=None, apiserver=None):
+        """
+        Circuit breaker of the API server a command connects to, see
+        helm_sdk.circuit_breaker.
+        :return CircuitBreaker, None if the API server is unknown.
+        """
+        endpoint = apiserver
+        if not endpoint and kubeconfig:
+            try:
+                endpoint = parse_kubeconfig(kubeconfig).server
+            except Exception as e:
+                self.logger.debug(
+                    'Unable to read the API server of kubeconfig: {0}'.format(
+                        e))
+        return endpoint_breaker(endpoint)
 
     def install(self,
                 name,
@@ -177,6 +343,7 @@ class Helm(object):
                 ca_file=None,
                 additional_env=None,
                 additional_args=None,
+                set_values_as_file=False,
                 **_):
         """
         Execute helm install command.
@@ -184,6 +351,8 @@ class Helm(object):
         :param chart: chart name to install.
         :param flags: list of flags to add to the install command.
         :param set_values: list of variables and their values for --set.
+        :param set_values_as_file: pass set_values as a values overlay file
+        instead of --set arguments.
         :param kubeconfig: path to kubeconfig file.
         :param values_file: values file path.
         :param token: bearer token used for authentication.
@@ -191,32 +360,65 @@ class Helm(object):
         server.
         :return output of install command.
         """
-        flags = flags or []
-        validate_no_collisions_between_params_and_flags(flags)
-
-        for item in flags:
-            if 'repo' == item['name']:
-                if '/' in chart:
-                    chart = '/'.join(chart.split('/')[1:])
-                    break
+        status_kwargs = dict(
+            flags=flags if isinstance(flags, list) else None,
+            kubeconfig=kubeconfig,
+            token=token,
+            apiserver=apiserver,
+            ca_file=ca_file,
+            additional_args=additional_args)
+        flags = self.compile_flags('install', flags, FLAGS_LIST_TO_VALIDATE)
+        if 'repo' in flags.names and '/' in chart and \
+                not os.path.exists(chart):
+            chart = '/'.join(chart.split('/')[1:])
         cmd = ['install', name, chart, '--wait', '--output=json']
-        self.handle_auth_params(
+        circuit = self.handle_auth_params(
             cmd, kubeconfig, token, apiserver, ca_file)
         if values_file:
             cmd.append(APPEND_FLAG_STRING.format(name=HELM_VALUES_FLAG,
                                                  value=values_file))
 
-        cmd.extend([prepare_parameter(flag) for flag in flags])
+        cmd.extend(flags.argv)
+        self._wait_timeout(cmd, flags)
         set_arguments = set_values or []
-        cmd.extend(prepare_set_parameters(set_arguments))
+        if set_values_as_file and set_arguments:
+            cmd.append(APPEND_FLAG_STRING.format(
+                name=HELM_VALUES_FLAG, value=set_values_file(set_arguments)))
+        else:
+            cmd.extend(prepare_set_parameters(set_arguments))
         if additional_env:
             self.env.update(additional_env)
-        output = self.execute(
-            self._helm_command(cmd),
-            additional_args=additional_args,
-            return_output=True)
+        output = self._call(
+            'install',
+            circuit,
+            lambda: self.execute(
+                self._helm_command(cmd),
+                additional_args=additional_args,
+                return_output=True),
+            lambda error: self._verify_install(name, error, **status_kwargs))
         return self.load_json(output)
 
+    def _verify_install(self, name, error, **status_kwargs):
+        """
+        Tell what an install that failed with a transient error did.
+        :return status of the release, as a JSON string, if it was
+        deployed, None if there is no release and the install can run
+        again.
+        :raise error if the release is in another state.
+        """
+        try:
+            state = self.status(name, **status_kwargs)
+        except Exception as e:
+            if is_release_not_found(e):
+                return
+            raise error
+        if state.get('info', {}).get('status') == 'deployed':
+            self.logger.info(
+                'Release {0} was deployed by the failed install.'.format(
+                    name))
+            return json.dumps(state)
+        raise error
+
     def uninstall(self,
                   name,
                   flags=None,
@@ -232,21 +434,20 @@ class Helm(object):
             cmd = ['uninstall', name, '--wait']
         else:
             cmd = ['uninstall', name]
-        self.handle_auth_params(
+        circuit = self.handle_auth_params(
             cmd, kubeconfig,
             token,
             apiserver,
             ca_file)
-        flags = flags or []
-        for item in flags:
-            if 'repo' == item['name']:
-                flags.remove(item)
-                break
-        validate_no_collisions_between_params_and_flags(flags)
-        cmd.extend([prepare_parameter(flag) for flag in flags])
+        flags = [flag for flag in flags or [] if flag.get('name') != 'repo']
+        flags = self.compile_flags('uninstall', flags, FLAGS_LIST_TO_VALIDATE)
+        cmd.extend(flags.argv)
+        self._wait_timeout(cmd, flags)
         if additional_env:
             self.env.update(additional_env)
-        self.execute(self._helm_command(cmd), additional_args=additional_args)
+        with guarded(circuit):
+            self.execute(self._helm_command(cmd),
+                         additional_args=additional_args)
 
     def repo_add(self,
                  name,
@@ -255,8 +456,7 @@ class Helm(object):
                  additional_args=None,
                  **_):
         cmd = ['repo', 'add', name, repo_url]
-        flags = flags or []
-        cmd.extend([prepare_parameter(flag) for flag in flags])
+        cmd.extend(self.compile_flags('repo add', flags).argv)
         self.execute(self._helm_command(cmd), additional_args=additional_args)
 
     def repo_remove(self,
@@ -265,8 +465,7 @@ class Helm(object):
                     additional_args=None,
                     **_):
         cmd = ['repo', 'remove', name]
-        flags = flags or []
-        cmd.extend([prepare_parameter(flag) for flag in flags])
+        cmd.extend(self.compile_flags('repo remove', flags).argv)
         self.execute(self._helm_command(cmd), additional_args=additional_args)
 
     def show_chart(self, chart_name, repo_url):
@@ -275,14 +474,270 @@ class Helm(object):
         return self.load_json(output)
 
     def repo_list(self):
+        """
+        List the repositories, like `helm repo list --output=json`.
+        repositories.yaml is read directly, the CLI is used only if it
+        does not exist or can't be read.
+        :return list of dictionaries with name and url.
+        """
+        try:
+            repositories = read_repositories(repositories_path(self.env))
+        except CloudifyHelmSDKError as e:
+            self.logger.debug(str(e))
+            repositories = None
+        if repositories is not None:
+            return [{'name': repo.get('name'), 'url': repo.get('url')}
+                    for repo in repositories]
         cmd = ['repo', 'list', '--output=json']
         output = self.execute(self._helm_command(cmd), return_output=True)
         return self.load_json(output)
 
-    def repo_update(self, flags, additional_args=None, **_):
+    def repo_entry(self, name):
+        """
+        :return the repositories.yaml entry of repository name, with url and
+        credentials, None if it was not added.
+        """
+        for repo in read_repositories(repositories_path(self.env)) or []:
+            if repo.get('name') == name:
+                return repo
+
+    def resolve_chart(self, chart, flags=None):
+        """
+        Resolve a <repo>/<chart> reference, or a chart of the repository URL
+        of the repo flag, to the chart version helm would install, from the
+        cached repository index, the same index helm install reads.
+        :param chart: chart reference.
+        :param flags: install flags, for repo, version and devel.
+        :return (repository URL, index entry), None if the chart is not of
+        a repository or can't be resolved.
+        """
+        if not chart or os.path.exists(chart):
+            return
+        names = _flag_values(flags)
+        if names.get('repo'):
+            if '/' in chart:
+                return
+            repo_url, chart_name = names['repo'], chart
+            repo_name = url_repo_name(repo_url)
+            # helm downloads the index of a repo URL on each install, a
+            # conditional refresh keeps the cached one current.
+            self.refresh_repo_index(
+                repo_name,
+                repo_url,
+                ca_file=names.get('ca-file'),
+                insecure_skip_tls_verify=_flag_set(
+                    names, 'insecure-skip-tls-verify'))
+        elif chart.count('/') == 1:
+            repo_name, chart_name = chart.split('/')
+            repo = self.repo_entry(repo_name)
+            if not repo:
+                return
+            repo_url = repo['url']
+        else:
+            return
+        version = names.get('version')
+        if not version and 'devel' in names:
+            version = '>=0.0.0-0'
+        try:
+            entry = self.chart_index(repo_name).get(chart_name, version)
+        except CloudifyHelmSDKError as e:
+            self.logger.debug(str(e))
+            return
+        if not entry or not entry.get('digest'):
+            return
+        return repo_url, entry
+
+    def cached_chart(self, chart, flags=None, cache=None):
+        """
+        Get a verified local archive of a <repo>/<chart> reference, or of a
+        chart of the repository URL of the repo flag.
+        The version is resolved with resolve_chart, and the archive is
+        pulled once into the chart cache, keyed by repository URL, chart
+        and version.
+        :param chart: chart reference.
+        :param flags: install flags, for repo, version and devel.
+        :param cache: ChartCache, the shared cache by default.
+        :return path of the archive, None if the chart can't be cached.
+        """
+        names = _flag_values(flags)
+        if any(name in names for name in ['verify', 'username', 'password']):
+            return
+        resolved = self.resolve_chart(chart, flags)
+        if not resolved:
+            return
+        repo_url, entry = resolved
+        chart_name = chart if names.get('repo') else chart.split('/')[1]
+        pull_flags = []
+        if names.get('repo'):
+            pull_flags.append({'name': 'repo', 'value': repo_url})
+        cache = cache or ChartCache()
+        key = chart_key(repo_url, chart_name, entry['version'])
+        path = cache.get(key)
+        if path:
+            self.logger.debug('Using cached chart {0} {1}.'.format(
+                chart, entry['version']))
+            return path
+        destination = tempfile.mkdtemp()
+        try:
+            self.pull(chart,
+                      flags=pull_flags + [
+                          {'name': 'version', 'value': entry['version']},
+                          {'name': 'destination', 'value': destination}])
+            archives = os.listdir(destination)
+            if len(archives) != 1:
+                raise CloudifyHelmSDKError(
+                    'Unexpected pull result for {0}: {1}'.format(
+                        chart, archives))
+            return cache.put(key,
+                             os.path.join(destination, archives[0]),
+                             entry['digest'])
+        finally:
+            shutil.rmtree(destination, ignore_errors=True)
+
+    def prefetch(self,
+                 charts=None,
+                 commands=None,
+                 max_workers=DEFAULT_MAX_WORKERS,
+                 cache=None):
+        """
+        Warm the caches release operations read, concurrently: the helm
+        version, the flag schemas of helm commands, and the repository
+        index and archive of charts.
+        :param charts: list of dictionaries with chart, repo_url and an
+        optional version or version constraint.
+        :param commands: helm commands to read the flag schemas of.
+        :param cache: ChartCache, the shared cache by default.
+        :return dictionary of task name to status, error and duration.
+        """
+        def chart_task(spec):
+            chart_flags = [{'name': 'repo', 'value': spec['repo_url']}]
+            if spec.get('version'):
+                chart_flags.append(
+                    {'name': 'version', 'value': str(spec['version'])})
+
+            def task(client):
+                if not client.cached_chart(spec['chart'], chart_flags, cache):
+                    raise CloudifyHelmSDKError(
+                        'Chart {0} {1} not found in {2}.'.format(
+                            spec['chart'], spec.get('version') or '',
+                            spec['repo_url']))
+            return task
+
+        def schema_task(command):
+            return lambda client: client.compile_flags(command, [])
+
+        tasks = {'version': lambda client: client.get_helm_version()}
+        for command in commands or PREFETCH_COMMANDS:
+            tasks['flags ' + command] = schema_task(command)
+        for spec in charts or []:
+            if not spec.get('chart') or not spec.get('repo_url'):
+                raise CloudifyHelmSDKError(
+                    'Prefetch chart requires chart and repo_url: {0}'.format(
+                        spec))
+            tasks['chart {0} {1}'.format(
+                spec['repo_url'], spec['chart'])] = chart_task(spec)
+
+        def run(name):
+            # Each thread uses its own client, execute updates the
+            # environment.
+            client = self.copy()
+            start = time.monotonic()
+            try:
+                tasks[name](client)
+            except Exception as e:
+                return {'status': 'failed', 'error': str(e),
+                        'duration': round(time.monotonic() - start, 3)}
+            return {'status': 'succeeded', 'error': None,
+                    'duration': round(time.monotonic() - start, 3)}
+
+        names = sorted(tasks)
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            return dict(zip(names, executor.map(run, names)))
+
+    def refresh_repo_index(self, name, repo_url, **kwargs):
+        """
+        Download the index of a repository without the helm CLI, into the
+        HELM_CACHE_HOME of this client. See repository.refresh_index.
+        :return IndexRefresh
+        """
+        return refresh_index(name,
+                             repo_url,
+                             cache_home=self.cache_home,
+                             logger=self.logger,
+                             **kwargs)
+
+    @property
+    def cache_home(self):
+        return self.env.get('HELM_CACHE_HOME') or default_cache_home()
+
+    def chart_index(self, name):
+        """
+        Lookup table of the cached index of repository name.
+        :return chart_index.ChartIndex
+        """
+        return open_index(index_path(self.cache_home, name))
+
+    def repo_chart(self, chart_name, repo_url, version=None, **kwargs):
+        """
+        Get the metadata of a chart from a repository index, like
+        `helm show chart CHART --repo URL` without running helm.
+        :param version: exact version or constraint, latest if empty.
+        :return index entry of the chart version.
+        """
+        name = url_repo_name(repo_url)
+        self.refresh_repo_index(name, repo_url, **kwargs)
+        entry = self.chart_index(name).get(chart_name, version)
+        if not entry:
+            raise CloudifyHelmSDKError(
+                'Chart {0} {1} not found in {2}.'.format(
+                    chart_name, version or '', repo_url))
+        return entry
+
+    def repo_update(self, flags, additional_args=None, names=None, **_):
+        """
+        Update the indexes of repositories, like helm repo update.
+        Indexes of HTTP(S) repositories without credentials are refreshed
+        with conditional requests, see refresh_repo_index, an index that
+        did not change is not downloaded again. The other repositories are
+        updated by helm.
+        :param flags: list of flags to add to the helm command.
+        :param names: names of the repositories to update, all repositories
+        if empty.
+        :return dictionary of repository name to IndexRefresh, None for the
+        repositories helm updated.
+        """
+        repos = read_repositories(repositories_path(self.env)) or []
+        if names:
+            by_name = dict((repo.get('name'), repo) for repo in repos)
+            repos = [by_name.get(name) or {'name': name} for name in names]
+        results = {}
+        helm_names = []
+        for repo in repos:
+            if is_natively_refreshable(repo):
+                results[repo['name']] = self.refresh_repo_index(
+                    repo['name'],
+                    repo['url'],
+                    ca_file=repo.get('caFile') or None,
+                    insecure_skip_tls_verify=bool(
+                        repo.get('insecure_skip_tls_verify')))
+            else:
+                helm_names.append(repo['name'])
+        # Without repositories helm tells there is nothing to update.
+        if helm_names or not repos:
+            self._helm_repo_update(
+                flags, additional_args, helm_names if names else None)
+            results.update((name, None) for name in helm_names)
+        return results
+
+    def _helm_repo_update(self, flags, additional_args=None, names=None):
         cmd = ['repo', 'update']
-        flags = flags or []
-        cmd.extend([prepare_parameter(flag) for flag in flags])
+        if names and self.check_repo_update_names_supported():
+            cmd.extend(names)
+        elif names:
+            self.logger.debug(
+                'helm {0} does not update repositories by name, updating '
+                'all of them.'.format(self.get_helm_version()))
+        cmd.extend(self.compile_flags('repo update', flags).argv)
         self.execute(self._helm_command(cmd), additional_args=additional_args)
 
     def upgrade(self,
@@ -297,6 +752,7 @@ class Helm(object):
                 ca_file=None,
                 additional_env=None,
                 additional_args=None,
+                set_values_as_file=False,
                 **_):
         """
         Execute helm upgrade command.
@@ -306,6 +762,8 @@ class Helm(object):
         a packaged chart, or a fully qualified URL.
         :param flags: list of flags to add to the upgrade command.
         :param set_values: list of variables and their values for --set.
+        :param set_values_as_file: pass set_values as a values overlay file
+        instead of --set arguments.
         :param kubeconfig: path to kubeconfig file.
         :param values_file: values file path.
         :param token: bearer token used for authentication.
@@ -317,22 +775,28 @@ class Helm(object):
             raise CloudifyHelmSDKError(
                 'Must provide chart for upgrade release.')
         cmd = ['upgrade', release_name, chart, '--atomic', '-o=json']
-        self.handle_auth_params(cmd, kubeconfig, token, apiserver, ca_file)
+        circuit = self.handle_auth_params(
+            cmd, kubeconfig, token, apiserver, ca_file)
         if values_file:
             cmd.append(APPEND_FLAG_STRING.format(name=HELM_VALUES_FLAG,
                                                  value=values_file))
-        flags = flags or []
-        validate_no_collisions_between_params_and_flags(flags)
-        cmd.extend([prepare_parameter(flag) for flag in flags])
+        flags = self.compile_flags('upgrade', flags, FLAGS_LIST_TO_VALIDATE)
+        cmd.extend(flags.argv)
+        self._wait_timeout(cmd, flags)
         set_arguments = set_values or []
-        cmd.extend(prepare_set_parameters(set_arguments))
+        if set_values_as_file and set_arguments:
+            cmd.append(APPEND_FLAG_STRING.format(
+                name=HELM_VALUES_FLAG, value=set_values_file(set_arguments)))
+        else:
+            cmd.extend(prepare_set_parameters(set_arguments))
         if additional_env:
             self.env.update(additional_env)
         try:
-            output = self.execute(
-                self._helm_command(cmd),
-                additional_args=additional_args,
-                return_output=True)
+            with guarded(circuit):
+                output = self.execute(
+                    self._helm_command(cmd),
+                    additional_args=additional_args,
+                    return_output=True)
             output = self.load_json(output)
         except Exception as e:
             match = str(e).find(
@@ -380,17 +844,19 @@ class Helm(object):
         :return output of helm upgrade command.
         """
         cmd = ['get', 'all', release_name]
-        self.handle_auth_params(cmd, kubeconfig, token, apiserver, ca_file)
-        flags = flags or []
-        validate_no_collisions_between_params_and_flags(flags)
-        cmd.extend([prepare_parameter(flag) for flag in flags])
-        cmd.extend(prepare_set_parameters([]))
+        circuit = self.handle_auth_params(
+            cmd, kubeconfig, token, apiserver, ca_file)
+        cmd.extend(self.compile_flags(
+            'get all', flags, FLAGS_LIST_TO_VALIDATE).argv)
         if additional_env:
             self.env.update(additional_env)
-        output = self.execute(
-            self._helm_command(cmd),
-            additional_args=additional_args,
-            return_output=True)
+        output = self._call(
+            'get',
+            circuit,
+            lambda: self.execute(
+                self._helm_command(cmd),
+                additional_args=additional_args,
+                return_output=True))
         json_list = []
         split_yamls = output.split('---')
         for item in split_yamls[1:-1]:
@@ -398,12 +864,23 @@ class Helm(object):
         return json_list
 
     def get_helm_version(self):
+        """
+        :return version of the helm binary, probed once per binary.
+        """
+        return get_version(self.binary_path, self._probe_version)
+
+    def _probe_version(self):
         cmd = ['version', '--short']
         output = self.execute(self._helm_command(cmd))
         version = re.search(r'([\d.]+)', output)
         if version:
             return version.group(1)
 
+    def check_repo_update_names_supported(self):
+        """helm repo update takes repository names since 3.7.0."""
+        version = self.get_helm_version()
+        return bool(version) and v1_gteq_v2(version, '3.7.0')
+
     def check_flag_wait_is_supported(self):
         return v1_gteq_v2(self.get_helm_version(), '3.9.0')
 
@@ -424,10 +901,14 @@ class Helm(object):
              ca_file=None):
 
         cmd = ['list', '--filter', r"^{0}$".format(release_name), '-o json']
-        self.handle_auth_params(cmd, kubeconfig, token, apiserver, ca_file)
+        circuit = self.handle_auth_params(
+            cmd, kubeconfig, token, apiserver, ca_file)
         if additional_env:
             self.env.update(additional_env)
-        output = self.execute(self._helm_command(cmd), return_output=True)
+        output = self._call(
+            'list',
+            circuit,
+            lambda: self.execute(self._helm_command(cmd), return_output=True))
         return json.loads(output)
 
     def status(self,
@@ -452,18 +933,19 @@ class Helm(object):
         """
 
         cmd = ['status', release_name, '-o=json']
-        self.handle_auth_params(cmd, kubeconfig, token, apiserver, ca_file)
-        flags = flags or []
-        validate_no_collisions_between_params_and_flags(flags)
-        validate_flags_for_status(flags)
-
-        cmd.extend([prepare_parameter(flag) for flag in flags])
+        circuit = self.handle_auth_params(
+            cmd, kubeconfig, token, apiserver, ca_file)
+        cmd.extend(self.compile_flags(
+            'status', flags, FLAGS_LIST_TO_VALIDATE).argv)
         if additional_env:
             self.env.update(additional_env)
-        output = self.execute(
-            self._helm_command(cmd),
-            additional_args=additional_args,
-            return_output=True)
+        output = self._call(
+            'status',
+            circuit,
+            lambda: self.execute(
+                self._helm_command(cmd),
+                additional_args=additional_args,
+                return_output=True))
         loaded_output = json.loads(output)
         if 'manifest' in loaded_output:
             manifest_content = self.format_manifest(
@@ -504,8 +986,7 @@ class Helm(object):
                        additional_args=None,
                        **_):
         cmd = ['registry', 'login', host]
-        flags = flags or []
-        cmd.extend([prepare_parameter(flag) for flag in flags])
+        cmd.extend(self.compile_flags('registry login', flags).argv)
         self.execute(self._helm_command(cmd), additional_args=additional_args)
 
     def registry_logout(self,
@@ -514,44 +995,139 @@ class Helm(object):
                         additional_args=None,
                         **_):
         cmd = ['registry', 'logout', host]
-        flags = flags or []
-        for f in flags:
-            if f in REGISTRY_LOGIN_FLAGS:
-                self.logger.debug(
-                    'Removing unsupported logout flag: {}'.format(f))
-                flags.remove(f)
-        cmd.extend([prepare_parameter(flag) for flag in flags])
+        cmd.extend(self.compile_flags('registry logout', flags).argv)
         self.execute(self._helm_command(cmd), additional_args=additional_args)
 
+    def _registry(self, host, flags):
+        names = _flag_values(flags)
+        if names.get('username'):
+            auth = base64.b64encode('{0}:{1}'.format(
+                names['username'], names.get('password') or '').encode(
+                    'utf-8')).decode('ascii')
+        else:
+            auth = (read_registry_config(registry_config_path(
+                self.env)).get('auths') or {}).get(host, {}).get('auth')
+        return Registry(
+            host,
+            auth=auth,
+            plain_http=_flag_set(names, 'plain-http'),
+            ca_file=names.get('ca-file'),
+            insecure_skip_tls_verify=_flag_set(
+                names, 'insecure-skip-tls-verify'))
+
+    def _remote_digest(self, chart, version, flags):
+        """
+        :return digest of the archive of chart version in its repository or
+        registry, None if it can't be looked up.
+        """
+        try:
+            if chart.startswith(OCI_SCHEME):
+                host, repository, tag = parse_reference(chart)
+                return self._registry(host, flags).chart_digest(
+                    repository, tag or version)
+            if chart.count('/') == 1 and not os.path.exists(chart):
+                repo_name, chart_name = chart.split('/')
+                entry = self.chart_index(repo_name).get(chart_name, version)
+                if entry and entry.get('digest'):
+                    return 'sha256:' + entry['digest'].split(':')[-1]
+        except CloudifyHelmSDKError as e:
+            self.logger.debug(
+                'Failed to look up digest of {0}: {1}'.format(chart, e))
+
+    def _pulled(self, chart, flags):
+        """
+        Check if the destination of a pull already holds the chart version:
+        the archive with the digest of the remote one, or for --untar a
+        chart directory of that version.
+        """
+        names = _flag_values(flags)
+        version = names.get('version')
+        if chart.startswith(OCI_SCHEME) and not version:
+            version = parse_reference(chart)[2]
+        if not version or not version_key(version) or \
+                _flag_set(names, 'prov'):
+            # Only exact versions identify what would be pulled.
+            return False
+        chart_name = chart.rstrip('/').rsplit('/', 1)[-1].split(':')[0]
+        destination = names.get('destination') or '.'
+        if _flag_set(names, 'untar'):
+            # helm untars relative to the destination.
+            chart_file = os.path.join(
+                destination, names.get('untardir') or '.', chart_name,
+                'Chart.yaml')
+            try:
+                with open(chart_file) as metadata:
+                    local_version = (yaml.safe_load(metadata) or {}).get(
+                        'version')
+            except (IOError, OSError, yaml.YAMLError):
+                return False
+            return str(local_version) == str(version)
+        archive = os.path.join(
+            destination, '{0}-{1}.tgz'.format(chart_name, version))
+        if not os.path.isfile(archive):
+            return False
+        remote = self._remote_digest(chart, version, flags)
+        return bool(remote) and remote == archive_digest(archive)
+
     def pull(self,
              chart,
              flags=None,
              additional_args=None,
              **_):
+        if self._pulled(chart, flags):
+            self.logger.info(
+                'Chart {0} is already pulled, skipping.'.format(chart))
+            return
         cmd = ['pull', chart]
-        flags = flags or []
-        for f in flags:
-            if f not in PULL_FLAGS + PARENT_FLAGS:
-                self.logger.debug(
-                    'Removing unsupported pull flag: {}'.format(f))
-                flags.remove(f)
-        cmd.extend([prepare_parameter(flag) for flag in flags])
+        cmd.extend(self.compile_flags('pull', flags).argv)
         self.execute(self._helm_command(cmd), additional_args=additional_args)
 
+    def _pushed(self, chart, remote, flags):
+        """
+        Check if the registry already holds the chart archive, by the
+        digest of its chart layer.
+        """
+        if not remote or not remote.startswith(OCI_SCHEME) or \
+                not os.path.isfile(chart):
+            return False
+        try:
+            metadata = chart_metadata(chart)
+            host, repository, _ = parse_reference(remote)
+            repository = '/'.join(
+                part for part in [repository, metadata.get('name')] if part)
+            remote_digest = self._registry(host, flags).chart_digest(
+                repository, metadata.get('version'))
+        except CloudifyHelmSDKError as e:
+            self.logger.debug(
+                'Failed to look up {0} in {1}: {2}'.format(chart, remote, e))
+            return False
+        return bool(remote_digest) and remote_digest == archive_digest(chart)
+
     def push(self,
              chart,
              remote=None,
              flags=None,
              additional_args=None,
              **_):
+        if self._pushed(chart, remote, flags):
+            self.logger.info('Chart {0} is already in {1}, skipping.'.format(
+                chart, remote))
+            return
         cmd = ['push', chart]
         if remote:
             cmd.append(remote)
-        flags = flags or []
-        for f in flags:
-            if f not in PUSH_FLAGS + PARENT_FLAGS:
-                self.logger.debug(
-                    'Removing unsupported push flag: {}'.format(f))
-                flags.remove(f)
-        cmd.extend([prepare_parameter(flag) for flag in flags])
+        cmd.extend(self.compile_flags('push', flags).argv)
         self.execute(self._helm_command(cmd), additional_args=additional_args)
+
+
+def _flag_values(flags):
+    """:return dictionary of flag name to value of a list of flags."""
+    return dict((flag.get('name'), flag.get('value'))
+                for flag in flags or [] if isinstance(flag, dict))
+
+
+def _flag_set(names, name):
+    # Flags without a value are switches that are on.
+    return name in names and (
+        names[name] is None or
+        str(names[name]).lower() not in ('false', '0'))
@@ -0,0 +1,245 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .retry import is_release_not_found
+from .exceptions import CloudifyHelmSDKError
+
+ACTION_INSTALL = 'install'
+ACTION_UPGRADE = 'upgrade'
+ACTION_UNINSTALL = 'uninstall'
+ACTION_STATUS = 'status'
+ACTIONS = [ACTION_INSTALL, ACTION_UPGRADE, ACTION_UNINSTALL, ACTION_STATUS]
+
+RESULT_SUCCEEDED = 'succeeded'
+RESULT_FAILED = 'failed'
+RESULT_SKIPPED = 'skipped'
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_CLUSTER_LIMIT = 2
+
+
+class ReleaseSpec(object):
+    """Desired state of one release in a batch.
+    :param name: release name.
+    :param chart: chart reference, packaged chart or URL.
+    :param values_file: values file path.
+    :param set_values: list of variables and their values for --set.
+    :param flags: list of flags.
+    :param depends_on: names of releases of the batch to run before this.
+    :param cluster: key of the cluster, releases of the same cluster share
+    its concurrency limit. Defaults to the API server or kubeconfig.
+    :param kwargs: other Helm parameters, like kubeconfig, token,
+    apiserver, ca_file, additional_env and additional_args.
+    """
+
+    def __init__(self,
+                 name,
+                 chart=None,
+                 values_file=None,
+                 set_values=None,
+                 flags=None,
+                 depends_on=None,
+                 cluster=None,
+                 **kwargs):
+        self.name = name
+        self.chart = chart
+        self.values_file = values_file
+        self.set_values = set_values or []
+        self.flags = flags or []
+        self.depends_on = list(depends_on or [])
+        self.kwargs = kwargs
+        self.cluster = cluster or kwargs.get('apiserver') or \
+            kwargs.get('kubeconfig')
+
+
+class ReleaseResult(object):
+
+    def __init__(self, name, status, output=None, error=None,
+                 duration=None):
+        self.name = name
+        self.status = status
+        self.output = output
+        self.error = error
+        self.duration = duration
+
+    @property
+    def succeeded(self):
+        return self.status == RESULT_SUCCEEDED
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'status': self.status,
+            'error': str(self.error) if self.error else None,
+            'duration': self.duration,
+        }
+
+
+class ReleaseBatch(object):
+    """Run a helm action on many releases with bounded concurrency.
+    Releases run after the releases they depend on (or before them, for
+    uninstall). When a release fails, the releases depending on it are
+    skipped, other releases continue.
+    """
+
+    def __init__(self,
+                 helm,
+                 specs=None,
+                 max_workers=DEFAULT_MAX_WORKERS,
+                 cluster_limit=DEFAULT_CLUSTER_LIMIT):
+        """
+        :param helm: Helm client, each release runs with its own copy.
+        :param specs: list of ReleaseSpec.
+        :param max_workers: maximum number of concurrent helm commands.
+        :param cluster_limit: maximum number of concurrent helm commands
+        against the same cluster.
+        """
+        self.helm = helm
+        self.max_workers = max(1, max_workers)
+        self.cluster_limit = max(1, cluster_limit)
+        self.specs = OrderedDict()
+        for spec in specs or []:
+            self.add(spec)
+
+    def add(self, spec):
+        if spec.name in self.specs:
+            raise CloudifyHelmSDKError(
+                'Release {0} is already in the batch.'.format(spec.name))
+        self.specs[spec.name] = spec
+        return self
+
+    def _dependencies(self, action):
+        """Map each release to the releases that must run before it."""
+        dependencies = OrderedDict((name, set()) for name in self.specs)
+        for name, spec in self.specs.items():
+            for dependency in spec.depends_on:
+                if dependency not in self.specs:
+                    raise CloudifyHelmSDKError(
+                        'Release {0} depends on {1}, which is not in the '
+                        'batch.'.format(name, dependency))
+                if action == ACTION_UNINSTALL:
+                    dependencies[dependency].add(name)
+                else:
+                    dependencies[name].add(dependency)
+        self._check_cycles(dependencies)
+        return dependencies
+
+    @staticmethod
+    def _check_cycles(dependencies):
+        remaining = dict((name, set(deps))
+                         for name, deps in dependencies.items())
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise CloudifyHelmSDKError(
+                    'Circular dependency between releases {0}.'.format(
+                        sorted(remaining)))
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    def _run_one(self, action, spec):
+        # Helm updates its environment with additional_env, so concurrent
+        # releases must not share the same client.
+        helm = self.helm.copy()
+        kwargs = dict(spec.kwargs)
+        if action in [ACTION_INSTALL, ACTION_UPGRADE]:
+            kwargs.update(values_file=spec.values_file,
+                          set_values=spec.set_values)
+        if action == ACTION_INSTALL:
+            return helm.install(spec.name, spec.chart, spec.flags, **kwargs)
+        if action == ACTION_UPGRADE:
+            return helm.upgrade(
+                spec.name, chart=spec.chart, flags=spec.flags, **kwargs)
+        if action == ACTION_UNINSTALL:
+            return helm.uninstall(spec.name, flags=spec.flags, **kwargs)
+        return helm.status(spec.name, flags=spec.flags, **kwargs)
+
+    def _timed(self, action, spec):
+        start = time.monotonic()
+        try:
+            output = self._run_one(action, spec)
+        except Exception as e:
+            if action == ACTION_UNINSTALL and is_release_not_found(e):
+                # Never created, e.g. its install failed before helm
+                # created the release, there is nothing to uninstall.
+                self.helm.logger.info(
+                    'Release {0} not found, nothing to uninstall.'.format(
+                        spec.name))
+                return ReleaseResult(spec.name, RESULT_SUCCEEDED,
+                                     duration=time.monotonic() - start)
+            return ReleaseResult(spec.name, RESULT_FAILED, error=e,
+                                 duration=time.monotonic() - start)
+        return ReleaseResult(spec.name, RESULT_SUCCEEDED, output=output,
+                             duration=time.monotonic() - start)
+
+    def run(self, action):
+        """
+        :param action: install, upgrade, uninstall or status.
+        :return OrderedDict of release name to ReleaseResult, in the order
+        the releases were added.
+        """
+        if action not in ACTIONS:
+            raise CloudifyHelmSDKError(
+                'Unsupported batch action {0}.'.format(action))
+        dependencies = self._dependencies(action)
+        results = {}
+        running = {}
+        per_cluster = {}
+        pending = list(self.specs)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    spec = self.specs[name]
+                    deps = [results.get(dep) for dep in dependencies[name]]
+                    if any(dep and not dep.succeeded for dep in deps):
+                        pending.remove(name)
+                        results[name] = ReleaseResult(
+                            name, RESULT_SKIPPED,
+                            error=CloudifyHelmSDKError(
+                                'Skipped, a release it depends on did not '
+                                'succeed.'))
+                        self.helm.logger.error(
+                            'Skipping {0} {1}, a release it depends on '
+                            'did not succeed.'.format(action, name))
+                        continue
+                    if not all(deps) or \
+                            len(running) >= self.max_workers or \
+                            per_cluster.get(spec.cluster, 0) >= \
+                            self.cluster_limit:
+                        continue
+                    pending.remove(name)
+                    per_cluster[spec.cluster] = \
+                        per_cluster.get(spec.cluster, 0) + 1
+                    running[executor.submit(self._timed, action, spec)] = \
+                        spec
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    spec = running.pop(future)
+                    per_cluster[spec.cluster] -= 1
+                    result = future.result()
+                    results[spec.name] = result
+                    self.helm.logger.debug(
+                        '{0} {1} {2} in {3:.2f}s.'.format(
+                            action, spec.name, result.status,
+                            result.duration))
+        return OrderedDict((name, results[name]) for name in self.specs)
@@ -0,0 +1,165 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+from .exceptions import CloudifyHelmSDKError
+
+CHART_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'cloudify-helm-charts')
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+INDEX_FILE = 'index.json'
+LOCK_FILE = '.lock'
+ARCHIVE_SUFFIX = '.tgz'
+CHUNK_SIZE = 1024 * 1024
+# Flags that locate a chart in a repository, an archive path replaces them.
+CHART_SOURCE_FLAGS = frozenset(['repo', 'version', 'devel'])
+
+
+def archive_flags(flags):
+    """
+    :param flags: install flags of a chart of a repository.
+    :return the flags to install its cached archive with, helm would
+    otherwise look the archive path up in the repository.
+    """
+    return [flag for flag in flags or []
+            if not isinstance(flag, dict) or
+            flag.get('name') not in CHART_SOURCE_FLAGS]
+
+
+def chart_key(repo_url, chart, version):
+    """Cache key of a chart version of a repository."""
+    return hashlib.sha256(json.dumps(
+        [repo_url.rstrip('/'), chart, str(version)]).encode(
+            'utf-8')).hexdigest()
+
+
+def _copy_and_hash(source, target):
+    sha256 = hashlib.sha256()
+    with open(source, 'rb') as source_file:
+        for chunk in iter(lambda: source_file.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+            target.write(chunk)
+    return sha256.hexdigest()
+
+
+class ChartCache(object):
+    """
+    Cache of chart archives shared by all the deployments of the manager.
+    Archives are stored once by content digest, keys map to digests, and
+    the least recently used archives are evicted above max_bytes.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or CHART_CACHE_DIR
+        self.max_bytes = max_bytes
+
+    def _archive_path(self, digest):
+        return os.path.join(self.directory, digest + ARCHIVE_SUFFIX)
+
+    @contextmanager
+    def _locked_index(self):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index_path = os.path.join(self.directory, INDEX_FILE)
+            try:
+                with open(index_path) as index_file:
+                    index = json.load(index_file)
+            except (IOError, OSError, ValueError):
+                index = {}
+            original = dict(index)
+            yield index
+            if index != original:
+                fd, temp_path = tempfile.mkstemp(dir=self.directory)
+                with os.fdopen(fd, 'w') as index_file:
+                    json.dump(index, index_file)
+                os.replace(temp_path, index_path)
+
+    def get(self, key):
+        """
+        :return path of the cached archive of key, None on a miss.
+        """
+        with self._locked_index() as index:
+            entry = index.get(key)
+            if not entry:
+                return
+            path = self._archive_path(entry['digest'])
+            try:
+                if os.path.getsize(path) != entry['size']:
+                    raise OSError('Size mismatch.')
+            except OSError:
+                del index[key]
+                return
+            # The modification time orders archives for eviction.
+            os.utime(path)
+            return path
+
+    def put(self, key, source, digest=None):
+        """
+        Copy an archive into the cache.
+        :param key: cache key, see chart_key.
+        :param source: path of the archive.
+        :param digest: expected sha256 of the archive, checked when given.
+        :return path of the cached archive.
+        """
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                actual = _copy_and_hash(source, temp_file)
+            if digest and digest.split(':')[-1] != actual:
+                raise CloudifyHelmSDKError(
+                    'Digest of {0} is {1}, expected {2}.'.format(
+                        source, actual, digest))
+            path = self._archive_path(actual)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        with self._locked_index() as index:
+            index[key] = {'digest': actual, 'size': os.path.getsize(path)}
+            self._evict(index, keep=actual)
+        return path
+
+    def _evict(self, index, keep=None):
+        archives = []
+        for name in os.listdir(self.directory):
+            if name.endswith(ARCHIVE_SUFFIX):
+                stat = os.stat(os.path.join(self.directory, name))
+                archives.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in archives)
+        evicted = set()
+        for _, size, name in sorted(archives):
+            if total <= self.max_bytes:
+                break
+            digest = name[:-len(ARCHIVE_SUFFIX)]
+            if digest == keep:
+                continue
+            os.remove(os.path.join(self.directory, name))
+            evicted.add(digest)
+            total -= size
+        for key, entry in list(index.items()):
+            if entry['digest'] in evicted:
+                del index[key]
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
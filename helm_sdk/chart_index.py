@@ -0,0 +1,219 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import json
+import yaml
+import sqlite3
+import tempfile
+import threading
+
+from .semver import Constraint, version_key
+from .exceptions import CloudifyHelmSDKError
+
+SCHEMA_VERSION = 1
+
+try:
+    IndexLoader = yaml.CSafeLoader
+except AttributeError:
+    IndexLoader = yaml.SafeLoader
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _signature(index_path):
+    stat = os.stat(index_path)
+    return json.dumps([SCHEMA_VERSION, stat.st_size, stat.st_mtime_ns])
+
+
+def _rows(index):
+    for name, entries in (index.get('entries') or {}).items():
+        for entry in entries or []:
+            version = str(entry.get('version', ''))
+            key = version_key(version)
+            yield (name,
+                   version,
+                   json.dumps(key) if key else None,
+                   entry.get('digest'),
+                   json.dumps(entry, default=str))
+
+
+def build(index_path, db_path):
+    """
+    Convert a repository index.yaml into a sqlite lookup table at db_path.
+    The database is built next to the target and moved into place, so
+    readers never see a partial table.
+    """
+    with open(index_path, 'rb') as index_file:
+        index = yaml.load(index_file, Loader=IndexLoader) or {}
+    if not isinstance(index, dict):
+        raise CloudifyHelmSDKError(
+            'Invalid repository index {0}.'.format(index_path))
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(db_path))
+    os.close(fd)
+    try:
+        connection = sqlite3.connect(temp_path)
+        with connection:
+            connection.executescript("""
+                CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE charts (
+                    name TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    sort_key TEXT,
+                    digest TEXT,
+                    entry TEXT NOT NULL);
+                CREATE INDEX charts_name ON charts (name, version);
+                CREATE INDEX charts_digest ON charts (digest);
+            """)
+            connection.executemany(
+                'INSERT INTO charts VALUES (?, ?, ?, ?, ?)', _rows(index))
+            connection.execute('INSERT INTO meta VALUES (?, ?)',
+                               ('signature', _signature(index_path)))
+        connection.close()
+        os.replace(temp_path, db_path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+class ChartIndex(object):
+    """
+    Read-only lookups in a repository index converted by build: chart
+    metadata by name and version, version constraint resolution and
+    lookup by archive digest, without parsing index.yaml again.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        # sqlite connections can't be shared between threads.
+        if not getattr(self._local, 'connection', None):
+            self._local.connection = sqlite3.connect(
+                'file:{0}?mode=ro'.format(self.db_path), uri=True)
+        return self._local.connection
+
+    def signature(self):
+        row = self.connection.execute(
+            'SELECT value FROM meta WHERE key = ?', ('signature',)).fetchone()
+        return row[0] if row else None
+
+    def names(self):
+        return [row[0] for row in self.connection.execute(
+            'SELECT DISTINCT name FROM charts ORDER BY name')]
+
+    def versions(self, name):
+        """
+        :return list of (version, sort key) of chart name, newest first.
+        Versions that are not semantic versions are last.
+        """
+        rows = self.connection.execute(
+            'SELECT version, sort_key FROM charts WHERE name = ?', (name,))
+        versions = [(version, _load_key(sort_key))
+                    for version, sort_key in rows]
+        return sorted(versions,
+                      key=lambda version: (version[1] is not None,
+                                           version[1] or ()),
+                      reverse=True)
+
+    def _entry(self, name, version):
+        row = self.connection.execute(
+            'SELECT entry FROM charts WHERE name = ? AND version = ?',
+            (name, version)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, name, version=None):
+        """
+        :param name: chart name.
+        :param version: exact version, or a constraint like '^1.2'. The
+        latest stable version if empty.
+        :return index entry of the chart version, None if not found.
+        """
+        if version:
+            entry = self._entry(name, str(version))
+            if entry:
+                return entry
+        resolved = self.resolve(name, version)
+        return self._entry(name, resolved) if resolved else None
+
+    def resolve(self, name, constraint=None):
+        """
+        :return the newest version of chart name matching constraint.
+        """
+        constraint = Constraint(constraint)
+        for version, key in self.versions(name):
+            if key and constraint.matches(key):
+                return version
+
+    def by_digest(self, digest):
+        """
+        :param digest: sha256 of a chart archive, with or without the
+        sha256: prefix.
+        :return index entry of the archive, None if not found.
+        """
+        digest = str(digest).split(':')[-1]
+        row = self.connection.execute(
+            'SELECT entry FROM charts WHERE digest = ?', (digest,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def close(self):
+        if getattr(self._local, 'connection', None):
+            self._local.connection.close()
+            self._local.connection = None
+
+
+def _load_key(sort_key):
+    if not sort_key:
+        return
+
+    def to_tuple(value):
+        return tuple(to_tuple(item) if isinstance(item, list) else item
+                     for item in value)
+    return to_tuple(json.loads(sort_key))
+
+
+def open_index(index_path):
+    """
+    Get the lookup table of a repository index, building it once per
+    change of index.yaml. The table is stored next to the index, so other
+    operations of the same helm client reuse it.
+    :param index_path: path of <repo>-index.yaml in the repository cache.
+    :return ChartIndex
+    """
+    if not os.path.isfile(index_path):
+        raise CloudifyHelmSDKError(
+            'Repository index {0} does not exist.'.format(index_path))
+    # <repo>-index.yaml is stored as <repo>-index.db.
+    db_path = os.path.splitext(index_path)[0] + '.db'
+    signature = _signature(index_path)
+    with _lock:
+        index = _indexes.get(db_path)
+        if index and index.signature() == signature:
+            return index
+        if index:
+            index.close()
+        index = ChartIndex(db_path)
+        try:
+            current = index.signature() if os.path.isfile(db_path) else None
+        except sqlite3.Error:
+            current = None
+        if current != signature:
+            index.close()
+            build(index_path, db_path)
+        _indexes[db_path] = index
+        return index
@@ -0,0 +1,175 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import re
+import json
+import time
+import fcntl
+import socket
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+from .exceptions import CloudifyHelmSDKError
+
+CIRCUITS_DIR = os.path.join(tempfile.gettempdir(), 'cloudify-helm-circuits')
+FAILURE_THRESHOLD = 3
+COOL_DOWN = 30
+# Errors of helm and of the kubernetes client that mean the API server was
+# not reached.
+CONNECTION_ERROR_PATTERN = re.compile(
+    r'kubernetes cluster unreachable|connection refused|i/o timeout|'
+    r'no such host|no route to host|network is unreachable|'
+    r'tls handshake timeout|connection timed out|'
+    r'context deadline exceeded \(client\.timeout exceeded',
+    re.IGNORECASE)
+CONNECTION_ERROR_TYPES = frozenset([
+    'MaxRetryError', 'NewConnectionError', 'ConnectTimeoutError'])
+
+
+class CircuitOpenError(CloudifyHelmSDKError):
+    """The API server failed too many times, calls fail fast."""
+    pass
+
+
+def is_connection_error(error):
+    """
+    :return True if error means the API server could not be reached, for
+    helm process errors and kubernetes client errors.
+    """
+    if isinstance(error, (ConnectionError, socket.timeout)):
+        return True
+    if any(cls.__name__ in CONNECTION_ERROR_TYPES
+           for cls in type(error).__mro__):
+        return True
+    text = getattr(error, 'stderr', None) or str(error)
+    return bool(CONNECTION_ERROR_PATTERN.search(str(text)))
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker of one API server endpoint. The state is a file shared
+    by all the operations of the agent: after threshold consecutive
+    connection failures calls fail fast for cool_down seconds, then one
+    call probes the endpoint, and closes the circuit if it succeeds.
+    Use it as a context manager around the calls to the endpoint.
+    """
+
+    def __init__(self,
+                 endpoint,
+                 threshold=FAILURE_THRESHOLD,
+                 cool_down=COOL_DOWN,
+                 directory=None,
+                 clock=time.time):
+        self.endpoint = endpoint
+        self.threshold = threshold
+        self.cool_down = cool_down
+        self.directory = directory or CIRCUITS_DIR
+        self.path = os.path.join(
+            self.directory,
+            hashlib.sha256(endpoint.encode('utf-8')).hexdigest()[:32] +
+            '.json')
+        self._clock = clock
+
+    @contextmanager
+    def _locked_state(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.path) as state_file:
+                    state = json.load(state_file)
+            except (IOError, OSError, ValueError):
+                state = {}
+            original = dict(state)
+            yield state
+            if state != original:
+                fd, temp_path = tempfile.mkstemp(dir=self.directory)
+                with os.fdopen(fd, 'w') as state_file:
+                    json.dump(state, state_file)
+                os.replace(temp_path, self.path)
+
+    def state(self):
+        """:return 'closed', 'open' or 'half-open'."""
+        with self._locked_state() as state:
+            if not state.get('opened'):
+                return 'closed'
+            if self._clock() - state['opened'] < self.cool_down:
+                return 'open'
+            return 'half-open'
+
+    def before_call(self):
+        """
+        :raise CircuitOpenError if the circuit is open, or half-open with a
+        probe of another call in flight.
+        """
+        with self._locked_state() as state:
+            if not state.get('opened'):
+                return
+            now = self._clock()
+            remaining = state['opened'] + self.cool_down - now
+            probing = state.get('probe') and \
+                now - state['probe'] < self.cool_down
+            if remaining > 0 or probing:
+                raise CircuitOpenError(
+                    'API server {0} is unreachable after {1} failures, '
+                    'retry in {2}s.'.format(
+                        self.endpoint,
+                        state.get('failures'),
+                        int(max(remaining, 0)) or self.cool_down))
+            # Half open, this call is the probe.
+            state['probe'] = now
+
+    def success(self):
+        with self._locked_state() as state:
+            state.clear()
+
+    def failure(self):
+        with self._locked_state() as state:
+            state['failures'] = state.get('failures', 0) + 1
+            if state.get('probe') or state['failures'] >= self.threshold:
+                state['opened'] = self._clock()
+                state.pop('probe', None)
+
+    def __enter__(self):
+        self.before_call()
+        return self
+
+    def __exit__(self, exc_type, exc_value, _):
+        if exc_value is None or not is_connection_error(exc_value):
+            # Any answer of the API server, even an error, means it is up.
+            self.success()
+        else:
+            self.failure()
+        return False
+
+
+def endpoint_breaker(endpoint, directory=None):
+    """
+    :return CircuitBreaker of endpoint, or None if the endpoint is unknown.
+    """
+    if endpoint:
+        return CircuitBreaker(str(endpoint).rstrip('/'), directory=directory)
+
+
+@contextmanager
+def guarded(breaker):
+    """Run the block under breaker, if there is one."""
+    if breaker:
+        with breaker:
+            yield
+    else:
+        yield
@@ -0,0 +1,81 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import math
+import time
+
+from .exceptions import CloudifyHelmSDKError
+
+# Steps are not started with less than this many seconds left, helm and the
+# API server need some time to answer at all.
+MIN_STEP_TIMEOUT = 1
+
+
+class DeadlineExceeded(CloudifyHelmSDKError):
+    """The time budget of the operation is spent."""
+    pass
+
+
+class Deadline(object):
+    """
+    Time budget of an operation that runs several helm commands and
+    Kubernetes reads. Each step gets the time that is left, instead of a
+    timeout of its own, so the operation as a whole ends in time.
+    """
+
+    def __init__(self, seconds, clock=time.monotonic):
+        """
+        :param seconds: time budget of the operation.
+        """
+        self.seconds = seconds
+        self._clock = clock
+        self.expires = clock() + seconds
+
+    def remaining(self):
+        """:return seconds left, 0 if the deadline passed."""
+        return max(0.0, self.expires - self._clock())
+
+    def check(self, step):
+        """
+        :param step: description of the next step, for the error.
+        :raise DeadlineExceeded if too little time is left for a step.
+        """
+        if self.remaining() < MIN_STEP_TIMEOUT:
+            raise DeadlineExceeded(
+                'The {0}s deadline of the operation passed before '
+                '{1}.'.format(self.seconds, step))
+
+    def timeout(self, step, default=None):
+        """
+        :param step: description of the next step, for the error.
+        :param default: timeout of the step, if it is shorter.
+        :return whole seconds the step can take.
+        :raise DeadlineExceeded if too little time is left for a step.
+        """
+        self.check(step)
+        remaining = int(math.ceil(self.remaining()))
+        if default:
+            return min(int(default), remaining)
+        return remaining
+
+
+def step_timeout(deadline, step, default=None):
+    """
+    :return timeout of a step under deadline, default if there is no
+    deadline.
+    """
+    if deadline:
+        return deadline.timeout(step, default)
+    return default
@@ -0,0 +1,191 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+from .rate_limit import limited_call
+from .circuit_breaker import guarded
+from .deadline import DeadlineExceeded
+from .exceptions import CloudifyHelmSDKError
+
+DISCOVERY_CACHE_DIR = os.path.join(
+    tempfile.gettempdir(), 'cloudify-helm-discovery')
+# Same default as the kubectl discovery cache.
+DEFAULT_TTL = 600
+# A kind that is not in the cache is looked up again if the cache is older
+# than this, e.g. for a CRD the release just installed.
+MISS_REFRESH_AGE = 10
+CORE_VERSIONS_PATH = '/api'
+GROUPS_PATH = '/apis'
+
+
+def cache_path(host, directory=None):
+    """Path of the discovery cache of the API server at host."""
+    return os.path.join(
+        directory or DISCOVERY_CACHE_DIR,
+        hashlib.sha256(str(host).encode('utf-8')).hexdigest()[:32] + '.json')
+
+
+def version_path(api_version):
+    """API path of an apiVersion, /api/v1 or /apis/<group>/<version>."""
+    if '/' in api_version:
+        return '{0}/{1}'.format(GROUPS_PATH, api_version)
+    return '{0}/{1}'.format(CORE_VERSIONS_PATH, api_version)
+
+
+class Discovery(object):
+    """
+    The API versions and kinds a cluster serves, like the kubectl discovery
+    cache. The group versions are fetched once, the resources of a group
+    version when a kind of it is first looked up, and everything is
+    persisted per API server for ttl seconds, so other operations on the
+    same cluster skip the round trips.
+    """
+
+    def __init__(self,
+                 api_client,
+                 ttl=DEFAULT_TTL,
+                 directory=None,
+                 limiter=None,
+                 circuit=None,
+                 deadline=None):
+        """
+        :param api_client: kubernetes.client.ApiClient of the cluster.
+        :param ttl: seconds the discovered APIs are reused.
+        :param limiter: rate_limit.AdaptiveRateLimiter of the cluster.
+        :param circuit: circuit_breaker.CircuitBreaker of the cluster.
+        :param deadline: deadline.Deadline of the operation.
+        """
+        self.api_client = api_client
+        self.ttl = ttl
+        self.limiter = limiter
+        self.circuit = circuit
+        self.deadline = deadline
+        self.path = cache_path(api_client.configuration.host, directory)
+        self._data = None
+        self._lock = threading.Lock()
+
+    def get(self, path, **kwargs):
+        """
+        GET a path of the API server.
+        :param kwargs: more arguments of call_api, like _request_timeout.
+        :return the response body as a dictionary.
+        """
+        if self.deadline and '_request_timeout' not in kwargs:
+            kwargs['_request_timeout'] = self.deadline.timeout(
+                'reading ' + path)
+        with guarded(self.circuit):
+            return limited_call(
+                self.limiter,
+                self.api_client.call_api,
+                path,
+                'GET',
+                header_params={'Accept': 'application/json'},
+                auth_settings=['BearerToken'],
+                response_type='object',
+                _return_http_data_only=True,
+                **kwargs)
+
+    def _read(self):
+        try:
+            with open(self.path) as cache_file:
+                data = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return
+        if time.time() - data.get('fetched', 0) < self.ttl:
+            return data
+
+    def _write(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+            with os.fdopen(fd, 'w') as cache_file:
+                json.dump(self._data, cache_file)
+            os.replace(temp_path, self.path)
+        except (IOError, OSError):
+            pass
+
+    def _fetch_versions(self):
+        versions = {}
+        for version in self.get(CORE_VERSIONS_PATH).get('versions') or []:
+            versions[version] = None
+        for group in self.get(GROUPS_PATH).get('groups') or []:
+            for version in group.get('versions') or []:
+                versions[version['groupVersion']] = None
+        self._data = {'fetched': time.time(), 'versions': versions}
+        self._write()
+
+    def _fetch_resources(self, api_version):
+        resources = {}
+        response = self.get(version_path(api_version))
+        for resource in response.get('resources') or []:
+            # Subresources like deployments/status are not kinds.
+            if '/' not in resource['name']:
+                resources[resource['kind']] = {
+                    'name': resource['name'],
+                    'namespaced': resource.get('namespaced', True),
+                }
+        self._data['versions'][api_version] = resources
+        self._write()
+
+    def _lookup(self, api_version, kind):
+        if self._data is None:
+            self._data = self._read()
+        if self._data is None or \
+                time.time() - self._data['fetched'] >= self.ttl:
+            self._fetch_versions()
+        versions = self._data['versions']
+        if api_version in versions and versions[api_version] is None:
+            self._fetch_resources(api_version)
+        return (versions.get(api_version) or {}).get(kind)
+
+    def resource(self, api_version, kind):
+        """
+        :return dictionary with the plural name of kind and whether it is
+        namespaced, None if the cluster does not serve it.
+        """
+        with self._lock:
+            try:
+                found = self._lookup(api_version, kind)
+                if not found and \
+                        time.time() - self._data['fetched'] >= \
+                        MISS_REFRESH_AGE:
+                    self._fetch_versions()
+                    found = self._lookup(api_version, kind)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                raise CloudifyHelmSDKError(
+                    'Failed to discover {0} {1}: {2}'.format(
+                        api_version, kind, e))
+            return found
+
+    def resource_path(self, api_version, kind, name, namespace=None):
+        """
+        :return API path of the object name of kind, None if the cluster
+        does not serve the kind.
+        """
+        resource = self.resource(api_version, kind)
+        if not resource:
+            return
+        path = version_path(api_version)
+        if resource['namespaced']:
+            path += '/namespaces/{0}'.format(namespace or 'default')
+        return '{0}/{1}/{2}'.format(path, resource['name'], name)
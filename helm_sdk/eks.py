@@ -0,0 +1,207 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+"""In-process generation of EKS bearer tokens.
+
+The token is the same one `aws eks get-token` prints: a presigned STS
+GetCallerIdentity URL, signed with AWS Signature Version 4, with the cluster
+name bound into the signature through the x-k8s-aws-id header.
+"""
+
+import hmac
+import base64
+import hashlib
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+from .exceptions import CloudifyHelmSDKError
+
+SIGV4_ALGORITHM = 'AWS4-HMAC-SHA256'
+STS_SERVICE = 'sts'
+STS_ACTION = 'GetCallerIdentity'
+STS_VERSION = '2011-06-15'
+STS_HOST = 'sts.{region}.amazonaws.com'
+EKS_TOKEN_PREFIX = 'k8s-aws-v1.'
+CLUSTER_ID_HEADER = 'x-k8s-aws-id'
+# The presigned URL is only used by the API server to call STS, the token
+# itself is accepted by EKS for 15 minutes. The aws cli reports 14 minutes
+# as the expiration, so we do the same.
+PRESIGNED_URL_EXPIRES = 60
+TOKEN_LIFETIME = timedelta(minutes=14)
+EMPTY_PAYLOAD_HASH = hashlib.sha256(b'').hexdigest()
+AMZ_DATE_FORMAT = '%Y%m%dT%H%M%SZ'
+DATE_STAMP_FORMAT = '%Y%m%d'
+
+
+def uri_encode(value):
+    """Encode a string the way SigV4 expects (RFC 3986 unreserved)."""
+    return quote(str(value), safe='-_.~')
+
+
+def _hmac(key, message):
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+def get_signing_key(secret_access_key, date_stamp, region, service):
+    """Derive the SigV4 signing key for a given day, region and service.
+    :param secret_access_key: AWS secret access key.
+    :param date_stamp: date in YYYYMMDD format.
+    :param region: AWS region name.
+    :param service: AWS service name.
+    :return signing key bytes.
+    """
+    key = _hmac(('AWS4' + secret_access_key).encode('utf-8'), date_stamp)
+    key = _hmac(key, region)
+    key = _hmac(key, service)
+    return _hmac(key, 'aws4_request')
+
+
+def canonical_query_string(params):
+    return '&'.join(
+        '{0}={1}'.format(uri_encode(k), uri_encode(v))
+        for k, v in sorted(params.items()))
+
+
+def canonical_request(method, path, query, headers, payload_hash):
+    """Build the canonical request string.
+    :param method: HTTP method.
+    :param path: URI path.
+    :param query: canonical query string.
+    :param headers: dict of header names and values to sign.
+    :param payload_hash: hex encoded sha256 of the request body.
+    :return canonical request string.
+    """
+    names = sorted(name.lower() for name in headers)
+    lowered = dict((k.lower(), ' '.join(str(v).split()))
+                   for k, v in headers.items())
+    canonical_headers = ''.join(
+        '{0}:{1}\n'.format(name, lowered[name]) for name in names)
+    return '\n'.join([method,
+                      path,
+                      query,
+                      canonical_headers,
+                      ';'.join(names),
+                      payload_hash])
+
+
+def string_to_sign(amz_date, scope, request):
+    return '\n'.join([SIGV4_ALGORITHM,
+                      amz_date,
+                      scope,
+                      hashlib.sha256(request.encode('utf-8')).hexdigest()])
+
+
+def presign_url(host,
+                params,
+                headers,
+                region,
+                service,
+                access_key_id,
+                secret_access_key,
+                session_token=None,
+                expires=PRESIGNED_URL_EXPIRES,
+                now=None,
+                method='GET',
+                path='/'):
+    """Create a SigV4 presigned https URL (query string authentication).
+    :param host: endpoint host name.
+    :param params: dict of request query parameters.
+    :param headers: additional headers that are signed (host is added).
+    :param now: naive UTC datetime of the signature, defaults to now.
+    :return presigned URL.
+    """
+    now = now or datetime.utcnow()
+    amz_date = now.strftime(AMZ_DATE_FORMAT)
+    date_stamp = now.strftime(DATE_STAMP_FORMAT)
+    scope = '/'.join([date_stamp, region, service, 'aws4_request'])
+    signed_headers = dict(headers or {})
+    signed_headers['host'] = host
+    query_params = dict(params)
+    query_params.update({
+        'X-Amz-Algorithm': SIGV4_ALGORITHM,
+        'X-Amz-Credential': '{0}/{1}'.format(access_key_id, scope),
+        'X-Amz-Date': amz_date,
+        'X-Amz-Expires': str(expires),
+        'X-Amz-SignedHeaders': ';'.join(
+            sorted(name.lower() for name in signed_headers)),
+    })
+    if session_token:
+        query_params['X-Amz-Security-Token'] = session_token
+    query = canonical_query_string(query_params)
+    request = canonical_request(
+        method, path, query, signed_headers, EMPTY_PAYLOAD_HASH)
+    signing_key = get_signing_key(
+        secret_access_key, date_stamp, region, service)
+    signature = hmac.new(
+        signing_key,
+        string_to_sign(amz_date, scope, request).encode('utf-8'),
+        hashlib.sha256).hexdigest()
+    return 'https://{host}{path}?{query}&X-Amz-Signature={signature}'.format(
+        host=host, path=path, query=query, signature=signature)
+
+
+def get_eks_token(cluster_name,
+                  region,
+                  access_key_id,
+                  secret_access_key,
+                  session_token=None,
+                  now=None):
+    """Generate a bearer token for an EKS cluster without the aws cli.
+    :param cluster_name: name (or ID) of the EKS cluster.
+    :param region: AWS region of the STS endpoint to sign for.
+    :param access_key_id: AWS access key id.
+    :param secret_access_key: AWS secret access key.
+    :param session_token: optional AWS session token.
+    :param now: naive UTC datetime of the signature, defaults to now.
+    :return tuple of (token, naive UTC expiration datetime).
+    """
+    if not all([cluster_name, region, access_key_id, secret_access_key]):
+        raise CloudifyHelmSDKError(
+            'Cluster name, region, access key id and secret access key are '
+            'required in order to generate an EKS token.')
+    now = now or datetime.utcnow()
+    url = presign_url(
+        STS_HOST.format(region=region),
+        {'Action': STS_ACTION, 'Version': STS_VERSION},
+        {CLUSTER_ID_HEADER: cluster_name},
+        region,
+        STS_SERVICE,
+        access_key_id,
+        secret_access_key,
+        session_token=session_token,
+        now=now)
+    encoded = base64.urlsafe_b64encode(url.encode('utf-8')).decode('utf-8')
+    return EKS_TOKEN_PREFIX + encoded.rstrip('='), now + TOKEN_LIFETIME
+
+
+def parse_get_token_args(args):
+    """Parse the arguments of an `aws eks get-token` exec command.
+    :param args: list of exec arguments from the kubeconfig user.
+    :return dict with cluster_name, region and role_arn (may be None).
+    """
+    parsed = {'cluster_name': None, 'region': None, 'role_arn': None}
+    options = {'--cluster-name': 'cluster_name',
+               '--cluster-id': 'cluster_name',
+               '--region': 'region',
+               '--role-arn': 'role_arn'}
+    args = list(args or [])
+    for index, arg in enumerate(args):
+        name, sep, value = arg.partition('=')
+        if name not in options:
+            continue
+        if not sep:
+            value = args[index + 1] if index + 1 < len(args) else None
+        parsed[options[name]] = value
+    return parsed
@@ -0,0 +1,203 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import re
+import json
+import hashlib
+import tempfile
+import threading
+from collections import namedtuple
+
+from .utils import prepare_parameter
+from .exceptions import CloudifyHelmSDKError
+
+FLAGS_SCHEMA_DIR = os.path.join(
+    tempfile.gettempdir(), 'cloudify-helm-flags')
+HELP_FLAG_PATTERN = re.compile(r'^\s+(?:-\w, )?--([\w][\w-]*)', re.MULTILINE)
+COMPILED_CACHE_SIZE = 1024
+# Key of the helm version in the schemas file of a binary.
+VERSION_KEY = '__version__'
+
+# Validated flags of a helm command: argv is the tuple of arguments to add
+# to the command and names the set of flag names it contains.
+CompiledFlags = namedtuple('CompiledFlags', ['argv', 'names'])
+
+_schemas = {}
+_compiled = {}
+_lock = threading.Lock()
+
+
+def flag_key(flag):
+    """Hashable identity of a flag, used to de-duplicate."""
+    return json.dumps(flag, sort_keys=True, default=str)
+
+
+def parse_help(help_text):
+    """Parse long flag names from the output of `helm <command> --help`.
+    :return frozenset of flag names, both command and global flags.
+    """
+    return frozenset(HELP_FLAG_PATTERN.findall(help_text or ''))
+
+
+def _binary_signature(binary_path):
+    try:
+        stat = os.stat(binary_path)
+    except (OSError, TypeError):
+        return
+    return hashlib.sha256(json.dumps(
+        [os.path.realpath(binary_path), stat.st_size, stat.st_mtime_ns]
+    ).encode('utf-8')).hexdigest()
+
+
+def _read_schemas(path):
+    try:
+        with open(path) as schema_file:
+            return json.load(schema_file)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _write_schemas(path, schemas):
+    try:
+        os.makedirs(FLAGS_SCHEMA_DIR, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=FLAGS_SCHEMA_DIR)
+        with os.fdopen(fd, 'w') as schema_file:
+            json.dump(schemas, schema_file)
+        os.replace(temp_path, path)
+    except (IOError, OSError):
+        pass
+
+
+def _store(signature, name, value):
+    """Persist value of name in the schemas file of a binary, merged with
+    the values other threads and processes stored meanwhile.
+    """
+    path = os.path.join(FLAGS_SCHEMA_DIR, signature + '.json')
+    with _lock:
+        schemas = _read_schemas(path)
+        schemas[name] = value
+        _write_schemas(path, schemas)
+
+
+def get_schema(binary_path, command, probe, default=None):
+    """Get the supported flags of a helm command.
+    The schema is parsed from `helm <command> --help` once per helm binary,
+    and persisted so other operations using the same binary reuse it.
+    The probe runs without the lock, concurrent first calls may both run it.
+    :param binary_path: path to helm binary.
+    :param command: helm command, e.g. 'status' or 'registry logout'.
+    :param probe: callable returning the help text of the command.
+    :param default: flag names to use if the help can't be parsed.
+    :return frozenset of flag names, or default.
+    """
+    signature = _binary_signature(binary_path)
+    if not signature:
+        return default
+    key = (signature, command)
+    with _lock:
+        if key in _schemas:
+            return _schemas[key]
+        schemas = _read_schemas(
+            os.path.join(FLAGS_SCHEMA_DIR, signature + '.json'))
+    if command in schemas:
+        schema = frozenset(schemas[command])
+    else:
+        try:
+            schema = parse_help(probe())
+        except Exception:
+            schema = frozenset()
+        if schema:
+            _store(signature, command, sorted(schema))
+    with _lock:
+        _schemas[key] = schema or default
+        return _schemas[key]
+
+
+def compile_flags(flags, schema=None, reserved=None, logger=None):
+    """Compile a list of flag dictionaries into validated helm arguments.
+    Compiled flags are cached, so compiling the same flags again for
+    another command of the operation is a lookup.
+    :param flags: list of dictionaries with name and optional value, or
+    CompiledFlags.
+    :param schema: flag names supported by the command, other flags are
+    removed. None means the command accepts any flag.
+    :param reserved: flag names that must be passed as parameters.
+    :param logger: logger for removed flags.
+    :return CompiledFlags
+    """
+    if isinstance(flags, CompiledFlags):
+        if (schema is None or flags.names <= schema) and \
+                not flags.names & frozenset(reserved or []):
+            return flags
+        raise CloudifyHelmSDKError(
+            'Compiled flags {0} are not valid for this command.'.format(
+                sorted(flags.names)))
+    flags = flags or []
+    keys = tuple(flag_key(flag) for flag in flags)
+    cache_key = (keys, schema, tuple(reserved or []))
+    compiled = _compiled.get(cache_key)
+    if compiled:
+        return compiled
+    if any(flag.get('name') in (reserved or []) for flag in flags):
+        raise CloudifyHelmSDKError(
+            'Please do not pass {flags_list} under "flags" property,'
+            'each of them has a known property.'.format(
+                flags_list=reserved))
+    seen = set()
+    argv = []
+    names = set()
+    for key, flag in zip(keys, flags):
+        if key in seen:
+            continue
+        seen.add(key)
+        if schema is not None and flag.get('name') not in schema:
+            if logger:
+                logger.debug('Removing unsupported flag: {0}'.format(flag))
+            continue
+        argv.append(prepare_parameter(flag))
+        names.add(flag['name'])
+    compiled = CompiledFlags(tuple(argv), frozenset(names))
+    with _lock:
+        if len(_compiled) >= COMPILED_CACHE_SIZE:
+            _compiled.clear()
+        _compiled[cache_key] = compiled
+    return compiled
+
+
+def get_version(binary_path, probe):
+    """Get the version of a helm binary.
+    The version is probed once per helm binary and persisted with its flag
+    schemas.
+    :param binary_path: path to helm binary.
+    :param probe: callable returning the version, e.g. '3.12.0'.
+    :return version string, None if the probe found none.
+    """
+    signature = _binary_signature(binary_path)
+    if not signature:
+        return probe()
+    key = (signature, VERSION_KEY)
+    with _lock:
+        if _schemas.get(key):
+            return _schemas[key]
+        version = _read_schemas(os.path.join(
+            FLAGS_SCHEMA_DIR, signature + '.json')).get(VERSION_KEY)
+    if not version:
+        version = probe()
+        if version:
+            _store(signature, VERSION_KEY, version)
+    with _lock:
+        _schemas[key] = version
+    return version
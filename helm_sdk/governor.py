@@ -0,0 +1,195 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import time
+import fcntl
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from .deadline import DeadlineExceeded
+
+GOVERNOR_DIR = os.path.join(tempfile.gettempdir(), 'cloudify-helm-governor')
+HEAVY = 'heavy'
+LIGHT = 'light'
+# Commands that render charts and hold whole releases in memory.
+HEAVY_COMMANDS = frozenset(
+    ['install', 'upgrade', 'template', 'rollback', 'uninstall'])
+POLL_INTERVAL = 0.1
+TICKET_FILE = 'ticket'
+QUEUE_DIR = 'queue'
+# Waits shorter than this are not worth an info message.
+LOG_WAIT = 1.0
+
+_governors = {}
+_lock = threading.Lock()
+
+
+def command_class(command):
+    """:return HEAVY or LIGHT, the class of the limit of a command."""
+    return HEAVY if command in HEAVY_COMMANDS else LIGHT
+
+
+def default_limits():
+    """
+    :return dictionary of command class to the number of commands of the
+    class that run at once on the host, by the number of CPUs.
+    """
+    cpus = os.cpu_count() or 1
+    return {HEAVY: max(1, cpus // 2), LIGHT: max(2, cpus * 2)}
+
+
+class Governor(object):
+    """
+    Host-wide semaphore of the helm processes, one per command class,
+    shared by every process of the agent through locked slot files. A
+    process that dies releases its slot with its locks.
+    Waiters queue in ticket order, only the head of the queue takes a free
+    slot, so a command is not passed over by commands that came later.
+    """
+
+    def __init__(self,
+                 limits=None,
+                 directory=None,
+                 poll_interval=POLL_INTERVAL,
+                 clock=time.monotonic,
+                 sleep=time.sleep):
+        """
+        :param limits: dictionary of command class to the number of
+        commands of the class that run at once, see default_limits.
+        """
+        self.limits = default_limits()
+        self.limits.update(
+            (name, int(limit)) for name, limit in (limits or {}).items()
+            if limit)
+        self.directory = directory or GOVERNOR_DIR
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._sleep = sleep
+
+    def _class_dir(self, name):
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.join(path, QUEUE_DIR), exist_ok=True)
+        return path
+
+    @staticmethod
+    def _ticket(path):
+        with open(os.path.join(path, TICKET_FILE), 'a+') as ticket_file:
+            fcntl.flock(ticket_file, fcntl.LOCK_EX)
+            ticket_file.seek(0)
+            ticket = int(ticket_file.read() or 0) + 1
+            ticket_file.seek(0)
+            ticket_file.truncate()
+            ticket_file.write(str(ticket))
+        return ticket
+
+    def _enqueue(self, path):
+        """
+        :return (locked file, path) of this waiter in the queue. The file
+        is locked before it is moved into the queue, so an unlocked file in
+        the queue is of a waiter that died.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=path)
+        waiter = os.fdopen(fd, 'w')
+        fcntl.flock(waiter, fcntl.LOCK_EX)
+        queued = os.path.join(
+            path, QUEUE_DIR, '{0:020d}'.format(self._ticket(path)))
+        os.rename(temp_path, queued)
+        return waiter, queued
+
+    @staticmethod
+    def _dequeue(waiter, queued):
+        try:
+            os.remove(queued)
+        except OSError:
+            pass
+        waiter.close()
+
+    @staticmethod
+    def _is_head(queued):
+        queue, mine = os.path.split(queued)
+        for name in sorted(os.listdir(queue)):
+            if name >= mine:
+                return True
+            path = os.path.join(queue, name)
+            try:
+                with open(path) as other:
+                    fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    # Nobody holds it, the waiter died.
+                    os.remove(path)
+            except BlockingIOError:
+                return False
+            except OSError:
+                # Dequeued meanwhile.
+                continue
+        return True
+
+    def _take_slot(self, path, limit):
+        for index in range(limit):
+            slot = open(os.path.join(path, 'slot-{0}'.format(index)), 'a')
+            try:
+                fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                slot.close()
+                continue
+            return slot
+
+    @contextmanager
+    def slot(self, command, logger=None, timeout=None):
+        """
+        Hold a slot of the class of command while the block runs.
+        :param command: helm command, e.g. 'install'.
+        :param timeout: seconds to wait for a slot at most.
+        :raise DeadlineExceeded if no slot was free in time.
+        """
+        name = command_class(command)
+        limit = self.limits[name]
+        path = self._class_dir(name)
+        start = self._clock()
+        waiter, queued = self._enqueue(path)
+        try:
+            while True:
+                slot = self._is_head(queued) and self._take_slot(path, limit)
+                if slot:
+                    break
+                waited = self._clock() - start
+                if timeout is not None and waited >= timeout:
+                    raise DeadlineExceeded(
+                        'No {0} helm slot of {1} was free for {2} in '
+                        '{3:.1f}s.'.format(name, limit, command, waited))
+                self._sleep(self.poll_interval)
+        finally:
+            self._dequeue(waiter, queued)
+        waited = self._clock() - start
+        if logger:
+            log = logger.info if waited >= LOG_WAIT else logger.debug
+            log('helm {0} waited {1:.1f}s for a {2} slot of {3}.'.format(
+                command, waited, name, limit))
+        try:
+            yield
+        finally:
+            slot.close()
+
+
+def host_governor(limits=None):
+    """
+    :return the Governor of the process with limits, created once.
+    """
+    key = tuple(sorted((limits or {}).items()))
+    with _lock:
+        if key not in _governors:
+            _governors[key] = Governor(limits)
+        return _governors[key]
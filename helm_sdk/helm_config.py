@@ -0,0 +1,96 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import copy
+import json
+import yaml
+import threading
+
+from .exceptions import CloudifyHelmSDKError
+
+REPOSITORIES_FILE = 'repositories.yaml'
+REGISTRY_CONFIG_FILE = os.path.join('registry', 'config.json')
+
+_files = {}
+_lock = threading.Lock()
+
+
+def default_config_home():
+    return os.path.join(
+        os.environ.get('XDG_CONFIG_HOME') or
+        os.path.join(os.path.expanduser('~'), '.config'), 'helm')
+
+
+def repositories_path(env):
+    """Path of repositories.yaml for the environment of a helm client."""
+    return env.get('HELM_REPOSITORY_CONFIG') or os.path.join(
+        env.get('HELM_CONFIG_HOME') or default_config_home(),
+        REPOSITORIES_FILE)
+
+
+def registry_config_path(env):
+    """Path of the registry credentials of a helm client."""
+    return env.get('HELM_REGISTRY_CONFIG') or os.path.join(
+        env.get('HELM_CONFIG_HOME') or default_config_home(),
+        REGISTRY_CONFIG_FILE)
+
+
+def _read(path, loader):
+    """
+    Read and parse a helm config file, parsed again only when its stat
+    changes. Callers get a copy, so they can't change the cached content.
+    :return parsed content, None if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return
+    signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        cached = _files.get(path)
+        if not cached or cached[0] != signature:
+            try:
+                with open(path) as config_file:
+                    content = loader(config_file)
+            except (IOError, OSError, ValueError, yaml.YAMLError) as e:
+                raise CloudifyHelmSDKError(
+                    'Failed to read {0}: {1}'.format(path, e))
+            cached = (signature, content)
+            _files[path] = cached
+    return copy.deepcopy(cached[1])
+
+
+def read_repositories(path):
+    """
+    :return list of repository entries of repositories.yaml, with name,
+    url and credentials. None if the file does not exist.
+    """
+    content = _read(path, yaml.safe_load)
+    if content is None:
+        return
+    if not isinstance(content, dict):
+        raise CloudifyHelmSDKError('Invalid repositories file {0}.'.format(
+            path))
+    return content.get('repositories') or []
+
+
+def read_registry_config(path):
+    """
+    :return registry credentials file, docker config.json format. Empty if
+    the file does not exist.
+    """
+    content = _read(path, json.load)
+    return content if isinstance(content, dict) else {}
@@ -0,0 +1,319 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import json
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+import yaml
+from kubernetes import client, config
+
+from .utils import write_once
+from .exceptions import CloudifyHelmSDKError
+
+CA_DIR_NAME = 'cloudify-helm-ca'
+KUBECONFIG_DIR_NAME = 'cloudify-helm-kubeconfig'
+# Kubeconfig paths whose stat is kept to skip reading them again.
+MAX_PATHS = 256
+# Parsed kubeconfigs kept, the least recently used are dropped.
+MAX_KUBECONFIGS = 64
+
+AUTH_TYPE_EXEC = 'exec'
+AUTH_TYPE_AUTH_PROVIDER = 'auth-provider'
+AUTH_TYPE_TOKEN = 'token'
+AUTH_TYPE_CLIENT_CERTIFICATE = 'client-certificate'
+AUTH_TYPE_BASIC = 'basic'
+AUTH_TYPE_NONE = 'none'
+# Credentials of these users change over time, so configuration objects
+# built from them can't be reused.
+DYNAMIC_AUTH_TYPES = [AUTH_TYPE_EXEC, AUTH_TYPE_AUTH_PROVIDER]
+
+
+def _find_named(items, name):
+    for item in items or []:
+        if item.get('name') == name:
+            return item
+    return {}
+
+
+def get_current_context(kubeconfig_dict):
+    """Resolve the current context of a kubeconfig.
+    :param kubeconfig_dict: kubeconfig dictionary.
+    :return tuple of (context, cluster, user) dictionaries.
+    """
+    context_name = kubeconfig_dict.get('current-context')
+    contexts = kubeconfig_dict.get('contexts') or []
+    if not context_name and len(contexts) == 1:
+        context_name = contexts[0].get('name')
+    context = _find_named(contexts, context_name).get('context') or {}
+    cluster = _find_named(
+        kubeconfig_dict.get('clusters'), context.get('cluster'))
+    user = _find_named(kubeconfig_dict.get('users'), context.get('user'))
+    return context, cluster, user
+
+
+def materialize_ca_data(ca_data):
+    """Write base64 encoded CA data to a file reused across calls.
+    :param ca_data: base64 encoded certificate authority data.
+    :return path to the CA file.
+    """
+    content = base64.b64decode(ca_data)
+    digest = hashlib.sha256(content).hexdigest()
+    return write_once(CA_DIR_NAME, digest + '.crt', content, mode=0o644)
+
+
+def token_configuration(kubeconfig, token, host=None):
+    """Build a Kubernetes client configuration that authenticates with a
+    bearer token against the cluster of the kubeconfig current context.
+    The user section of the kubeconfig (exec plugins, auth providers) is
+    ignored, so no credential plugin is executed.
+    :param kubeconfig: kubeconfig path, YAML string, dict or
+    ParsedKubeconfig.
+    :param token: bearer token.
+    :param host: optional API server address, overrides the kubeconfig.
+    :return kubernetes.client.Configuration
+    """
+    cluster = parse_kubeconfig(kubeconfig).cluster
+    configuration = client.Configuration()
+    configuration.host = host or cluster.get('server')
+    configuration.api_key = {'authorization': 'Bearer ' + token}
+    if cluster.get('insecure-skip-tls-verify'):
+        configuration.verify_ssl = False
+    elif cluster.get('certificate-authority-data'):
+        configuration.ssl_ca_cert = materialize_ca_data(
+            cluster['certificate-authority-data'])
+    elif cluster.get('certificate-authority'):
+        configuration.ssl_ca_cert = cluster['certificate-authority']
+    return configuration
+
+
+class ParsedKubeconfig(object):
+    """A kubeconfig parsed once, with its current context resolved.
+    Instances are shared, through KubeconfigRegistry, by every helm and
+    Kubernetes call that uses the same kubeconfig content.
+    """
+
+    def __init__(self, digest, data, path=None):
+        self.digest = digest
+        self.data = data
+        self._path = path
+        self._written_path = None
+        self._lock = threading.Lock()
+        self._configurations = {}
+        self._api_clients = {}
+        context, cluster, user = get_current_context(data)
+        self.context = context
+        self.cluster_name = cluster.get('name')
+        self.cluster = cluster.get('cluster') or {}
+        self.user_name = user.get('name')
+        self.user = user.get('user') or {}
+
+    @property
+    def context_name(self):
+        return self.data.get('current-context')
+
+    @property
+    def server(self):
+        return self.cluster.get('server')
+
+    @property
+    def exec_config(self):
+        return self.user.get('exec')
+
+    @property
+    def auth_type(self):
+        if self.user.get('exec'):
+            return AUTH_TYPE_EXEC
+        if self.user.get('auth-provider'):
+            return AUTH_TYPE_AUTH_PROVIDER
+        if self.user.get('token') or self.user.get('tokenFile'):
+            return AUTH_TYPE_TOKEN
+        if self.user.get('client-certificate') or \
+                self.user.get('client-certificate-data'):
+            return AUTH_TYPE_CLIENT_CERTIFICATE
+        if self.user.get('username'):
+            return AUTH_TYPE_BASIC
+        return AUTH_TYPE_NONE
+
+    @property
+    def path(self):
+        """Path of a kubeconfig file with this content, for helm.
+        Kubeconfigs passed as content are written once per digest, readable
+        only by the owner, and removed when the registry drops them.
+        """
+        if not self._path or not os.path.isfile(self._path):
+            self._path = self._written_path = write_once(
+                KUBECONFIG_DIR_NAME,
+                self.digest + '.yaml',
+                yaml.safe_dump(self.data).encode('utf-8'))
+        return self._path
+
+    def remove_file(self):
+        """Remove the kubeconfig file written by path, if any."""
+        path, self._written_path = self._written_path, None
+        if path:
+            if self._path == path:
+                self._path = None
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def configuration(self, token=None, host=None):
+        """Kubernetes client configuration for this kubeconfig.
+        :param token: bearer token, overrides the kubeconfig user.
+        :param host: API server address, overrides the kubeconfig cluster.
+        :return kubernetes.client.Configuration, reused unless the
+        credentials come from an exec plugin or auth provider. One
+        configuration is kept per host, a new token replaces it.
+        """
+        with self._lock:
+            cached = self._configurations.get(host)
+            if cached and cached[0] == token:
+                return cached[1]
+            if token:
+                configuration = token_configuration(self, token, host)
+            else:
+                configuration = client.Configuration()
+                if self._path and os.path.isfile(self._path):
+                    # Relative paths in the kubeconfig are relative to it.
+                    config.load_kube_config(
+                        config_file=self._path,
+                        client_configuration=configuration)
+                else:
+                    config.load_kube_config_from_dict(
+                        self.data, client_configuration=configuration)
+                if host:
+                    configuration.host = host
+            if token or self.auth_type not in DYNAMIC_AUTH_TYPES:
+                self._configurations[host] = (token, configuration)
+            return configuration
+
+    def api_client(self, token=None, host=None):
+        """Kubernetes API client, shared by callers with the same
+        credentials so connections are pooled.
+        """
+        configuration = self.configuration(token, host)
+        with self._lock:
+            api_client = self._api_clients.get(host)
+            if not api_client or \
+                    api_client.configuration is not configuration:
+                api_client = client.ApiClient(configuration)
+                if host in self._configurations:
+                    self._api_clients[host] = api_client
+            return api_client
+
+
+class KubeconfigRegistry(object):
+    """Process wide registry of parsed kubeconfigs, keyed by the digest of
+    their content. Files are re-read only when their stat changes.
+    The stats of the most recently used paths and the most recently used
+    kubeconfigs are kept, temporary kubeconfig paths don't grow the
+    registry. The files written for dropped kubeconfigs are removed.
+    """
+
+    def __init__(self, max_paths=MAX_PATHS, max_kubeconfigs=MAX_KUBECONFIGS):
+        self._lock = threading.Lock()
+        self._by_digest = OrderedDict()
+        self._by_path = OrderedDict()
+        self.max_paths = max_paths
+        self.max_kubeconfigs = max_kubeconfigs
+
+    def _register(self, digest, loader, path=None):
+        parsed = self._by_digest.get(digest)
+        if not parsed:
+            data = loader()
+            if not isinstance(data, dict):
+                raise CloudifyHelmSDKError(
+                    'Unable to load kubeconfig, expected a mapping.')
+            parsed = ParsedKubeconfig(digest, data, path)
+            self._by_digest[digest] = parsed
+        self._by_digest.move_to_end(digest)
+        while len(self._by_digest) > self.max_kubeconfigs:
+            self._by_digest.popitem(last=False)[1].remove_file()
+        return parsed
+
+    def get(self, kubeconfig):
+        """
+        :param kubeconfig: kubeconfig path, kubeconfig YAML string or dict.
+        :return ParsedKubeconfig
+        """
+        if isinstance(kubeconfig, ParsedKubeconfig):
+            return kubeconfig
+        with self._lock:
+            if isinstance(kubeconfig, dict):
+                digest = hashlib.sha256(json.dumps(
+                    kubeconfig, sort_keys=True, default=str).encode(
+                        'utf-8')).hexdigest()
+                return self._register(digest, lambda: kubeconfig)
+            if isinstance(kubeconfig, str) and os.path.isfile(kubeconfig):
+                stat = os.stat(kubeconfig)
+                signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+                cached = self._by_path.get(kubeconfig)
+                if cached and cached[0] == signature and \
+                        cached[1] in self._by_digest:
+                    self._by_path.move_to_end(kubeconfig)
+                    self._by_digest.move_to_end(cached[1])
+                    return self._by_digest[cached[1]]
+                with open(kubeconfig, 'rb') as kube_file:
+                    content = kube_file.read()
+                digest = hashlib.sha256(content).hexdigest()
+                parsed = self._register(
+                    digest, lambda: yaml.safe_load(content), kubeconfig)
+                self._by_path[kubeconfig] = (signature, digest)
+                self._by_path.move_to_end(kubeconfig)
+                while len(self._by_path) > self.max_paths:
+                    self._by_path.popitem(last=False)
+                return parsed
+            if isinstance(kubeconfig, str):
+                digest = hashlib.sha256(
+                    kubeconfig.encode('utf-8')).hexdigest()
+                return self._register(
+                    digest, lambda: yaml.safe_load(kubeconfig))
+        raise CloudifyHelmSDKError(
+            'Unable to load kubeconfig of type {0}.'.format(type(kubeconfig)))
+
+    def clear(self):
+        with self._lock:
+            for parsed in self._by_digest.values():
+                parsed.remove_file()
+            self._by_digest.clear()
+            self._by_path.clear()
+
+
+registry = KubeconfigRegistry()
+
+
+def parse_kubeconfig(kubeconfig):
+    """Get the shared ParsedKubeconfig of a kubeconfig.
+    :param kubeconfig: kubeconfig path, kubeconfig YAML string or dict.
+    """
+    return registry.get(kubeconfig)
+
+
+def load_kubeconfig(kubeconfig):
+    """Load kubeconfig into a dictionary.
+    :param kubeconfig: kubeconfig path, kubeconfig YAML string or dict.
+    :return kubeconfig dictionary.
+    """
+    return parse_kubeconfig(kubeconfig).data
+
+
+def get_exec_config(kubeconfig_dict):
+    """Return the exec section of the current context's user, if any."""
+    return parse_kubeconfig(kubeconfig_dict).exec_config
@@ -13,10 +13,19 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
+from concurrent.futures import ThreadPoolExecutor
+
 from cloudify_kubernetes_sdk.state import Resource
 from cloudify_kubernetes_sdk import client_resolver
 from cloudify_kubernetes_sdk.connection import decorators
 
+from .discovery import Discovery
+from .rate_limit import cluster_limiter, limited_call
+from .circuit_breaker import endpoint_breaker, guarded
+from .deadline import DeadlineExceeded
+from .kubeconfig import parse_kubeconfig
+from .exceptions import CloudifyHelmSDKError
+
 
 class Kubernetes(object):
 
@@ -24,12 +33,19 @@ class Kubernetes(object):
                  logger,
                  host,
                  token,
-                 kubeconfig):
+                 kubeconfig,
+                 deadline=None):
+        """
+        :param deadline: helm_sdk.deadline.Deadline of the operation, reads
+        time out when it passes.
+        """
         self.logger = logger
         self._host = host
         self._token = token
         self._kubeconfig = kubeconfig
         self._kubeconfig_obj = None
+        self._discovery = None
+        self.deadline = deadline
 
     @property
     def host(self):
@@ -41,13 +57,60 @@ class Kubernetes(object):
 
     @property
     def kubeconfig(self):
-        if not self._kubeconfig_obj:
+        if not self._kubeconfig_obj and isinstance(
+                self._kubeconfig, (str, dict)):
+            # A token overrides the kubeconfig user, same as helm does
+            # with --kube-token, so exec credential plugins are not run.
+            # The client is shared with every other caller that uses the
+            # same kubeconfig and credentials.
+            self._kubeconfig_obj = parse_kubeconfig(
+                self._kubeconfig).api_client(self.token, self.host)
+        elif not self._kubeconfig_obj:
             self._kubeconfig_obj = decorators.setup_configuration(
                 kubeconfig=self._kubeconfig,
                 api_key=self.token,
                 host=self.host)
         return self._kubeconfig_obj
 
+    @property
+    def rate_limiter(self):
+        """Rate limiter shared by all the clients of this API server."""
+        return cluster_limiter(self.kubeconfig.configuration.host)
+
+    @property
+    def circuit(self):
+        """Circuit breaker of the API server, shared by the agent."""
+        return endpoint_breaker(self.kubeconfig.configuration.host)
+
+    @property
+    def discovery(self):
+        if not self._discovery:
+            self._discovery = Discovery(self.kubeconfig,
+                                        limiter=self.rate_limiter,
+                                        circuit=self.circuit,
+                                        deadline=self.deadline)
+        return self._discovery
+
+    def _request_timeout(self, resource):
+        """
+        :return keyword arguments of a read of resource that ends by the
+        deadline.
+        """
+        if not self.deadline:
+            return {}
+        return {'_request_timeout': self.deadline.timeout(
+            'reading {0} {1}'.format(
+                resource['kind'], resource['metadata']['name']))}
+
+    def _discovered(self, resource):
+        try:
+            return self.discovery.resource(
+                resource['apiVersion'], resource['kind'])
+        except DeadlineExceeded:
+            raise
+        except CloudifyHelmSDKError as e:
+            self.logger.debug(str(e))
+
     def get_callable(self, resource, namespace):
         # TODO: This is more like "the entire object", not just status.
         try:
@@ -57,15 +120,44 @@ class Kubernetes(object):
             fn_name = client_resolver.get_read_function_name(resource['kind'])
             self.logger.info('fn_name {}'.format(fn_name))
             callable = client_resolver.get_callable(
-                fn_name, api(self.kubeconfig))
+                fn_name, api(self.kubeconfig)) if api else None
             self.logger.info('callable {}'.format(callable))
-            return callable(
-                resource['metadata']['name'], namespace)
+            discovered = self._discovered(resource)
+            # Typed clients only read namespaced kinds, cluster scoped
+            # kinds and kinds without a typed client, like CRDs, are read
+            # with the discovered API path.
+            if callable and (not discovered or discovered['namespaced']):
+                timeout = self._request_timeout(resource)
+                with guarded(self.circuit):
+                    return limited_call(self.rate_limiter,
+                                        callable,
+                                        resource['metadata']['name'],
+                                        namespace,
+                                        **timeout)
+            return self.read_dynamic(resource, namespace)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.logger.error(
                 'There was an error fetching {} in namespace {}: {}'.format(
                     resource['metadata']['name'], namespace, str(e)))
 
+    def read_dynamic(self, resource, namespace):
+        """
+        Read a resource of any kind the cluster serves.
+        :return the resource as a dictionary.
+        """
+        path = self.discovery.resource_path(
+            resource['apiVersion'],
+            resource['kind'],
+            resource['metadata']['name'],
+            resource['metadata'].get('namespace', namespace))
+        if not path:
+            raise CloudifyHelmSDKError(
+                'The cluster does not serve {0} {1}.'.format(
+                    resource['apiVersion'], resource['kind']))
+        return self.discovery.get(path, **self._request_timeout(resource))
+
     def status(self, resource, namespace):
         resource_api_obj = self.get_callable(resource, namespace)
         return Resource(resource_api_obj).state
@@ -96,23 +188,47 @@ class Kubernetes(object):
         self.report_errors(errors)
         return status
 
-    def multiple_resource_check_status(self, helm_status):
+    def _check_resource(self, manifest, resource, namespace):
+        errors = []
+        self.logger.info('Looking for {}'.format(manifest))
+        error = self.validate_resource_metadata(resource, namespace)
+        if error:
+            errors.append(error)
+        state = self.check_status(resource, namespace)
+        if not state:
+            errors.append(
+                'Unable to retrieve state for {} in namespace {}.'.format(
+                    resource, namespace))
+        return state, errors
+
+    def multiple_resource_check_status(self, helm_status, max_workers=1):
+        """
+        Check the status of every resource of a release.
+        :param helm_status: output of helm status.
+        :param max_workers: number of resources read concurrently, they
+        share the API client and its connection pool.
+        :return status dictionary and list of errors.
+        """
         errors = []
         status = {}
         namespace = helm_status.get('namespace')
-
-        for manifest, resource in helm_status['manifest'].items():
-            self.logger.info('Looking for {}'.format(manifest))
+        items = list(helm_status['manifest'].items())
+        if max_workers > 1 and len(items) > 1:
+            # Build the API client and discovery once, before the reads
+            # share them.
+            self.kubeconfig
+            self.discovery
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                checks = list(executor.map(
+                    lambda item: self._check_resource(
+                        item[0], item[1], namespace), items))
+        else:
+            checks = [self._check_resource(manifest, resource, namespace)
+                      for manifest, resource in items]
+        for (manifest, _), (state, resource_errors) in zip(items, checks):
             manifest = manifest.replace(
                 '/', '_').replace('.yaml', '').replace('-', '__')
-            error = self.validate_resource_metadata(resource, namespace)
-            if error:
-                errors.append(error)
-            state = self.check_status(resource, namespace)
-            if not state:
-                errors.append(
-                    'Unable to retrieve state for {} in namespace {}.'.format(
-                        resource, namespace))
+            errors.extend(resource_errors)
             status.update(
                 {
                     manifest: state
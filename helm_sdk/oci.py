@@ -0,0 +1,196 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import re
+import json
+import yaml
+import hashlib
+import tarfile
+from urllib.parse import urlencode
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from .repository import _ssl_context
+from .exceptions import CloudifyHelmSDKError
+
+OCI_SCHEME = 'oci://'
+CHART_LAYER_MEDIA_TYPE = 'application/vnd.cncf.helm.chart.content.v1.tar+gzip'
+MANIFEST_MEDIA_TYPES = ', '.join([
+    'application/vnd.oci.image.manifest.v1+json',
+    'application/vnd.docker.distribution.manifest.v2+json'])
+CHART_FILE = 'Chart.yaml'
+DEFAULT_TIMEOUT = 30
+CHUNK_SIZE = 1024 * 1024
+CHALLENGE_PARAM_PATTERN = re.compile(r'(\w+)="([^"]*)"')
+
+
+def parse_reference(reference):
+    """
+    Split an oci://<host>/<repository>[:<tag>] reference.
+    :return (host, repository, tag), tag is None if not in the reference.
+    """
+    if not reference.startswith(OCI_SCHEME):
+        raise CloudifyHelmSDKError(
+            'Not an OCI reference: {0}'.format(reference))
+    host, _, repository = reference[len(OCI_SCHEME):].partition('/')
+    repository = repository.strip('/')
+    tag = None
+    name = repository.rsplit('/', 1)[-1]
+    if ':' in name:
+        repository, tag = repository.rsplit(':', 1)
+    return host, repository, tag
+
+
+def chart_tag(version):
+    """OCI tag of a chart version, tags can't contain +."""
+    return str(version).replace('+', '_')
+
+
+def archive_digest(path):
+    """:return sha256:<hex> digest of a chart archive."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as archive:
+        for chunk in iter(lambda: archive.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return 'sha256:' + sha256.hexdigest()
+
+
+def chart_metadata(archive):
+    """
+    :return Chart.yaml of a chart archive, as a dictionary.
+    """
+    try:
+        with tarfile.open(archive, 'r:gz') as tar:
+            for member in tar:
+                parts = member.name.split('/')
+                if len(parts) == 2 and parts[1] == CHART_FILE:
+                    metadata = yaml.safe_load(tar.extractfile(member))
+                    if isinstance(metadata, dict):
+                        return metadata
+    except (IOError, OSError, tarfile.TarError, yaml.YAMLError) as e:
+        raise CloudifyHelmSDKError(
+            'Failed to read chart archive {0}: {1}'.format(archive, e))
+    raise CloudifyHelmSDKError(
+        'Chart archive {0} has no {1}.'.format(archive, CHART_FILE))
+
+
+class Registry(object):
+    """
+    Minimal client of the OCI distribution API, enough to look up the
+    chart layer of a tag without transferring it.
+    Registries that answer 401 with a Bearer challenge are sent to their
+    token service, with the credentials helm stored on registry login.
+    """
+
+    def __init__(self,
+                 host,
+                 auth=None,
+                 plain_http=False,
+                 ca_file=None,
+                 insecure_skip_tls_verify=False,
+                 timeout=DEFAULT_TIMEOUT):
+        """
+        :param host: registry host, with the port if any.
+        :param auth: base64 of <username>:<password>, like config.json.
+        """
+        self.host = host
+        self.auth = auth
+        self.scheme = 'http' if plain_http else 'https'
+        self.context = None if plain_http else _ssl_context(
+            ca_file, insecure_skip_tls_verify)
+        self.timeout = timeout
+        self._authorization = None
+
+    def _urlopen(self, url, method='GET', headers=None, authorization=None):
+        headers = dict(headers or {})
+        if authorization:
+            headers['Authorization'] = authorization
+        return urlopen(Request(url, headers=headers, method=method),
+                       timeout=self.timeout,
+                       context=self.context)
+
+    def _authorize(self, challenge):
+        scheme, _, params = challenge.partition(' ')
+        if scheme.lower() == 'basic':
+            return 'Basic ' + self.auth if self.auth else None
+        if scheme.lower() != 'bearer':
+            return
+        params = dict(CHALLENGE_PARAM_PATTERN.findall(params))
+        realm = params.pop('realm', None)
+        if not realm:
+            return
+        url = realm + ('&' if '?' in realm else '?') + urlencode(params)
+        try:
+            with self._urlopen(url, authorization='Basic ' + self.auth
+                               if self.auth else None) as response:
+                token = json.load(response)
+        except (HTTPError, URLError, IOError, OSError, ValueError) as e:
+            raise CloudifyHelmSDKError(
+                'Failed to get a token of {0}: {1}'.format(self.host, e))
+        token = token.get('token') or token.get('access_token')
+        return 'Bearer ' + token if token else None
+
+    def request(self, method, path, headers=None):
+        """
+        :return response of the registry, with the authorization the
+        registry asks for.
+        """
+        url = '{0}://{1}{2}'.format(self.scheme, self.host, path)
+        try:
+            return self._urlopen(url, method, headers, self._authorization)
+        except HTTPError as e:
+            if e.code != 401 or self._authorization:
+                raise
+            authorization = self._authorize(
+                e.headers.get('WWW-Authenticate', ''))
+            if not authorization:
+                raise
+            self._authorization = authorization
+        return self._urlopen(url, method, headers, self._authorization)
+
+    def manifest(self, repository, tag):
+        """
+        Check the manifest with HEAD first, the manifest body is fetched
+        only for tags that exist.
+        :return the manifest of repository:tag, None if it does not exist.
+        """
+        path = '/v2/{0}/manifests/{1}'.format(repository, chart_tag(tag))
+        headers = {'Accept': MANIFEST_MEDIA_TYPES}
+        try:
+            self.request('HEAD', path, headers).close()
+            with self.request('GET', path, headers) as response:
+                return json.load(response)
+        except HTTPError as e:
+            if e.code == 404:
+                return
+            raise CloudifyHelmSDKError(
+                'Failed to get manifest {0}/{1}:{2}: {3} {4}'.format(
+                    self.host, repository, tag, e.code, e.reason))
+        except (URLError, IOError, OSError, ValueError) as e:
+            raise CloudifyHelmSDKError(
+                'Failed to get manifest {0}/{1}:{2}: {3}'.format(
+                    self.host, repository, tag, e))
+
+    def chart_digest(self, repository, tag):
+        """
+        The manifest digest includes the creation time helm adds on push,
+        so the chart layer digest is the one to compare with an archive.
+        :return digest of the chart layer of repository:tag, None if the
+        tag does not exist.
+        """
+        manifest = self.manifest(repository, tag)
+        for layer in (manifest or {}).get('layers') or []:
+            if layer.get('mediaType') == CHART_LAYER_MEDIA_TYPE:
+                return layer.get('digest')
@@ -0,0 +1,168 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import time
+import threading
+from email.utils import parsedate_to_datetime
+
+DEFAULT_RATE = 20.0
+DEFAULT_BURST = 40
+MIN_RATE = 1.0
+MAX_RATE = 100.0
+# Additive increase of the rate per second of successful requests.
+RATE_INCREASE = 1.0
+# Multiplicative decrease of the rate on throttling.
+RATE_DECREASE = 0.5
+# Throttled responses within this many seconds decrease the rate once,
+# concurrent requests are usually throttled together.
+DECREASE_INTERVAL = 1.0
+MAX_RETRY_AFTER = 60.0
+MAX_THROTTLED_RETRIES = 5
+THROTTLED_STATUS = 429
+# Refills are computed with floats, a token that is short by rounding only
+# is whole.
+TOKEN_EPSILON = 1e-6
+
+_limiters = {}
+_lock = threading.Lock()
+
+
+def retry_after(headers):
+    """
+    :return seconds of a Retry-After header, in seconds or as an HTTP date,
+    None if there is none.
+    """
+    value = (headers or {}).get('Retry-After')
+    if not value:
+        return
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+class AdaptiveRateLimiter(object):
+    """
+    Token bucket of the requests to one API server. The rate adapts with
+    AIMD: it grows additively while requests succeed and is halved when
+    the server throttles, and a Retry-After pauses all the requests.
+    """
+
+    def __init__(self,
+                 rate=DEFAULT_RATE,
+                 burst=DEFAULT_BURST,
+                 min_rate=MIN_RATE,
+                 max_rate=MAX_RATE,
+                 clock=time.monotonic,
+                 sleep=time.sleep):
+        """
+        :param rate: initial requests per second.
+        :param burst: bucket size, requests that can be sent at once.
+        """
+        self.rate = float(rate)
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._decreased = None
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """
+        Wait for a token.
+        :return seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= 1 - TOKEN_EPSILON:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+    def success(self):
+        with self._lock:
+            # One request is 1 / rate seconds of traffic.
+            self.rate = min(self.max_rate,
+                            self.rate + RATE_INCREASE / self.rate)
+
+    def throttled(self, retry_after_seconds=None):
+        with self._lock:
+            now = self._clock()
+            if self._decreased is None or \
+                    now - self._decreased >= DECREASE_INTERVAL:
+                self.rate = max(self.min_rate, self.rate * RATE_DECREASE)
+                self._decreased = now
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after_seconds:
+                self._blocked_until = max(
+                    self._blocked_until, now + retry_after_seconds)
+
+
+def cluster_limiter(host):
+    """
+    :return the rate limiter of the API server at host, shared by all the
+    Kubernetes calls of the process.
+    """
+    with _lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveRateLimiter()
+        return _limiters[host]
+
+
+def limited_call(limiter, fn, *args, **kwargs):
+    """
+    Call fn when the limiter allows, and call it again when the API server
+    answers 429 Too Many Requests, after its Retry-After.
+    :param limiter: AdaptiveRateLimiter, fn is called directly if None.
+    """
+    if not limiter:
+        return fn(*args, **kwargs)
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if getattr(e, 'status', None) != THROTTLED_STATUS:
+                raise
+            limiter.throttled(retry_after(getattr(e, 'headers', None)))
+            attempt += 1
+            if attempt > MAX_THROTTLED_RETRIES:
+                raise
+            continue
+        limiter.success()
+        return result
@@ -0,0 +1,213 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import re
+import ssl
+import gzip
+import json
+import time
+import base64
+import hashlib
+import tempfile
+from collections import namedtuple
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from .exceptions import CloudifyHelmSDKError
+
+REPOSITORY_CACHE_DIR = 'repository'
+INDEX_SUFFIX = '-index.yaml'
+CHARTS_SUFFIX = '-charts.txt'
+VALIDATORS_SUFFIX = '-index.validators.json'
+DEFAULT_TIMEOUT = 120
+CHUNK_SIZE = 1024 * 1024
+ENTRY_PATTERN = re.compile(r'^  ([^\s#][^:]*):\s*$')
+
+# Result of an index refresh: modified is False when the server answered
+# 304 Not Modified and the cached index was kept.
+IndexRefresh = namedtuple(
+    'IndexRefresh', ['name', 'path', 'modified', 'size', 'duration'])
+
+
+def default_cache_home():
+    return os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or
+        os.path.join(os.path.expanduser('~'), '.cache'), 'helm')
+
+
+def index_path(cache_home, name):
+    """Path helm reads the index of repository name from."""
+    return os.path.join(
+        cache_home, REPOSITORY_CACHE_DIR, name + INDEX_SUFFIX)
+
+
+def url_repo_name(repo_url):
+    """Cache name of a repository that is used by URL, not added by name."""
+    return 'url-' + hashlib.sha256(
+        repo_url.rstrip('/').encode('utf-8')).hexdigest()[:16]
+
+
+def is_natively_refreshable(repo):
+    """
+    :param repo: repository entry of repositories.yaml.
+    :return True if its index can be downloaded without helm: an HTTP(S)
+    repository that needs no credentials or client certificate.
+    """
+    url = repo.get('url') or ''
+    return url.startswith(('http://', 'https://')) and not any(
+        repo.get(key) for key in ['username', 'password', 'certFile',
+                                  'keyFile'])
+
+
+def index_url(repo_url):
+    return repo_url.rstrip('/') + '/index.yaml'
+
+
+def _read_validators(path, url):
+    try:
+        with open(path) as validators_file:
+            validators = json.load(validators_file)
+    except (IOError, OSError, ValueError):
+        return {}
+    if validators.get('url') != url:
+        return {}
+    return validators
+
+
+def _write_json(path, content):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as temp_file:
+        json.dump(content, temp_file)
+    os.replace(temp_path, path)
+
+
+def _ssl_context(ca_file=None, insecure_skip_tls_verify=False):
+    context = ssl.create_default_context(cafile=ca_file)
+    if insecure_skip_tls_verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _copy_index(response, target):
+    """
+    Copy the index from the response to target, decompressing gzip, and
+    collect the chart names from the entries on the way, so the index is
+    not loaded in memory.
+    :return size of the index and sorted list of chart names.
+    """
+    source = response
+    if response.headers.get('Content-Encoding', '').lower() == 'gzip':
+        source = gzip.GzipFile(fileobj=response)
+    size = 0
+    charts = []
+    in_entries = False
+    remainder = b''
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        target.write(chunk)
+        size += len(chunk)
+        lines = (remainder + chunk).split(b'\n')
+        remainder = lines.pop()
+        for line in lines:
+            line = line.decode('utf-8', 'replace').rstrip('\r')
+            if line and not line.startswith((' ', '#')):
+                in_entries = line.startswith('entries:')
+            elif in_entries:
+                match = ENTRY_PATTERN.match(line)
+                if match:
+                    charts.append(match.group(1).strip('"\''))
+    return size, sorted(charts)
+
+
+def refresh_index(name,
+                  repo_url,
+                  cache_home=None,
+                  username=None,
+                  password=None,
+                  ca_file=None,
+                  insecure_skip_tls_verify=False,
+                  timeout=DEFAULT_TIMEOUT,
+                  logger=None):
+    """
+    Download the index of a chart repository into helm's repository cache,
+    same as `helm repo update <name>`.
+    The ETag and Last-Modified of the previous download are sent back, so
+    an index that did not change is answered with 304 and no body.
+    The index is requested gzip compressed.
+    :param name: repository name.
+    :param repo_url: repository URL.
+    :param cache_home: HELM_CACHE_HOME of the helm client.
+    :return IndexRefresh
+    """
+    start = time.monotonic()
+    cache_home = cache_home or default_cache_home()
+    path = index_path(cache_home, name)
+    validators_path = path[:-len(INDEX_SUFFIX)] + VALIDATORS_SUFFIX
+    url = index_url(repo_url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    validators = _read_validators(validators_path, url) \
+        if os.path.isfile(path) else {}
+    headers = {'Accept-Encoding': 'gzip', 'User-Agent': 'Helm/3'}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    if username or password:
+        headers['Authorization'] = 'Basic ' + base64.b64encode(
+            '{0}:{1}'.format(username or '', password or '').encode(
+                'utf-8')).decode('ascii')
+    context = None
+    if url.startswith('https'):
+        context = _ssl_context(ca_file, insecure_skip_tls_verify)
+    try:
+        response = urlopen(
+            Request(url, headers=headers), timeout=timeout, context=context)
+    except HTTPError as e:
+        if e.code == 304:
+            if logger:
+                logger.debug('Index of {0} not modified.'.format(name))
+            return IndexRefresh(name, path, False, os.path.getsize(path),
+                                time.monotonic() - start)
+        raise CloudifyHelmSDKError(
+            'Failed to fetch {0}: {1} {2}'.format(url, e.code, e.reason))
+    except (URLError, IOError, OSError) as e:
+        raise CloudifyHelmSDKError(
+            'Failed to fetch {0}: {1}'.format(url, e))
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with response, os.fdopen(fd, 'wb') as temp_file:
+            size, charts = _copy_index(response, temp_file)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except Exception as e:
+        os.remove(temp_path)
+        raise CloudifyHelmSDKError(
+            'Failed to write index of {0}: {1}'.format(name, e))
+    charts_path = path[:-len(INDEX_SUFFIX)] + CHARTS_SUFFIX
+    with open(charts_path, 'w') as charts_file:
+        charts_file.write('\n'.join(charts))
+    _write_json(validators_path, {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    })
+    if logger:
+        logger.debug('Downloaded index of {0}, {1} bytes.'.format(
+            name, size))
+    return IndexRefresh(name, path, True, size, time.monotonic() - start)
@@ -0,0 +1,183 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import re
+import time
+import random
+import threading
+
+from .deadline import MIN_STEP_TIMEOUT, DeadlineExceeded
+from .circuit_breaker import CircuitOpenError, is_connection_error
+
+DEFAULT_ATTEMPTS = 3
+BASE_DELAY = 1.0
+MAX_DELAY = 30.0
+# Errors of helm that go away when the command runs again.
+TRANSIENT_ERROR_PATTERN = re.compile(
+    r'etcdserver: (request timed out|leader changed|too many requests)|'
+    r'connection reset by peer|broken pipe|unexpected eof|'
+    r'http2: client connection lost|tls handshake timeout|'
+    r'another operation \(install/upgrade/rollback\) is in progress|'
+    r'the server is currently unable to handle the request|'
+    r'the server was unable to return a response in the time allotted|'
+    r'too many requests|server is shutting down|'
+    r'the object has been modified; please apply your changes',
+    re.IGNORECASE)
+RELEASE_NOT_FOUND_PATTERN = re.compile(r'release: not found', re.IGNORECASE)
+# The API server rejected the credentials, e.g. an expired bearer token.
+UNAUTHORIZED_PATTERN = re.compile(
+    r'\bunauthorized\b|'
+    r'the server has asked for the client to provide credentials',
+    re.IGNORECASE)
+# Commands that only read, running them again is always safe.
+READ_COMMANDS = frozenset(['status', 'get', 'list', 'history', 'show'])
+# Commands that change the cluster, they run again only if a verify call
+# tells what the failed attempt did.
+VERIFIED_COMMANDS = frozenset(['install'])
+
+
+def is_transient(error):
+    """
+    Helm exits with 1 on every error, the stderr tells what failed.
+    A process killed by a signal ran out of its max_sleep_time, running it
+    again would not help.
+    :return True if error is worth a retry of the command.
+    """
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    exit_code = getattr(error, 'exit_code', None)
+    if isinstance(exit_code, int) and (exit_code < 0 or exit_code > 128):
+        return False
+    if is_connection_error(error):
+        return True
+    text = getattr(error, 'stderr', None) or str(error)
+    return bool(TRANSIENT_ERROR_PATTERN.search(str(text)))
+
+
+def is_release_not_found(error):
+    text = getattr(error, 'stderr', None) or str(error)
+    return bool(RELEASE_NOT_FOUND_PATTERN.search(str(text)))
+
+
+def is_unauthorized(error):
+    """
+    :return True if the API server rejected the credentials, for helm
+    process errors and kubernetes client errors.
+    """
+    if getattr(error, 'status', None) == 401:
+        return True
+    text = getattr(error, 'stderr', None) or str(error)
+    return bool(UNAUTHORIZED_PATTERN.search(str(text)))
+
+
+class RetryPolicy(object):
+    """
+    Retries of helm commands that failed with a transient error, after a
+    jittered exponential backoff. Commands that only read are retried,
+    commands that change the cluster only after a verify call.
+    The retry counts of each command are kept for metrics.
+    """
+
+    def __init__(self,
+                 attempts=DEFAULT_ATTEMPTS,
+                 base_delay=BASE_DELAY,
+                 max_delay=MAX_DELAY,
+                 sleep=time.sleep,
+                 jitter=random.random):
+        """
+        :param attempts: maximum number of runs of a command.
+        :param base_delay: seconds of the first backoff, doubled for each
+        retry up to max_delay.
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._jitter = jitter
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def delay(self, retry):
+        """
+        :return seconds to wait before retry number retry, with full
+        jitter so concurrent operations don't retry together.
+        """
+        return self._jitter() * min(
+            self.max_delay, self.base_delay * 2 ** retry)
+
+    def _count(self, command, event):
+        with self._lock:
+            counts = self._counts.setdefault(
+                command, {'calls': 0, 'retries': 0, 'recovered': 0,
+                          'exhausted': 0})
+            counts[event] += 1
+
+    def counts(self):
+        """
+        :return dictionary of command to the numbers of calls, retries,
+        calls that succeeded after a retry and calls that ran out of
+        retries.
+        """
+        with self._lock:
+            return dict((command, dict(counts))
+                        for command, counts in self._counts.items())
+
+    def call(self, command, fn, verify=None, deadline=None, logger=None):
+        """
+        Call fn, and again while it fails with a transient error.
+        :param command: helm command fn runs, e.g. 'status'.
+        :param verify: for commands that change the cluster, called with
+        the error of a failed attempt: returns the result if the attempt
+        did succeed, None if it is safe to run the command again, and
+        raises if it is not.
+        :param deadline: deadline.Deadline, no backoff runs past it.
+        :return result of fn.
+        """
+        self._count(command, 'calls')
+        retry = 0
+        while True:
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_transient(e) or (
+                        command not in READ_COMMANDS and
+                        (command not in VERIFIED_COMMANDS or not verify)):
+                    raise
+                if retry + 1 >= self.attempts:
+                    self._count(command, 'exhausted')
+                    raise
+                delay = self.delay(retry)
+                if deadline and \
+                        deadline.remaining() - delay < MIN_STEP_TIMEOUT:
+                    self._count(command, 'exhausted')
+                    raise
+                if verify:
+                    result = verify(e)
+                    if result is not None:
+                        self._count(command, 'recovered')
+                        return result
+                retry += 1
+                self._count(command, 'retries')
+                if logger:
+                    logger.warning(
+                        'helm {0} failed with a transient error, retry {1} '
+                        'in {2:.1f}s: {3}'.format(
+                            command, retry, delay,
+                            getattr(e, 'stderr', None) or e))
+                self._sleep(delay)
+                continue
+            if retry:
+                self._count(command, 'recovered')
+            return result
@@ -0,0 +1,157 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import re
+
+from .exceptions import CloudifyHelmSDKError
+
+VERSION_PATTERN = re.compile(
+    r'^v?(\d+)(?:\.(\d+))?(?:\.(\d+))?'
+    r'(?:-([0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$')
+WILDCARD_PATTERN = re.compile(
+    r'^v?(\d+|[xX*])(?:\.(\d+|[xX*]))?(?:\.(\d+|[xX*]))?'
+    r'(?:-([0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$')
+TERM_PATTERN = re.compile(r'^(!=|>=|<=|=|>|<|~>|~|\^)?(.*)$')
+HYPHEN_RANGE_PATTERN = re.compile(r'(\S+)\s+-\s+(\S+)')
+OPERATOR_SPACE_PATTERN = re.compile(r'(!=|>=|<=|=|>|<|~>|~|\^)\s+')
+WILDCARDS = ('x', 'X', '*')
+
+
+def _prerelease_key(prerelease):
+    if not prerelease:
+        # A release sorts after all its pre-releases.
+        return (1,)
+    return (0,) + tuple(
+        (0, int(part), '') if part.isdigit() else (1, 0, part)
+        for part in prerelease.split('.'))
+
+
+def version_key(version):
+    """
+    Sortable key of a semantic version, e.g. '1.2.3-rc.1'.
+    Missing minor and patch are 0, like helm does.
+    :return tuple, or None if version is not a semantic version.
+    """
+    match = VERSION_PATTERN.match(str(version).strip())
+    if not match:
+        return
+    major, minor, patch, prerelease = match.groups()
+    return (int(major), int(minor or 0), int(patch or 0),
+            _prerelease_key(prerelease))
+
+
+def is_prerelease(key):
+    return key[3] != (1,)
+
+
+def _bound(numbers, index):
+    """Smallest version above numbers[:index + 1], e.g. 1.2 -> 1.3.0."""
+    bumped = list(numbers[:index + 1]) + [0] * (2 - index)
+    bumped[index] += 1
+    return tuple(bumped) + (_prerelease_key('0'),)
+
+
+def _term_comparators(term):
+    """Translate one constraint term into (operator, key) comparators."""
+    operator, version = TERM_PATTERN.match(term).groups()
+    operator = operator or '='
+    match = WILDCARD_PATTERN.match(version.strip() or '*')
+    if not match:
+        raise CloudifyHelmSDKError(
+            'Invalid version constraint: {0}'.format(term))
+    parts = match.groups()[:3]
+    prerelease = match.group(4)
+    # Number of leading numeric parts, a wildcard or a missing part ends it.
+    fixed = 0
+    for part in parts:
+        if part is None or part in WILDCARDS:
+            break
+        fixed += 1
+    numbers = tuple(int(part) for part in parts[:fixed]) + \
+        (0,) * (3 - fixed)
+    lower = numbers + (_prerelease_key(prerelease),)
+    if operator in ('=', '!=') and fixed < 3:
+        if fixed == 0:
+            return [] if operator == '=' else [('<', (0, 0, 0, (0,)))]
+        upper = _bound(numbers, fixed - 1)
+        if operator == '=':
+            return [('>=', lower), ('<', upper)]
+        return [('!range', (lower, upper))]
+    if operator in ('~', '~>'):
+        if fixed == 0:
+            return []
+        return [('>=', lower), ('<', _bound(numbers, min(fixed, 2) - 1))]
+    if operator == '^':
+        if fixed == 0:
+            return []
+        for index, number in enumerate(numbers[:fixed]):
+            if number or index == fixed - 1:
+                return [('>=', lower), ('<', _bound(numbers, index))]
+    if operator == '>' and fixed < 3:
+        return [('>=', _bound(numbers, fixed - 1))] if fixed else \
+            [('<', (0, 0, 0, (0,)))]
+    if operator == '<=' and fixed < 3:
+        return [('<', _bound(numbers, fixed - 1))] if fixed else []
+    return [(operator, lower)]
+
+
+def _compare(operator, key, bound):
+    if operator == '=':
+        return key == bound
+    if operator == '!=':
+        return key != bound
+    if operator == '>':
+        return key > bound
+    if operator == '>=':
+        return key >= bound
+    if operator == '<':
+        return key < bound
+    if operator == '<=':
+        return key <= bound
+    return not bound[0] <= key < bound[1]
+
+
+class Constraint(object):
+    """
+    Semantic version constraint, with the syntax helm accepts for --version:
+    comparisons (=, !=, >, >=, <, <=), ~ and ^ ranges, x or * wildcards,
+    hyphen ranges (1.2 - 1.4), AND with spaces or commas and OR with ||.
+    Pre-release versions only match constraints with a pre-release.
+    """
+
+    def __init__(self, constraint):
+        self.constraint = str(constraint or '*').strip()
+        self.allow_prerelease = False
+        self.groups = []
+        for group in self.constraint.split('||'):
+            group = HYPHEN_RANGE_PATTERN.sub(r'>=\1 <=\2', group)
+            group = OPERATOR_SPACE_PATTERN.sub(r'\1', group)
+            comparators = []
+            for term in group.replace(',', ' ').split():
+                if '-' in term:
+                    self.allow_prerelease = True
+                comparators.extend(_term_comparators(term))
+            self.groups.append(comparators)
+
+    def matches(self, version):
+        key = version if isinstance(version, tuple) else version_key(version)
+        if not key or is_prerelease(key) and not self.allow_prerelease:
+            return False
+        return any(all(_compare(operator, key, bound)
+                       for operator, bound in group)
+                   for group in self.groups)
+
+    def __repr__(self):
+        return 'Constraint({0!r})'.format(self.constraint)
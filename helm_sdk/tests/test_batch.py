@@ -0,0 +1,133 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import time
+import mock
+import threading
+
+from . import HelmTestBase
+from ..batch import ReleaseSpec
+from ..exceptions import CloudifyHelmSDKError
+
+
+class BatchTest(HelmTestBase):
+
+    def setUp(self):
+        super(BatchTest, self).setUp()
+        self.lock = threading.Lock()
+        self.order = []
+        self.running = {}
+        self.max_running = {}
+
+    def fake_command(self, fail=None):
+        def command(helm, name, *_, **kwargs):
+            cluster = kwargs.get('apiserver')
+            with self.lock:
+                self.order.append(name)
+                self.running[cluster] = self.running.get(cluster, 0) + 1
+                self.max_running[cluster] = max(
+                    self.max_running.get(cluster, 0), self.running[cluster])
+            time.sleep(0.02)
+            with self.lock:
+                self.running[cluster] -= 1
+            if name in (fail or []):
+                raise CloudifyHelmSDKError('{0} failed'.format(name))
+            return {'name': name}
+        return command
+
+    def test_install_in_dependency_order(self):
+        specs = [
+            ReleaseSpec('app', 'charts/app', depends_on=['db', 'cache'],
+                        apiserver='a'),
+            ReleaseSpec('db', 'charts/db', apiserver='a'),
+            ReleaseSpec('cache', 'charts/cache', apiserver='a'),
+        ]
+        with mock.patch('helm_sdk.Helm.install', autospec=True,
+                        side_effect=self.fake_command()):
+            results = self.helm.batch(specs).run('install')
+        self.assertEqual(list(results), ['app', 'db', 'cache'])
+        self.assertTrue(all(result.succeeded for result in results.values()))
+        self.assertEqual(self.order[-1], 'app')
+        self.assertEqual(results['db'].output, {'name': 'db'})
+        self.assertIsNotNone(results['db'].duration)
+
+    def test_uninstall_in_reverse_order(self):
+        specs = [
+            ReleaseSpec('db', apiserver='a'),
+            ReleaseSpec('app', depends_on=['db'], apiserver='a'),
+        ]
+        with mock.patch('helm_sdk.Helm.uninstall', autospec=True,
+                        side_effect=self.fake_command()):
+            self.helm.batch(specs).run('uninstall')
+        self.assertEqual(self.order, ['app', 'db'])
+
+    def test_uninstall_release_not_found_succeeds(self):
+        specs = [
+            ReleaseSpec('db', apiserver='a'),
+            ReleaseSpec('app', depends_on=['db'], apiserver='a'),
+        ]
+
+        def uninstall(helm, name, *_, **__):
+            if name == 'app':
+                raise CloudifyHelmSDKError(
+                    'Error: uninstall: Release not loaded: app: '
+                    'release: not found')
+            return 'release "db" uninstalled'
+
+        with mock.patch('helm_sdk.Helm.uninstall', autospec=True,
+                        side_effect=uninstall):
+            results = self.helm.batch(specs).run('uninstall')
+        self.assertTrue(all(result.succeeded for result in results.values()))
+
+    def test_failure_skips_dependents(self):
+        specs = [
+            ReleaseSpec('db', 'charts/db', apiserver='a'),
+            ReleaseSpec('app', 'charts/app', depends_on=['db'],
+                        apiserver='a'),
+            ReleaseSpec('web', 'charts/web', depends_on=['app'],
+                        apiserver='a'),
+            ReleaseSpec('other', 'charts/other', apiserver='a'),
+        ]
+        with mock.patch('helm_sdk.Helm.upgrade', autospec=True,
+                        side_effect=self.fake_command(fail=['db'])):
+            results = self.helm.batch(specs).run('upgrade')
+        self.assertEqual(
+            dict((name, result.status) for name, result in results.items()),
+            {'db': 'failed', 'app': 'skipped', 'web': 'skipped',
+             'other': 'succeeded'})
+        self.assertNotIn('app', self.order)
+
+    def test_cluster_limit(self):
+        specs = [ReleaseSpec('a{0}'.format(i), 'chart', apiserver='a')
+                 for i in range(6)]
+        specs += [ReleaseSpec('b{0}'.format(i), 'chart', apiserver='b')
+                  for i in range(6)]
+        with mock.patch('helm_sdk.Helm.install', autospec=True,
+                        side_effect=self.fake_command()):
+            results = self.helm.batch(
+                specs, max_workers=4, cluster_limit=2).run('install')
+        self.assertEqual(len(results), 12)
+        self.assertEqual(self.max_running, {'a': 2, 'b': 2})
+
+    def test_invalid_dependencies(self):
+        batch = self.helm.batch([ReleaseSpec('a', depends_on=['b']),
+                                 ReleaseSpec('b', depends_on=['a'])])
+        self.assertRaisesRegex(CloudifyHelmSDKError, 'Circular',
+                               batch.run, 'status')
+        batch = self.helm.batch([ReleaseSpec('a', depends_on=['c'])])
+        self.assertRaisesRegex(CloudifyHelmSDKError, 'not in the batch',
+                               batch.run, 'status')
+        self.assertRaises(CloudifyHelmSDKError, batch.add, ReleaseSpec('a'))
+        self.assertRaises(CloudifyHelmSDKError, batch.run, 'rollback')
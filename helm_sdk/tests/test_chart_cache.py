@@ -0,0 +1,206 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import mock
+import yaml
+import shutil
+import hashlib
+import logging
+import tempfile
+import unittest
+
+from helm_sdk import Helm
+from helm_sdk.repository import url_repo_name
+from helm_sdk.chart_cache import ChartCache, chart_key, archive_flags
+from helm_sdk.exceptions import CloudifyHelmSDKError
+
+ARCHIVE = b'chart archive content'
+DIGEST = hashlib.sha256(ARCHIVE).hexdigest()
+
+
+class ChartCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        super(ChartCacheTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.cache = ChartCache(os.path.join(self.temp_dir, 'cache'))
+
+    def archive(self, name, content=ARCHIVE):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'wb') as archive:
+            archive.write(content)
+        return path
+
+    def test_put_get(self):
+        key = chart_key('https://charts.example.com/', 'nginx', '1.0.0')
+        self.assertEqual(
+            key, chart_key('https://charts.example.com', 'nginx', '1.0.0'))
+        self.assertIsNone(self.cache.get(key))
+        path = self.cache.put(key, self.archive('nginx-1.0.0.tgz'), DIGEST)
+        self.assertEqual(os.path.basename(path), DIGEST + '.tgz')
+        self.assertEqual(self.cache.get(key), path)
+        with open(path, 'wb') as archive:
+            archive.write(b'truncated')
+        self.assertIsNone(self.cache.get(key))
+
+    def test_put_verifies_digest(self):
+        self.assertRaises(CloudifyHelmSDKError, self.cache.put, 'key',
+                          self.archive('bad.tgz'), 'sha256:' + '0' * 64)
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+    def test_lru_eviction(self):
+        self.cache.max_bytes = 2 * (len(ARCHIVE) + 1)
+        for name in ['a', 'b']:
+            self.cache.put(name, self.archive(name, ARCHIVE + name.encode()))
+        path_a = self.cache.get('a')
+        os.utime(path_a, (1, 1))
+        self.cache.get('b')
+        self.cache.put('c', self.archive('c', ARCHIVE + b'c'))
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+
+class CachedChartTest(unittest.TestCase):
+
+    def setUp(self):
+        super(CachedChartTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        config_home = os.path.join(self.temp_dir, 'config')
+        cache_home = os.path.join(self.temp_dir, 'cache')
+        os.makedirs(config_home)
+        os.makedirs(os.path.join(cache_home, 'repository'))
+        with open(os.path.join(config_home, 'repositories.yaml'), 'w') as f:
+            yaml.safe_dump({'repositories': [
+                {'name': 'example', 'url': 'https://charts.example.com'}]}, f)
+        with open(os.path.join(cache_home, 'repository',
+                               'example-index.yaml'), 'w') as f:
+            yaml.safe_dump({'apiVersion': 'v1', 'entries': {'nginx': [
+                {'name': 'nginx', 'version': '1.0.0', 'digest': DIGEST},
+                {'name': 'nginx', 'version': '1.1.0', 'digest': DIGEST},
+            ]}}, f)
+        self.helm = Helm(logging.getLogger('helm_log'), '/tmp/helm',
+                         {'HELM_CONFIG_HOME': config_home,
+                          'HELM_CACHE_HOME': cache_home})
+        self.cache = ChartCache(os.path.join(self.temp_dir, 'charts'))
+
+    def fake_pull(self, chart, flags=None, **_):
+        flags = dict((flag['name'], flag['value']) for flag in flags)
+        with open(os.path.join(flags['destination'], 'nginx-{0}.tgz'.format(
+                flags['version'])), 'wb') as archive:
+            archive.write(ARCHIVE)
+
+    def test_cached_chart(self):
+        with mock.patch.object(self.helm, 'pull',
+                               side_effect=self.fake_pull) as pull:
+            path = self.helm.cached_chart(
+                'example/nginx', [{'name': 'version', 'value': '~1.0'}],
+                cache=self.cache)
+            self.assertEqual(
+                self.helm.cached_chart(
+                    'example/nginx', [{'name': 'version', 'value': '1.0.0'}],
+                    cache=self.cache), path)
+            pull.assert_called_once()
+            self.assertEqual(pull.call_args[1]['flags'][0],
+                             {'name': 'version', 'value': '1.0.0'})
+            self.assertNotEqual(
+                self.helm.cached_chart('example/nginx', cache=self.cache),
+                None)
+            self.assertEqual(pull.call_count, 2)
+        self.assertIsNone(self.helm.cached_chart('other/nginx'))
+        self.assertIsNone(self.helm.cached_chart(
+            'example/nginx', [{'name': 'verify'}]))
+
+    def test_resolve_chart(self):
+        repo_url, entry = self.helm.resolve_chart('example/nginx')
+        self.assertEqual(repo_url, 'https://charts.example.com')
+        self.assertEqual(entry['version'], '1.1.0')
+        self.assertEqual(self.helm.resolve_chart(
+            'example/nginx', [{'name': 'version', 'value': '~1.0'}])[1][
+                'version'], '1.0.0')
+        self.assertIsNone(self.helm.resolve_chart('other/nginx'))
+        self.assertIsNone(self.helm.resolve_chart(self.temp_dir))
+
+    def test_cached_chart_repo_flag(self):
+        url_index = os.path.join(
+            self.temp_dir, 'cache', 'repository',
+            url_repo_name('https://charts.example.com') + '-index.yaml')
+        shutil.copy(os.path.join(self.temp_dir, 'cache', 'repository',
+                                 'example-index.yaml'), url_index)
+        with mock.patch.object(self.helm, 'pull',
+                               side_effect=self.fake_pull) as pull, \
+                mock.patch.object(self.helm, 'refresh_repo_index') as refresh:
+            path = self.helm.cached_chart(
+                'nginx', [{'name': 'repo',
+                           'value': 'https://charts.example.com'}],
+                cache=self.cache)
+            refresh.assert_called_once()
+            self.assertEqual(pull.call_args[1]['flags'][:2], [
+                {'name': 'repo', 'value': 'https://charts.example.com'},
+                {'name': 'version', 'value': '1.1.0'}])
+            # Same cache entry as the repository added by name.
+            self.assertEqual(
+                self.helm.cached_chart('example/nginx', cache=self.cache),
+                path)
+            pull.assert_called_once()
+
+    def test_install_cached_chart_repo_flag(self):
+        url_index = os.path.join(
+            self.temp_dir, 'cache', 'repository',
+            url_repo_name('https://charts.example.com') + '-index.yaml')
+        shutil.copy(os.path.join(self.temp_dir, 'cache', 'repository',
+                                 'example-index.yaml'), url_index)
+        flags = [{'name': 'repo', 'value': 'https://charts.example.com'},
+                 {'name': 'version', 'value': '1.0.0'},
+                 {'name': 'namespace', 'value': 'web'}]
+        with mock.patch.object(self.helm, 'pull',
+                               side_effect=self.fake_pull), \
+                mock.patch.object(self.helm, 'refresh_repo_index'):
+            path = self.helm.cached_chart('nginx', flags, cache=self.cache)
+        self.assertTrue(os.path.isabs(path))
+        with mock.patch.object(self.helm, 'execute',
+                               return_value='{}') as execute:
+            self.helm.install('release1', path, archive_flags(flags),
+                              kubeconfig='/path/to/config')
+        execute.assert_any_call(
+            ['/tmp/helm', 'install', 'release1', path, '--wait',
+             '--output=json', '--kubeconfig=/path/to/config',
+             '--namespace=web'],
+            additional_args=None,
+            return_output=True)
+
+    def test_prefetch(self):
+        charts = [{'chart': 'nginx', 'repo_url': 'https://charts.example.com'},
+                  {'chart': 'missing', 'repo_url': 'https://example.com'}]
+        with mock.patch('helm_sdk.Helm.cached_chart',
+                        side_effect=['/tmp/nginx.tgz', None]), \
+                mock.patch('helm_sdk.Helm.compile_flags') as compile_flags, \
+                mock.patch('helm_sdk.Helm.get_helm_version',
+                           return_value='3.12.0'):
+            results = self.helm.prefetch(charts, max_workers=1)
+        self.assertEqual(sorted(results), [
+            'chart https://charts.example.com nginx',
+            'chart https://example.com missing',
+            'flags pull', 'flags status', 'version'])
+        self.assertEqual(
+            results['chart https://charts.example.com nginx']['status'],
+            'succeeded')
+        self.assertIn(
+            'not found',
+            results['chart https://example.com missing']['error'])
+        self.assertEqual(compile_flags.call_count, 2)
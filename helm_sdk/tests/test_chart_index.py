@@ -0,0 +1,128 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import mock
+import shutil
+import tempfile
+import unittest
+
+from helm_sdk import chart_index
+from helm_sdk.semver import Constraint
+from helm_sdk.exceptions import CloudifyHelmSDKError
+
+INDEX = """apiVersion: v1
+entries:
+  mariadb:
+  - name: mariadb
+    version: 11.0.0
+    appVersion: "10.11.2"
+    digest: aaa
+    urls:
+    - https://charts.example.com/mariadb-11.0.0.tgz
+  - name: mariadb
+    version: 11.1.0-rc.1
+    digest: bbb
+  - name: mariadb
+    version: 10.5.1
+    digest: ccc
+  - name: mariadb
+    version: 9.8.0
+    digest: ddd
+    description: "url: https://example.com: with colons"
+  nginx:
+  - name: nginx
+    version: 15.0.0
+    digest: eee
+"""
+
+
+class ConstraintTest(unittest.TestCase):
+
+    def assertMatches(self, constraint, matching, not_matching):
+        for version in matching:
+            self.assertTrue(Constraint(constraint).matches(version),
+                            '{0} {1}'.format(constraint, version))
+        for version in not_matching:
+            self.assertFalse(Constraint(constraint).matches(version),
+                             '{0} {1}'.format(constraint, version))
+
+    def test_constraints(self):
+        self.assertMatches('', ['1.0.0', '0.0.1'], ['1.0.0-rc.1', 'abc'])
+        self.assertMatches('1.2.3', ['1.2.3', 'v1.2.3'], ['1.2.4'])
+        self.assertMatches('1.2.x', ['1.2.0', '1.2.9'], ['1.3.0', '1.1.9'])
+        self.assertMatches('~1.2.3', ['1.2.3', '1.2.9'], ['1.3.0', '1.2.2'])
+        self.assertMatches('^1.2.3', ['1.2.3', '1.9.0'], ['2.0.0', '1.2.2'])
+        self.assertMatches('^0.2.3', ['0.2.9'], ['0.3.0'])
+        self.assertMatches('>= 1.2, < 2', ['1.2.0', '1.9.9'], ['2.0.0'])
+        self.assertMatches('>1.2 <=1.4', ['1.3.0', '1.4.9'],
+                           ['1.2.9', '1.5.0'])
+        self.assertMatches('1.2 - 1.4', ['1.2.0', '1.4.5'], ['1.5.0'])
+        self.assertMatches('^1 || ^3', ['1.5.0', '3.0.0'], ['2.0.0'])
+        self.assertMatches('!=1.2.x', ['1.3.0'], ['1.2.5'])
+        self.assertMatches('>=1.0.0-0', ['1.1.0-rc.1', '1.0.0'], [])
+        self.assertRaises(CloudifyHelmSDKError, Constraint, '>=one')
+
+
+class ChartIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        super(ChartIndexTest, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.index_path = os.path.join(self.cache_dir, 'example-index.yaml')
+        with open(self.index_path, 'w') as index_file:
+            index_file.write(INDEX)
+        chart_index._indexes.clear()
+
+    def test_lookups(self):
+        index = chart_index.open_index(self.index_path)
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.cache_dir, 'example-index.db')))
+        self.assertEqual(index.names(), ['mariadb', 'nginx'])
+        self.assertEqual(index.get('mariadb')['version'], '11.0.0')
+        self.assertEqual(index.get('mariadb', '10.5.1')['digest'], 'ccc')
+        self.assertEqual(index.get('mariadb', '~10')['version'], '10.5.1')
+        self.assertEqual(index.resolve('mariadb', '>=11.1.0-0'),
+                         '11.1.0-rc.1')
+        self.assertIsNone(index.get('mariadb', '^12'))
+        self.assertIsNone(index.get('missing'))
+        self.assertEqual(index.by_digest('sha256:aaa')['urls'],
+                         ['https://charts.example.com/mariadb-11.0.0.tgz'])
+        self.assertEqual(index.get('mariadb', '9.8.0')['description'],
+                         'url: https://example.com: with colons')
+
+    def test_built_once_per_index_change(self):
+        with mock.patch.object(chart_index, 'build',
+                               wraps=chart_index.build) as build:
+            index = chart_index.open_index(self.index_path)
+            self.assertIs(chart_index.open_index(self.index_path), index)
+            # Another process reuses the table on disk.
+            chart_index._indexes.clear()
+            chart_index.open_index(self.index_path)
+            self.assertEqual(build.call_count, 1)
+            with open(self.index_path, 'a') as index_file:
+                index_file.write('  redis:\n  - name: redis\n'
+                                 '    version: 1.0.0\n')
+            stat = os.stat(self.index_path)
+            os.utime(self.index_path,
+                     ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            index = chart_index.open_index(self.index_path)
+            self.assertEqual(build.call_count, 2)
+        self.assertEqual(index.get('redis')['version'], '1.0.0')
+
+    def test_missing_index(self):
+        self.assertRaises(CloudifyHelmSDKError, chart_index.open_index,
+                          os.path.join(self.cache_dir, 'other-index.yaml'))
@@ -0,0 +1,126 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import mock
+import shutil
+import logging
+import tempfile
+import unittest
+
+from helm_sdk import Helm
+from helm_sdk.retry import RetryPolicy
+from helm_sdk.exceptions import CloudifyHelmSDKError
+from helm_sdk.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    is_connection_error)
+
+APISERVER = 'https://1.0.0.0:6443'
+
+
+class ProcessError(Exception):
+
+    def __init__(self, stderr):
+        super(ProcessError, self).__init__('command failed')
+        self.stderr = stderr
+
+
+UNREACHABLE = ProcessError(
+    'Error: Kubernetes cluster unreachable: Get "https://1.0.0.0:6443/'
+    'version": dial tcp 1.0.0.0:6443: connect: connection refused')
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        super(CircuitBreakerTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.clock = Clock()
+        self.breaker = CircuitBreaker(
+            APISERVER, directory=self.temp_dir, clock=self.clock)
+
+    def call_unreachable(self, breaker=None):
+        with self.assertRaises(ProcessError):
+            with breaker or self.breaker:
+                raise UNREACHABLE
+
+    def test_is_connection_error(self):
+        self.assertTrue(is_connection_error(UNREACHABLE))
+        self.assertTrue(is_connection_error(ConnectionRefusedError()))
+        self.assertFalse(is_connection_error(
+            ProcessError('Error: release: not found')))
+
+    def test_opens_after_threshold(self):
+        self.call_unreachable()
+        self.call_unreachable()
+        self.assertEqual(self.breaker.state(), 'closed')
+        self.call_unreachable()
+        self.assertEqual(self.breaker.state(), 'open')
+        with self.assertRaises(CircuitOpenError):
+            with self.breaker:
+                pass
+        # The state is shared by the breakers of the endpoint.
+        other = CircuitBreaker(
+            APISERVER, directory=self.temp_dir, clock=self.clock)
+        self.assertEqual(other.state(), 'open')
+
+    def test_other_errors_close(self):
+        self.call_unreachable()
+        self.call_unreachable()
+        with self.assertRaises(CloudifyHelmSDKError):
+            with self.breaker:
+                raise CloudifyHelmSDKError('release: not found')
+        self.call_unreachable()
+        self.assertEqual(self.breaker.state(), 'closed')
+
+    def test_half_open_probe(self):
+        for _ in range(3):
+            self.call_unreachable()
+        self.clock.now += 31
+        self.assertEqual(self.breaker.state(), 'half-open')
+        self.breaker.before_call()
+        # One probe at a time.
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state(), 'open')
+        self.clock.now += 31
+        with self.breaker:
+            pass
+        self.assertEqual(self.breaker.state(), 'closed')
+
+    @mock.patch('helm_sdk.Helm.execute')
+    def test_helm_fails_fast(self, execute):
+        execute.side_effect = UNREACHABLE
+        helm = Helm(logging.getLogger('helm_log'), '/tmp/helm', {},
+                    retry_policy=RetryPolicy(attempts=1))
+        with mock.patch('helm_sdk.circuit_breaker.CIRCUITS_DIR',
+                        self.temp_dir):
+            for _ in range(3):
+                with self.assertRaises(ProcessError):
+                    helm.status('release', token='abc', apiserver=APISERVER)
+            with self.assertRaises(CircuitOpenError):
+                helm.status('release', token='abc', apiserver=APISERVER)
+        self.assertEqual(execute.call_count, 3)
@@ -0,0 +1,102 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import mock
+import logging
+import unittest
+
+from helm_sdk import Helm
+from helm_sdk.kubernetes import Kubernetes
+from helm_sdk.deadline import Deadline, DeadlineExceeded
+
+RESOURCE = {'apiVersion': 'example.com/v1',
+            'kind': 'Widget',
+            'metadata': {'name': 'widget'}}
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class DeadlineTest(unittest.TestCase):
+
+    def setUp(self):
+        super(DeadlineTest, self).setUp()
+        self.clock = Clock()
+        self.deadline = Deadline(100, clock=self.clock)
+        self.helm = Helm(logging.getLogger('helm_log'), '/tmp/helm', {},
+                         deadline=self.deadline)
+
+    def test_timeout(self):
+        self.assertEqual(self.deadline.timeout('step'), 100)
+        self.assertEqual(self.deadline.timeout('step', 30), 30)
+        self.clock.now += 80.5
+        self.assertEqual(self.deadline.timeout('step', 30), 20)
+        self.clock.now += 20
+        with self.assertRaisesRegex(DeadlineExceeded, 'before step'):
+            self.deadline.timeout('step', 30)
+
+    @mock.patch('helm_sdk.run_subprocess')
+    def test_execute_gets_remaining_time(self, run_subprocess):
+        self.clock.now += 40
+        additional_args = {'max_sleep_time': 300}
+        self.helm.execute(['/tmp/helm', 'status', 'release'],
+                          additional_args=additional_args)
+        self.assertEqual(
+            run_subprocess.call_args[1]['additional_args'],
+            {'max_sleep_time': 60})
+        # The arguments are shared by the commands of the operation.
+        self.assertEqual(additional_args, {'max_sleep_time': 300})
+        self.clock.now += 60
+        with self.assertRaises(DeadlineExceeded):
+            self.helm.execute(['/tmp/helm', 'status', 'release'])
+        self.assertEqual(run_subprocess.call_count, 1)
+
+    @mock.patch('helm_sdk.Helm.execute')
+    def test_install_waits_for_remaining_time(self, execute):
+        execute.return_value = '{}'
+        self.clock.now += 40
+        self.helm.install('release', 'example/chart', token='abc',
+                          apiserver='https://1.0.0.0')
+        self.assertIn('--timeout=50s', execute.call_args[0][0])
+        self.helm.install('release', 'example/chart',
+                          flags=[{'name': 'timeout', 'value': '10m'}],
+                          token='abc', apiserver='https://1.0.0.0')
+        command = execute.call_args[0][0]
+        self.assertIn('--timeout=10m', command)
+        self.assertNotIn('--timeout=50s', command)
+
+    def test_kubernetes_reads_until_deadline(self):
+        kubernetes = Kubernetes(mock.Mock(), 'https://k8s', 'token', None,
+                                deadline=self.deadline)
+        kubernetes._kubeconfig_obj = mock.Mock()
+        kubernetes._discovery = mock.Mock()
+        kubernetes._discovery.resource_path.return_value = \
+            '/apis/example.com/v1/widgets/widget'
+        kubernetes._discovery.resource.return_value = {
+            'name': 'widgets', 'namespaced': True}
+        kubernetes._discovery.get.return_value = {}
+        kubernetes.read_dynamic(RESOURCE, 'default')
+        kubernetes._discovery.get.assert_called_once_with(
+            '/apis/example.com/v1/widgets/widget', _request_timeout=100)
+        self.clock.now += 100
+        with mock.patch('helm_sdk.kubernetes.client_resolver'):
+            with self.assertRaises(DeadlineExceeded):
+                kubernetes.status(RESOURCE, 'default')
@@ -0,0 +1,106 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import mock
+import shutil
+import tempfile
+import unittest
+
+from helm_sdk import discovery
+from helm_sdk.discovery import Discovery
+from helm_sdk.kubernetes import Kubernetes
+
+RESPONSES = {
+    '/api': {'versions': ['v1']},
+    '/apis': {'groups': [
+        {'name': 'example.com', 'versions': [
+            {'groupVersion': 'example.com/v1'}]}]},
+    '/api/v1': {'resources': [
+        {'name': 'services', 'kind': 'Service', 'namespaced': True},
+        {'name': 'services/status', 'kind': 'Service', 'namespaced': True},
+        {'name': 'namespaces', 'kind': 'Namespace', 'namespaced': False}]},
+    '/apis/example.com/v1': {'resources': [
+        {'name': 'widgets', 'kind': 'Widget', 'namespaced': True}]},
+}
+
+
+class DiscoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        super(DiscoveryTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.responses = dict(RESPONSES)
+        self.api_client = mock.Mock()
+        self.api_client.configuration.host = 'https://k8s:6443'
+        self.api_client.call_api.side_effect = \
+            lambda path, *_, **__: self.responses[path]
+
+    def paths(self):
+        return [call[0][0] for call in self.api_client.call_api.call_args_list]
+
+    def test_resource_cached_on_disk(self):
+        first = Discovery(self.api_client, directory=self.directory)
+        self.assertEqual(first.resource('v1', 'Service'),
+                         {'name': 'services', 'namespaced': True})
+        self.assertEqual(first.resource('v1', 'Namespace')['namespaced'],
+                         False)
+        self.assertEqual(self.paths(), ['/api', '/apis', '/api/v1'])
+        # Another operation on the same cluster reads the cache file.
+        second = Discovery(self.api_client, directory=self.directory)
+        self.assertEqual(
+            second.resource_path('example.com/v1', 'Widget', 'w', 'ns'),
+            '/apis/example.com/v1/namespaces/ns/widgets/w')
+        self.assertEqual(
+            second.resource_path('v1', 'Namespace', 'ns'),
+            '/api/v1/namespaces/ns')
+        self.assertEqual(self.paths(), ['/api', '/apis', '/api/v1',
+                                        '/apis/example.com/v1'])
+
+    def test_expired_cache(self):
+        Discovery(self.api_client, directory=self.directory).resource(
+            'v1', 'Service')
+        Discovery(self.api_client, ttl=0, directory=self.directory).resource(
+            'v1', 'Service')
+        self.assertEqual(self.paths().count('/api'), 2)
+
+    def test_missing_kind_refreshes_old_cache(self):
+        cache = Discovery(self.api_client, directory=self.directory)
+        self.assertIsNone(cache.resource('other.com/v1', 'Gadget'))
+        self.assertEqual(self.paths().count('/apis'), 1)
+        self.responses['/apis'] = {'groups': [
+            {'name': 'other.com', 'versions': [
+                {'groupVersion': 'other.com/v1'}]}]}
+        self.responses['/apis/other.com/v1'] = {'resources': [
+            {'name': 'gadgets', 'kind': 'Gadget', 'namespaced': True}]}
+        with mock.patch.object(discovery, 'MISS_REFRESH_AGE', 0):
+            self.assertEqual(cache.resource('other.com/v1', 'Gadget'),
+                             {'name': 'gadgets', 'namespaced': True})
+
+    def test_kubernetes_reads_custom_resources(self):
+        kubernetes = Kubernetes(mock.Mock(), 'https://k8s', 'token', None)
+        kubernetes._kubeconfig_obj = self.api_client
+        kubernetes._discovery = Discovery(
+            self.api_client, directory=self.directory)
+        self.responses['/apis/example.com/v1/namespaces/ns/widgets/w'] = {
+            'kind': 'Widget', 'metadata': {'name': 'w'}}
+        self.assertEqual(
+            kubernetes.get_callable(
+                {'apiVersion': 'example.com/v1', 'kind': 'Widget',
+                 'metadata': {'name': 'w'}}, 'ns'),
+            {'kind': 'Widget', 'metadata': {'name': 'w'}})
+        self.assertIsNone(kubernetes.get_callable(
+            {'apiVersion': 'missing.com/v1', 'kind': 'Widget',
+             'metadata': {'name': 'w'}}, 'ns'))
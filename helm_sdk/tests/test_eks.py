@@ -0,0 +1,134 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import hmac
+import base64
+import hashlib
+import unittest
+from datetime import datetime
+
+from helm_sdk.exceptions import CloudifyHelmSDKError
+from helm_sdk.eks import (
+    get_eks_token,
+    string_to_sign,
+    get_signing_key,
+    canonical_request,
+    parse_get_token_args)
+
+SECRET_KEY = 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY'
+ACCESS_KEY = 'AKIDEXAMPLE'
+SIGNING_TIME = datetime(2024, 1, 2, 3, 4, 5)
+# Reference values generated with botocore's presigner for the same inputs.
+EXPECTED_SIGNATURE = \
+    'dc75182c385919b71359c625612c1f91688cf9179c7d2983895a1d36e78f04d5'
+EXPECTED_SESSION_SIGNATURE = \
+    '6ae4eba01d075a720a8d5eaa7cfa8215e549130bbb1ce1d3a93ed873eb3dc90e'
+
+
+def decode_token(token):
+    encoded = token[len('k8s-aws-v1.'):]
+    encoded += '=' * (-len(encoded) % 4)
+    return base64.urlsafe_b64decode(encoded).decode('utf-8')
+
+
+class TestEKS(unittest.TestCase):
+
+    def test_get_signing_key(self):
+        # AWS documentation signing key derivation examples.
+        self.assertEqual(
+            get_signing_key(SECRET_KEY, '20120215', 'us-east-1', 'iam').hex(),
+            'f4780e2d9f65fa895f9c67b32ce1baf0'
+            'b0d8a43505a000a1a9e090d414db404d')
+        self.assertEqual(
+            get_signing_key(SECRET_KEY, '20150830', 'us-east-1', 'iam').hex(),
+            'c4afb1cc5771d871763a393e44b70357'
+            '1b55cc28424d1a5e86da6ed3c154a4b9')
+
+    def test_signature_test_vector(self):
+        # AWS documentation IAM ListUsers signature example.
+        request = canonical_request(
+            'GET',
+            '/',
+            'Action=ListUsers&Version=2010-05-08',
+            {'Content-Type':
+                'application/x-www-form-urlencoded; charset=utf-8',
+             'Host': 'iam.amazonaws.com',
+             'X-Amz-Date': '20150830T123600Z'},
+            'e3b0c44298fc1c149afbf4c8996fb924'
+            '27ae41e4649b934ca495991b7852b855')
+        to_sign = string_to_sign('20150830T123600Z',
+                                 '20150830/us-east-1/iam/aws4_request',
+                                 request)
+        self.assertTrue(to_sign.endswith(
+            'f536975d06c0309214f805bb90ccff08'
+            '9219ecd68b2577efef23edd43b7e1a59'))
+        signature = hmac.new(
+            get_signing_key(SECRET_KEY, '20150830', 'us-east-1', 'iam'),
+            to_sign.encode('utf-8'),
+            hashlib.sha256).hexdigest()
+        self.assertEqual(
+            signature,
+            '5d672d79c15b13162d9279b0855cfba6'
+            '789a8edb4c82c400e06b5924a6f2b5d7')
+
+    def test_get_eks_token(self):
+        token, expiration = get_eks_token(
+            'my-cluster', 'eu-west-1', ACCESS_KEY, SECRET_KEY,
+            now=SIGNING_TIME)
+        self.assertTrue(token.startswith('k8s-aws-v1.'))
+        self.assertNotIn('=', token)
+        self.assertEqual(expiration, datetime(2024, 1, 2, 3, 18, 5))
+        self.assertEqual(
+            decode_token(token),
+            'https://sts.eu-west-1.amazonaws.com/'
+            '?Action=GetCallerIdentity&Version=2011-06-15'
+            '&X-Amz-Algorithm=AWS4-HMAC-SHA256'
+            '&X-Amz-Credential=AKIDEXAMPLE%2F20240102%2Feu-west-1%2Fsts'
+            '%2Faws4_request'
+            '&X-Amz-Date=20240102T030405Z'
+            '&X-Amz-Expires=60'
+            '&X-Amz-SignedHeaders=host%3Bx-k8s-aws-id'
+            '&X-Amz-Signature=' + EXPECTED_SIGNATURE)
+
+    def test_get_eks_token_session_token(self):
+        token, _ = get_eks_token(
+            'my-cluster', 'eu-west-1', ACCESS_KEY, SECRET_KEY,
+            session_token='SESSIONTOKEN/EXAMPLE+=',
+            now=SIGNING_TIME)
+        url = decode_token(token)
+        self.assertIn(
+            '&X-Amz-Security-Token=SESSIONTOKEN%2FEXAMPLE%2B%3D', url)
+        self.assertTrue(url.endswith(
+            '&X-Amz-Signature=' + EXPECTED_SESSION_SIGNATURE))
+
+    def test_get_eks_token_missing_credentials(self):
+        with self.assertRaisesRegex(CloudifyHelmSDKError,
+                                    'are required'):
+            get_eks_token('my-cluster', 'eu-west-1', ACCESS_KEY, '')
+
+    def test_parse_get_token_args(self):
+        self.assertEqual(
+            parse_get_token_args(['eks', 'get-token',
+                                  '--cluster-name', 'demo',
+                                  '--region=us-west-2']),
+            {'cluster_name': 'demo',
+             'region': 'us-west-2',
+             'role_arn': None})
+        self.assertEqual(
+            parse_get_token_args(['--region', 'us-west-2', 'eks',
+                                  'get-token', '--cluster-name', 'demo',
+                                  '--role-arn', 'arn:aws:iam::1:role/x'])[
+                'role_arn'],
+            'arn:aws:iam::1:role/x')
@@ -0,0 +1,143 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import mock
+import shutil
+import tempfile
+import unittest
+
+from helm_sdk import flags
+from helm_sdk.exceptions import CloudifyHelmSDKError
+
+STATUS_HELP = """
+This command shows the status of a named release.
+
+Usage:
+  helm status RELEASE_NAME [flags]
+
+Flags:
+  -h, --help             help for status
+  -o, --output format    prints the output in the specified format.
+      --revision int     if set, display the status of the named release
+      --show-desc        if set, display the description message
+
+Global Flags:
+      --debug                      enable verbose output
+      --kube-apiserver string      the address and the port for the API
+      --kubeconfig string          path to the kubeconfig file
+  -n, --namespace string           namespace scope for this request
+"""
+
+
+class FlagsTest(unittest.TestCase):
+
+    def setUp(self):
+        super(FlagsTest, self).setUp()
+        self.schema_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.schema_dir)
+        patcher = mock.patch.object(
+            flags, 'FLAGS_SCHEMA_DIR', self.schema_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        flags._schemas.clear()
+        flags._compiled.clear()
+
+    def test_parse_help(self):
+        self.assertEqual(
+            flags.parse_help(STATUS_HELP),
+            frozenset(['help', 'output', 'revision', 'show-desc', 'debug',
+                       'kube-apiserver', 'kubeconfig', 'namespace']))
+        self.assertEqual(flags.parse_help('{"name": "x"}'), frozenset())
+
+    def test_get_schema_probed_once_per_binary(self):
+        with tempfile.NamedTemporaryFile() as binary:
+            probe = mock.Mock(return_value=STATUS_HELP)
+            schema = flags.get_schema(binary.name, 'status', probe)
+            self.assertIn('revision', schema)
+            self.assertEqual(
+                flags.get_schema(binary.name, 'status', probe), schema)
+            # Another operation process reads the persisted schema.
+            flags._schemas.clear()
+            self.assertEqual(
+                flags.get_schema(binary.name, 'status', probe), schema)
+            probe.assert_called_once()
+
+    def test_get_schema_default(self):
+        default = frozenset(['debug'])
+        self.assertEqual(
+            flags.get_schema('/does/not/exist', 'status', mock.Mock(),
+                             default), default)
+        with tempfile.NamedTemporaryFile() as binary:
+            self.assertEqual(
+                flags.get_schema(binary.name, 'status',
+                                 mock.Mock(return_value=''), default),
+                default)
+
+    def test_get_version_probed_once_per_binary(self):
+        with tempfile.NamedTemporaryFile() as binary:
+            probe = mock.Mock(return_value='3.12.0')
+            self.assertEqual(flags.get_version(binary.name, probe), '3.12.0')
+            flags._schemas.clear()
+            self.assertEqual(flags.get_version(binary.name, probe), '3.12.0')
+            probe.assert_called_once()
+            # The version does not hide the flag schemas of the binary.
+            self.assertIn('revision', flags.get_schema(
+                binary.name, 'status', mock.Mock(return_value=STATUS_HELP)))
+
+    def test_probe_runs_without_lock(self):
+        with tempfile.NamedTemporaryFile() as binary:
+            # Probes that use the module, e.g. compiling the flags of the
+            # probe command, would deadlock under the lock.
+            def version_probe():
+                flags.compile_flags([{'name': 'short'}])
+                return '3.12.0'
+
+            def help_probe():
+                flags.get_version(binary.name, version_probe)
+                return STATUS_HELP
+
+            self.assertIn('revision', flags.get_schema(
+                binary.name, 'status', help_probe))
+            self.assertEqual(
+                flags.get_version(binary.name, mock.Mock()), '3.12.0')
+
+    def test_compile_flags(self):
+        compiled = flags.compile_flags(
+            [{'name': 'namespace', 'value': 'ns'},
+             {'name': 'wait'},
+             {'name': 'namespace', 'value': 'ns'},
+             {'name': 'timeout', 'value': '100'}],
+            schema=frozenset(['namespace', 'timeout']))
+        self.assertEqual(compiled.argv, ('--namespace=ns', '--timeout=100'))
+        self.assertEqual(compiled.names, frozenset(['namespace', 'timeout']))
+        # Compiled flags are reused.
+        self.assertIs(
+            flags.compile_flags(
+                [{'name': 'namespace', 'value': 'ns'},
+                 {'name': 'wait'},
+                 {'name': 'namespace', 'value': 'ns'},
+                 {'name': 'timeout', 'value': '100'}],
+                schema=frozenset(['namespace', 'timeout'])),
+            compiled)
+        self.assertIs(flags.compile_flags(compiled), compiled)
+
+    def test_compile_flags_reserved(self):
+        with self.assertRaisesRegex(CloudifyHelmSDKError,
+                                    'Please do not pass'):
+            flags.compile_flags([{'name': 'kubeconfig', 'value': 'x'}],
+                                reserved=['kubeconfig'])
+        compiled = flags.compile_flags([{'name': 'kubeconfig'}])
+        self.assertRaises(CloudifyHelmSDKError, flags.compile_flags,
+                          compiled, reserved=['kubeconfig'])
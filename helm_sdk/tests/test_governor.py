@@ -0,0 +1,81 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import mock
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+
+from helm_sdk.deadline import DeadlineExceeded
+from helm_sdk.governor import Governor, QUEUE_DIR
+
+
+class GovernorTest(unittest.TestCase):
+
+    def setUp(self):
+        super(GovernorTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.governor = Governor({'heavy': 1, 'light': 2},
+                                 directory=self.temp_dir,
+                                 poll_interval=0.01)
+
+    def queued(self, count):
+        queue = os.path.join(self.temp_dir, 'heavy', QUEUE_DIR)
+        while len(os.listdir(queue)) < count:
+            time.sleep(0.01)
+
+    def test_limit_per_class(self):
+        with self.governor.slot('install'):
+            with self.assertRaises(DeadlineExceeded):
+                with self.governor.slot('upgrade', timeout=0.05):
+                    pass
+            with self.governor.slot('status'):
+                with self.governor.slot('list'):
+                    pass
+        with self.governor.slot('upgrade', timeout=0.05):
+            pass
+
+    def test_fair_queue(self):
+        order = []
+
+        def run(name):
+            with self.governor.slot('install'):
+                order.append(name)
+
+        threads = []
+        with self.governor.slot('install'):
+            for count, name in enumerate(['first', 'second', 'third']):
+                thread = threading.Thread(target=run, args=(name,))
+                thread.start()
+                threads.append(thread)
+                self.queued(count + 1)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ['first', 'second', 'third'])
+
+    def test_dead_waiter_skipped(self):
+        queue = os.path.join(self.temp_dir, 'heavy', QUEUE_DIR)
+        os.makedirs(queue)
+        # Left by a process that died while it waited, nobody locks it.
+        open(os.path.join(queue, '0' * 20), 'w').close()
+        logger = mock.Mock()
+        with self.governor.slot('install', logger, timeout=1):
+            pass
+        self.assertEqual(os.listdir(queue), [])
+        self.assertIn('waited', logger.debug.call_args[0][0])
@@ -0,0 +1,79 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import mock
+import yaml
+import shutil
+import logging
+import tempfile
+import unittest
+
+from helm_sdk import Helm, helm_config
+
+REPOSITORIES = {
+    'apiVersion': '',
+    'repositories': [
+        {'name': 'bitnami', 'url': 'https://charts.bitnami.com/bitnami',
+         'username': '', 'password': ''},
+        {'name': 'private', 'url': 'https://charts.example.com/a:b',
+         'username': 'user', 'password': 'secret'},
+    ],
+}
+
+
+class HelmConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        super(HelmConfigTest, self).setUp()
+        self.config_home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.config_home)
+        self.helm = Helm(logging.getLogger('helm_log'), '/tmp/helm',
+                         {'HELM_CONFIG_HOME': self.config_home})
+        self.helm.execute = mock.Mock(return_value='[]')
+
+    def write_repositories(self, content):
+        with open(os.path.join(self.config_home,
+                               'repositories.yaml'), 'w') as repos:
+            yaml.safe_dump(content, repos)
+
+    def test_repo_list_reads_repositories_file(self):
+        self.write_repositories(REPOSITORIES)
+        with mock.patch.object(helm_config.yaml, 'safe_load',
+                               wraps=yaml.safe_load) as safe_load:
+            self.assertEqual(self.helm.repo_list(), [
+                {'name': 'bitnami',
+                 'url': 'https://charts.bitnami.com/bitnami'},
+                {'name': 'private', 'url': 'https://charts.example.com/a:b'},
+            ])
+            self.assertEqual(self.helm.repo_entry('private')['password'],
+                             'secret')
+            self.assertIsNone(self.helm.repo_entry('missing'))
+            self.assertEqual(safe_load.call_count, 1)
+            content = dict(REPOSITORIES,
+                           repositories=REPOSITORIES['repositories'][:1])
+            self.write_repositories(content)
+            path = os.path.join(self.config_home, 'repositories.yaml')
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            self.assertEqual(len(self.helm.repo_list()), 1)
+            self.assertEqual(safe_load.call_count, 2)
+        self.helm.execute.assert_not_called()
+
+    def test_repo_list_falls_back_to_cli(self):
+        self.assertEqual(self.helm.repo_list(), [])
+        self.helm.execute.assert_any_call(
+            ['/tmp/helm', 'repo', 'list', '--output=json'],
+            return_output=True)
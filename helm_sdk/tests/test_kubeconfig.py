@@ -0,0 +1,174 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import shutil
+import mock
+import yaml
+import base64
+import tempfile
+import unittest
+
+from helm_sdk.kubeconfig import (
+    AUTH_TYPE_EXEC,
+    AUTH_TYPE_TOKEN,
+    KubeconfigRegistry)
+
+mock_kubeconfig = {
+    'apiVersion': 'v1',
+    'kind': 'Config',
+    'current-context': 'eks',
+    'clusters': [
+        {'name': 'other',
+         'cluster': {'server': 'https://other'}},
+        {'name': 'eks-cluster',
+         'cluster': {
+             'server': 'https://eks.example.com',
+             'certificate-authority-data': base64.b64encode(
+                 b'fake ca').decode('utf-8')}}
+    ],
+    'contexts': [
+        {'name': 'other',
+         'context': {'cluster': 'other', 'user': 'static'}},
+        {'name': 'eks',
+         'context': {'cluster': 'eks-cluster', 'user': 'aws'}}
+    ],
+    'users': [
+        {'name': 'static', 'user': {'token': 'abcd'}},
+        {'name': 'aws', 'user': {'exec': {
+            'apiVersion': 'client.authentication.k8s.io/v1beta1',
+            'command': 'aws',
+            'args': ['eks', 'get-token', '--cluster-name', 'demo']}}}
+    ]
+}
+
+
+class TestKubeconfig(unittest.TestCase):
+
+    def setUp(self):
+        super(TestKubeconfig, self).setUp()
+        self.registry = KubeconfigRegistry()
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.yaml', delete=False) as kubeconfig_file:
+            yaml.safe_dump(mock_kubeconfig, kubeconfig_file)
+        self.kubeconfig_path = kubeconfig_file.name
+
+    def tearDown(self):
+        os.remove(self.kubeconfig_path)
+        super(TestKubeconfig, self).tearDown()
+
+    def test_current_context(self):
+        parsed = self.registry.get(mock_kubeconfig)
+        self.assertEqual(parsed.context_name, 'eks')
+        self.assertEqual(parsed.cluster_name, 'eks-cluster')
+        self.assertEqual(parsed.user_name, 'aws')
+        self.assertEqual(parsed.server, 'https://eks.example.com')
+        self.assertEqual(parsed.auth_type, AUTH_TYPE_EXEC)
+        self.assertEqual(parsed.exec_config['command'], 'aws')
+
+    def test_auth_type_token(self):
+        kubeconfig = dict(mock_kubeconfig, **{'current-context': 'other'})
+        parsed = self.registry.get(kubeconfig)
+        self.assertEqual(parsed.auth_type, AUTH_TYPE_TOKEN)
+        self.assertEqual(parsed.server, 'https://other')
+
+    def test_parsed_once_per_content(self):
+        with mock.patch('helm_sdk.kubeconfig.yaml.safe_load',
+                        wraps=yaml.safe_load) as safe_load:
+            first = self.registry.get(self.kubeconfig_path)
+            second = self.registry.get(self.kubeconfig_path)
+            third = self.registry.get(yaml.safe_dump(mock_kubeconfig))
+        # Same content passed as a string is the same kubeconfig.
+        self.assertIs(first, second)
+        self.assertIs(first, third)
+        self.assertEqual(safe_load.call_count, 1)
+
+    def test_reparsed_when_file_changes(self):
+        first = self.registry.get(self.kubeconfig_path)
+        with open(self.kubeconfig_path, 'w') as kubeconfig_file:
+            yaml.safe_dump(
+                dict(mock_kubeconfig, **{'current-context': 'other'}),
+                kubeconfig_file)
+        second = self.registry.get(self.kubeconfig_path)
+        self.assertNotEqual(first.digest, second.digest)
+        self.assertEqual(second.user_name, 'static')
+
+    def test_paths_bounded(self):
+        registry = KubeconfigRegistry(max_paths=2)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        paths = []
+        for index in range(3):
+            path = os.path.join(directory, '{0}.yaml'.format(index))
+            with open(path, 'w') as kubeconfig_file:
+                yaml.safe_dump(mock_kubeconfig, kubeconfig_file)
+            paths.append(path)
+            registry.get(path)
+        self.assertEqual(list(registry._by_path), paths[1:])
+        # All temporary paths of the same content share one kubeconfig.
+        self.assertEqual(len(registry._by_digest), 1)
+
+    def test_path(self):
+        self.assertEqual(
+            self.registry.get(self.kubeconfig_path).path,
+            self.kubeconfig_path)
+        parsed = self.registry.get(mock_kubeconfig)
+        self.assertEqual(parsed.path, parsed.path)
+        self.assertIn(parsed.digest, parsed.path)
+        with open(parsed.path) as kubeconfig_file:
+            self.assertEqual(yaml.safe_load(kubeconfig_file),
+                             mock_kubeconfig)
+
+    def test_path_permissions(self):
+        path = self.registry.get(mock_kubeconfig).path
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        self.assertEqual(
+            os.stat(os.path.dirname(path)).st_mode & 0o777, 0o700)
+
+    def test_kubeconfigs_bounded(self):
+        registry = KubeconfigRegistry(max_kubeconfigs=2)
+        parsed = []
+        paths = []
+        for index in range(3):
+            parsed.append(registry.get(
+                dict(mock_kubeconfig, **{'current-context': str(index)})))
+            paths.append(parsed[-1].path)
+        self.assertEqual(list(registry._by_digest),
+                         [item.digest for item in parsed[1:]])
+        # The file written for the dropped kubeconfig is removed.
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertTrue(os.path.isfile(paths[1]))
+        # Kubeconfig files of the user are never removed.
+        registry.get(self.kubeconfig_path)
+        registry.clear()
+        self.assertTrue(os.path.isfile(self.kubeconfig_path))
+        self.assertFalse(os.path.exists(paths[2]))
+
+    def test_token_configuration_reused(self):
+        parsed = self.registry.get(mock_kubeconfig)
+        configuration = parsed.configuration(token='token1')
+        self.assertIs(configuration, parsed.configuration(token='token1'))
+        self.assertIsNot(configuration, parsed.configuration(token='token2'))
+        self.assertEqual(configuration.host, 'https://eks.example.com')
+        self.assertEqual(configuration.api_key,
+                         {'authorization': 'Bearer token1'})
+        with open(configuration.ssl_ca_cert, 'rb') as ca_file:
+            self.assertEqual(ca_file.read(), b'fake ca')
+        self.assertIs(parsed.api_client(token='token1'),
+                      parsed.api_client(token='token1'))
+        # A refreshed token replaces the configuration of the host.
+        self.assertIsNot(configuration, parsed.configuration(token='token1'))
+        self.assertEqual(len(parsed._configurations), 1)
+        self.assertEqual(len(parsed._api_clients), 1)
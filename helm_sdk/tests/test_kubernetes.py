@@ -0,0 +1,50 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import mock
+import unittest
+
+from helm_sdk.kubernetes import Kubernetes
+
+
+class KubernetesTest(unittest.TestCase):
+
+    def test_multiple_resource_check_status_parallel(self):
+        kubernetes = Kubernetes(mock.Mock(), 'https://k8s', 'token', None)
+        kubernetes._kubeconfig_obj = mock.Mock()
+        helm_status = {
+            'namespace': 'default',
+            'manifest': dict(
+                ('templates/{0}.yaml'.format(name),
+                 {'apiVersion': 'v1', 'kind': 'Service',
+                  'metadata': {'name': name}})
+                for name in ['web-svc', 'db', 'missing']),
+        }
+
+        def check_status(resource, namespace):
+            if resource['metadata']['name'] != 'missing':
+                return {'name': resource['metadata']['name']}
+
+        with mock.patch.object(kubernetes, 'check_status',
+                               side_effect=check_status):
+            status, errors = kubernetes.multiple_resource_check_status(
+                helm_status, max_workers=3)
+        self.assertEqual(status, {
+            'templates_web__svc': {'name': 'web-svc'},
+            'templates_db': {'name': 'db'},
+            'templates_missing': None,
+        })
+        self.assertEqual(len(errors), 1)
+        self.assertIn('missing', errors[0])
@@ -0,0 +1,190 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import io
+import os
+import json
+import mock
+import shutil
+import logging
+import tarfile
+import tempfile
+import threading
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from helm_sdk import Helm
+from helm_sdk.oci import (
+    Registry,
+    chart_metadata,
+    archive_digest,
+    parse_reference,
+    CHART_LAYER_MEDIA_TYPE)
+
+CHART_YAML = b'apiVersion: v2\nname: nginx\nversion: 1.0.0\n'
+
+
+class RegistryHandler(BaseHTTPRequestHandler):
+    # Path of the manifest to layer digest.
+    layers = {}
+    token = None
+    requests = []
+
+    def log_message(self, *_):
+        pass
+
+    def _authorized(self):
+        if not self.token or \
+                self.headers.get('Authorization') == 'Bearer ' + self.token:
+            return True
+        self.send_response(401)
+        self.send_header(
+            'WWW-Authenticate',
+            'Bearer realm="http://{0}/token",service="registry",'
+            'scope="repository:charts/nginx:pull"'.format(
+                self.headers['Host']))
+        self.end_headers()
+        return False
+
+    def _manifest(self):
+        self.requests.append((self.command, self.path))
+        if self.path.startswith('/token'):
+            body = json.dumps({'token': self.token}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            return body
+        if not self._authorized():
+            return
+        if self.path not in self.layers:
+            self.send_error(404)
+            return
+        body = json.dumps({'schemaVersion': 2, 'layers': [
+            {'mediaType': CHART_LAYER_MEDIA_TYPE,
+             'digest': self.layers[self.path]}]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        return body
+
+    def do_HEAD(self):
+        self._manifest()
+
+    def do_GET(self):
+        body = self._manifest()
+        if body:
+            self.wfile.write(body)
+
+
+class OCITest(unittest.TestCase):
+
+    def setUp(self):
+        super(OCITest, self).setUp()
+        RegistryHandler.layers = {}
+        RegistryHandler.token = None
+        RegistryHandler.requests = []
+        self.server = HTTPServer(('127.0.0.1', 0), RegistryHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.host = '127.0.0.1:{0}'.format(self.server.server_port)
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.archive = os.path.join(self.temp_dir, 'nginx-1.0.0.tgz')
+        with tarfile.open(self.archive, 'w:gz') as tar:
+            info = tarfile.TarInfo('nginx/Chart.yaml')
+            info.size = len(CHART_YAML)
+            tar.addfile(info, io.BytesIO(CHART_YAML))
+        self.helm = Helm(logging.getLogger('helm_log'), '/tmp/helm',
+                         {'HELM_CONFIG_HOME': self.temp_dir})
+        self.plain_http = [{'name': 'plain-http'}]
+
+    @staticmethod
+    def commands(execute, command):
+        return [call for call in execute.call_args_list
+                if call[0][0][1:2] == [command]]
+
+    def test_parse_reference(self):
+        self.assertEqual(
+            parse_reference('oci://example.com:5000/charts/nginx'),
+            ('example.com:5000', 'charts/nginx', None))
+        self.assertEqual(parse_reference('oci://example.com/nginx:1.0.0'),
+                         ('example.com', 'nginx', '1.0.0'))
+
+    def test_chart_metadata(self):
+        self.assertEqual(chart_metadata(self.archive)['version'], '1.0.0')
+
+    def test_chart_digest_with_token(self):
+        RegistryHandler.token = 'secret'
+        RegistryHandler.layers['/v2/charts/nginx/manifests/1.0.0_1'] = 'x'
+        registry = Registry(self.host, auth='dXNlcjpwYXNz', plain_http=True)
+        self.assertEqual(registry.chart_digest('charts/nginx', '1.0.0+1'),
+                         'x')
+        self.assertIsNone(registry.chart_digest('charts/nginx', '2.0.0'))
+        self.assertEqual(
+            [request for request in RegistryHandler.requests
+             if request[1].startswith('/token')],
+            [('GET', '/token?service=registry&'
+                     'scope=repository%3Acharts%2Fnginx%3Apull')])
+
+    @mock.patch('helm_sdk.Helm.execute')
+    def test_push_skips_existing_chart(self, execute):
+        remote = 'oci://{0}/charts'.format(self.host)
+        manifest = '/v2/charts/nginx/manifests/1.0.0'
+        RegistryHandler.layers[manifest] = 'sha256:other'
+        self.helm.push(self.archive, remote, self.plain_http)
+        execute.assert_any_call(
+            ['/tmp/helm', 'push', self.archive, remote, '--plain-http'],
+            additional_args=None)
+        execute.reset_mock()
+        RegistryHandler.layers[manifest] = archive_digest(self.archive)
+        self.helm.push(self.archive, remote, self.plain_http)
+        self.assertEqual(self.commands(execute, 'push'), [])
+        self.assertIn(('HEAD', manifest), RegistryHandler.requests)
+
+    @mock.patch('helm_sdk.Helm.execute')
+    def test_pull_skips_existing_chart(self, execute):
+        chart = 'oci://{0}/charts/nginx'.format(self.host)
+        flags = self.plain_http + [
+            {'name': 'version', 'value': '1.0.0'},
+            {'name': 'destination', 'value': self.temp_dir}]
+        RegistryHandler.layers['/v2/charts/nginx/manifests/1.0.0'] = \
+            archive_digest(self.archive)
+        self.helm.pull(chart, flags)
+        self.assertEqual(self.commands(execute, 'pull'), [])
+        # Not an exact version.
+        self.helm.pull(chart, flags[:1] + [
+            {'name': 'version', 'value': '^1.0'}] + flags[2:])
+        self.assertEqual(len(self.commands(execute, 'pull')), 1)
+        with open(self.archive, 'ab') as archive:
+            archive.write(b'changed')
+        self.helm.pull(chart, flags)
+        self.assertEqual(len(self.commands(execute, 'pull')), 2)
+
+    @mock.patch('helm_sdk.Helm.execute')
+    def test_pull_skips_untarred_chart(self, execute):
+        with tarfile.open(self.archive) as tar:
+            tar.extractall(os.path.join(self.temp_dir, 'charts'))
+        flags = [{'name': 'untar'},
+                 {'name': 'untardir', 'value': 'charts'},
+                 {'name': 'destination', 'value': self.temp_dir},
+                 {'name': 'version', 'value': '1.0.0'}]
+        self.helm.pull('example/nginx', flags)
+        self.assertEqual(self.commands(execute, 'pull'), [])
+        flags[-1]['value'] = '1.1.0'
+        self.helm.pull('example/nginx', flags)
+        self.assertEqual(len(self.commands(execute, 'pull')), 1)
@@ -0,0 +1,99 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import mock
+import unittest
+
+from helm_sdk.rate_limit import (
+    retry_after,
+    limited_call,
+    cluster_limiter,
+    AdaptiveRateLimiter)
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class Throttled(Exception):
+    status = 429
+    headers = {'Retry-After': '2'}
+
+
+class RateLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        super(RateLimitTest, self).setUp()
+        self.clock = Clock()
+
+    def limiter(self, rate=10.0, burst=2):
+        return AdaptiveRateLimiter(rate, burst, clock=self.clock,
+                                   sleep=self.clock.sleep)
+
+    def test_token_bucket(self):
+        limiter = self.limiter()
+        self.assertEqual(limiter.acquire(), 0)
+        self.assertEqual(limiter.acquire(), 0)
+        self.assertAlmostEqual(limiter.acquire(), 0.1)
+        self.clock.now += 10
+        # The bucket holds at most burst tokens.
+        limiter.acquire()
+        limiter.acquire()
+        self.assertAlmostEqual(limiter.acquire(), 0.1)
+
+    def test_aimd(self):
+        limiter = self.limiter()
+        limiter.success()
+        self.assertAlmostEqual(limiter.rate, 10.1)
+        limiter.throttled()
+        self.assertAlmostEqual(limiter.rate, 5.05)
+        # Concurrent throttled responses decrease the rate once.
+        limiter.throttled()
+        self.assertAlmostEqual(limiter.rate, 5.05)
+        self.clock.now += 1
+        limiter.throttled(3)
+        self.assertAlmostEqual(limiter.rate, 2.525)
+        self.assertAlmostEqual(limiter.acquire(), 3)
+
+    def test_limited_call_retries_throttled(self):
+        limiter = self.limiter()
+        fn = mock.Mock(side_effect=[Throttled(), 'result'])
+        self.assertEqual(limited_call(limiter, fn, 'name'), 'result')
+        fn.assert_called_with('name')
+        self.assertGreaterEqual(self.clock.now, 2)
+        fn = mock.Mock(side_effect=ValueError('not found'))
+        self.assertRaises(ValueError, limited_call, limiter, fn)
+        fn.assert_called_once()
+
+    def test_retry_after(self):
+        self.assertEqual(retry_after({'Retry-After': '5'}), 5)
+        self.assertEqual(retry_after({'Retry-After': '600'}), 60)
+        self.assertEqual(
+            retry_after({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}), 0)
+        self.assertIsNone(retry_after(None))
+
+    def test_cluster_limiter_shared(self):
+        self.assertIs(cluster_limiter('https://a'),
+                      cluster_limiter('https://a'))
+        self.assertIsNot(cluster_limiter('https://a'),
+                         cluster_limiter('https://b'))
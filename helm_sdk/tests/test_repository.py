@@ -0,0 +1,151 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import os
+import gzip
+import mock
+import yaml
+import logging
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from helm_sdk import Helm
+from helm_sdk.repository import refresh_index
+from helm_sdk.exceptions import CloudifyHelmSDKError
+
+INDEX = b"""apiVersion: v1
+entries:
+  mariadb:
+  - apiVersion: v2
+    name: mariadb
+    version: 11.0.0
+  nginx:
+  - apiVersion: v2
+    name: nginx
+    version: 15.0.0
+generated: "2023-06-01T00:00:00Z"
+"""
+
+
+class IndexHandler(BaseHTTPRequestHandler):
+    index = INDEX
+    etag = '"v1"'
+    requests = []
+
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self):
+        self.requests.append((self.path, dict(self.headers)))
+        if self.path != '/charts/index.yaml':
+            self.send_error(404)
+            return
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = self.index
+        self.send_response(200)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class RepositoryTest(unittest.TestCase):
+
+    def setUp(self):
+        super(RepositoryTest, self).setUp()
+        IndexHandler.requests = []
+        IndexHandler.etag = '"v1"'
+        self.server = HTTPServer(('127.0.0.1', 0), IndexHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://127.0.0.1:{0}/charts/'.format(
+            self.server.server_port)
+        self.cache_home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_home)
+
+    def test_refresh_index_conditional(self):
+        helm = Helm(None, '/tmp/helm', {'HELM_CACHE_HOME': self.cache_home})
+        result = helm.refresh_repo_index('example', self.url)
+        path = os.path.join(self.cache_home, 'repository',
+                            'example-index.yaml')
+        self.assertTrue(result.modified)
+        self.assertEqual(result.path, path)
+        self.assertEqual(result.size, len(INDEX))
+        with open(path, 'rb') as index_file:
+            self.assertEqual(index_file.read(), INDEX)
+        with open(os.path.join(self.cache_home, 'repository',
+                               'example-charts.txt')) as charts_file:
+            self.assertEqual(charts_file.read(), 'mariadb\nnginx')
+        self.assertNotIn('If-None-Match', IndexHandler.requests[0][1])
+
+        # Unchanged index: 304, the cached index is kept.
+        result = helm.refresh_repo_index('example', self.url)
+        self.assertFalse(result.modified)
+        self.assertEqual(IndexHandler.requests[1][1]['If-None-Match'],
+                         '"v1"')
+
+        # Changed index is downloaded again.
+        IndexHandler.etag = '"v2"'
+        self.assertTrue(helm.refresh_repo_index('example', self.url).modified)
+
+    def test_repo_update_conditional(self):
+        config_home = os.path.join(self.cache_home, 'config')
+        os.makedirs(config_home)
+        with open(os.path.join(config_home, 'repositories.yaml'), 'w') as f:
+            yaml.safe_dump({'repositories': [
+                {'name': 'example', 'url': self.url},
+                {'name': 'private', 'url': self.url,
+                 'username': 'user', 'password': 'secret'}]}, f)
+        helm = Helm(logging.getLogger('helm_log'), '/tmp/helm',
+                    {'HELM_CACHE_HOME': self.cache_home,
+                     'HELM_CONFIG_HOME': config_home})
+        path = os.path.join(self.cache_home, 'repository',
+                            'example-index.yaml')
+        with mock.patch.object(helm, 'execute') as execute:
+            results = helm.repo_update(flags=[], names=['example'])
+            self.assertTrue(results['example'].modified)
+            os.utime(path, (1, 1))
+            # Unchanged index: 304, the index file is not rewritten.
+            results = helm.repo_update(flags=[], names=['example'])
+            self.assertFalse(results['example'].modified)
+            self.assertEqual(os.stat(path).st_mtime, 1)
+            execute.assert_not_called()
+            # Repositories with credentials are updated by helm.
+            with mock.patch.object(helm, 'get_helm_version',
+                                   return_value='3.12.0'):
+                results = helm.repo_update(flags=[])
+            self.assertFalse(results['example'].modified)
+            self.assertIsNone(results['private'])
+            execute.assert_called_with(
+                ['/tmp/helm', 'repo', 'update'], additional_args=None)
+
+    def test_refresh_index_errors(self):
+        self.assertRaisesRegex(CloudifyHelmSDKError, '404', refresh_index,
+                               'example', self.url + 'missing/',
+                               self.cache_home)
+        self.assertFalse(os.path.exists(os.path.join(
+            self.cache_home, 'repository', 'example-index.yaml')))
@@ -0,0 +1,147 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import json
+import mock
+import logging
+import unittest
+
+from cloudify_common_sdk.processes import ProcessException
+
+from helm_sdk import Helm
+from helm_sdk.deadline import Deadline
+from helm_sdk.retry import RetryPolicy, is_transient, is_unauthorized
+from helm_sdk.circuit_breaker import CircuitOpenError
+
+DEPLOYED = json.dumps({'name': 'release',
+                       'info': {'status': 'deployed'},
+                       'version': 1})
+
+
+def helm_error(stderr, exit_code=1):
+    return ProcessException('helm', exit_code, stderr=stderr)
+
+
+TIMED_OUT = helm_error('Error: etcdserver: request timed out')
+NOT_FOUND = helm_error('Error: release: not found')
+
+
+class RetryTest(unittest.TestCase):
+
+    def setUp(self):
+        super(RetryTest, self).setUp()
+        self.sleep = mock.Mock()
+        self.policy = RetryPolicy(sleep=self.sleep, jitter=lambda: 0.5)
+        self.helm = Helm(logging.getLogger('helm_log'), '/tmp/helm', {},
+                         retry_policy=self.policy)
+
+    @staticmethod
+    def by_command(results):
+        # Results of each helm command, in order, other commands like
+        # chmod succeed.
+        def execute(command, **_):
+            if command[1] not in results:
+                return ''
+            result = results[command[1]].pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return execute
+
+    def test_is_transient(self):
+        self.assertTrue(is_transient(TIMED_OUT))
+        self.assertTrue(is_transient(helm_error(
+            'Error: UPGRADE FAILED: another operation '
+            '(install/upgrade/rollback) is in progress')))
+        self.assertTrue(is_transient(helm_error(
+            'Error: Kubernetes cluster unreachable: read: '
+            'connection reset by peer')))
+        self.assertFalse(is_transient(NOT_FOUND))
+        # Killed when it ran out of time.
+        self.assertFalse(is_transient(
+            helm_error('Error: etcdserver: request timed out', -9)))
+        self.assertFalse(is_transient(CircuitOpenError('open')))
+
+    def test_is_unauthorized(self):
+        self.assertTrue(is_unauthorized(helm_error(
+            'Error: Kubernetes cluster unreachable: the server has asked '
+            'for the client to provide credentials')))
+        self.assertTrue(is_unauthorized(
+            helm_error('error: You must be logged in to the server '
+                       '(Unauthorized)')))
+        self.assertTrue(is_unauthorized(mock.Mock(status=401)))
+        self.assertFalse(is_unauthorized(TIMED_OUT))
+
+    @mock.patch('helm_sdk.Helm.execute')
+    def test_status_retried(self, execute):
+        execute.side_effect = self.by_command(
+            {'status': [TIMED_OUT, TIMED_OUT, DEPLOYED]})
+        state = self.helm.status('release', token='abc',
+                                 apiserver='https://1.0.0.0')
+        self.assertEqual(state['info']['status'], 'deployed')
+        self.assertEqual(self.sleep.call_args_list,
+                         [mock.call(0.5), mock.call(1.0)])
+        self.assertEqual(self.policy.counts(), {'status': {
+            'calls': 1, 'retries': 2, 'recovered': 1, 'exhausted': 0}})
+
+    @mock.patch('helm_sdk.Helm.execute')
+    def test_retries_exhausted(self, execute):
+        execute.side_effect = self.by_command({'status': [TIMED_OUT] * 3})
+        with self.assertRaises(ProcessException):
+            self.helm.status('release', token='abc',
+                             apiserver='https://1.0.0.0')
+        self.assertEqual(self.policy.counts()['status']['exhausted'], 1)
+
+    @mock.patch('helm_sdk.Helm.execute')
+    def test_no_backoff_past_deadline(self, execute):
+        self.helm.deadline = Deadline(1.2)
+        execute.side_effect = self.by_command(
+            {'status': [TIMED_OUT, DEPLOYED]})
+        with self.assertRaises(ProcessException):
+            self.helm.status('release', token='abc',
+                             apiserver='https://1.0.0.0')
+        self.sleep.assert_not_called()
+
+    @mock.patch('helm_sdk.Helm.execute')
+    def test_upgrade_not_retried(self, execute):
+        execute.side_effect = self.by_command({'upgrade': [TIMED_OUT]})
+        with self.assertRaises(ProcessException):
+            self.helm.upgrade('release', chart='example/chart',
+                              token='abc', apiserver='https://1.0.0.0')
+        self.sleep.assert_not_called()
+
+    @mock.patch('helm_sdk.Helm.execute')
+    def test_install_verified(self, execute):
+        # The failed install did deploy the release.
+        execute.side_effect = self.by_command(
+            {'install': [TIMED_OUT], 'status': [DEPLOYED]})
+        output = self.helm.install('release', 'example/chart', token='abc',
+                                   apiserver='https://1.0.0.0')
+        self.assertEqual(output['info']['status'], 'deployed')
+        self.sleep.assert_not_called()
+        # The failed install did not create the release.
+        execute.side_effect = self.by_command(
+            {'install': [TIMED_OUT, DEPLOYED], 'status': [NOT_FOUND]})
+        output = self.helm.install('release', 'example/chart', token='abc',
+                                   apiserver='https://1.0.0.0')
+        self.assertEqual(output['info']['status'], 'deployed')
+        self.sleep.assert_called_once_with(0.5)
+        # The release is left in another state.
+        execute.side_effect = self.by_command(
+            {'install': [TIMED_OUT], 'status': [json.dumps(
+                {'info': {'status': 'pending-install'}})]})
+        with self.assertRaises(ProcessException):
+            self.helm.install('release', 'example/chart', token='abc',
+                              apiserver='https://1.0.0.0')
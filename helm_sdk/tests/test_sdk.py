@@ -151,6 +151,22 @@ class HelmSDKTest(HelmTestBase):
             cmd_expected,
             additional_args=None)
 
+    def test_repo_update(self):
+        mock_execute = mock.Mock()
+        self.helm.execute = mock_execute
+        with mock.patch.object(self.helm, 'get_helm_version',
+                               return_value='3.12.0'):
+            self.helm.repo_update(flags=[], names=['bitnami'])
+        mock_execute.assert_any_call(
+            [HELM_BINARY, 'repo', 'update', 'bitnami'],
+            additional_args=None)
+        # helm before 3.7 updates all repositories.
+        with mock.patch.object(self.helm, 'get_helm_version',
+                               return_value='3.6.3'):
+            self.helm.repo_update(flags=[], names=['bitnami'])
+        mock_execute.assert_called_with(
+            [HELM_BINARY, 'repo', 'update'], additional_args=None)
+
     def test_upgrade_with_token_and_api(self):
         mock_execute = mock.Mock()
         mock_execute.return_value = json.dumps(mock_install_response)
@@ -183,6 +199,40 @@ class HelmSDKTest(HelmTestBase):
             return_output=True
         )
 
+    def test_upgrade_with_set_values_as_file(self):
+        mock_execute = mock.Mock(return_value='{"name":"release1"}')
+        self.helm.execute = mock_execute
+        with mock.patch('helm_sdk.set_values_file',
+                        return_value='/tmp/set-values.yaml') as values_file:
+            self.helm.upgrade('release1',
+                              'example/mariadb',
+                              mock_flags,
+                              mock_set_args,
+                              kubeconfig='/path/to/config',
+                              set_values_as_file=True)
+        values_file.assert_called_once_with(mock_set_args)
+        cmd_expected = [HELM_BINARY, 'upgrade', 'release1', 'example/mariadb',
+                        '--atomic', '-o=json', '--kubeconfig=/path/to/config',
+                        '--dry-run', '--timeout=100',
+                        '--values=/tmp/set-values.yaml']
+        mock_execute.assert_any_call(cmd_expected,
+                                     additional_args=None,
+                                     return_output=True)
+
+    def test_pull_removes_unsupported_flags(self):
+        mock_execute = mock.Mock()
+        self.helm.execute = mock_execute
+        self.helm.pull('example/mariadb',
+                       [{'name': 'untar'},
+                        {'name': 'wait'},
+                        {'name': 'timeout', 'value': '100'},
+                        {'name': 'version', 'value': '1.0.0'},
+                        {'name': 'untar'}])
+        mock_execute.assert_any_call(
+            [HELM_BINARY, 'pull', 'example/mariadb', '--untar',
+             '--version=1.0.0'],
+            additional_args=None)
+
     def test_upgrade_with_kubeconfig(self):
         mock_execute = mock.Mock(return_value='{"name":"release1"}')
         self.helm.execute = mock_execute
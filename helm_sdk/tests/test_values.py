@@ -0,0 +1,73 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import mock
+import yaml
+import shutil
+import tempfile
+import unittest
+
+from helm_sdk import values
+from helm_sdk.exceptions import CloudifyHelmSDKError
+
+
+class ValuesTest(unittest.TestCase):
+
+    def test_parse_set_name(self):
+        self.assertEqual(values.parse_set_name('a'), ['a'])
+        self.assertEqual(values.parse_set_name('a.b.c'), ['a', 'b', 'c'])
+        self.assertEqual(values.parse_set_name('a\\.b.c'), ['a.b', 'c'])
+        self.assertEqual(
+            values.parse_set_name('a.b[1].c'), ['a', 'b', 1, 'c'])
+        self.assertEqual(values.parse_set_name('a[0][1]'), ['a', 0, 1])
+        for name in ['', 'a..b', 'a[x]', '[0]']:
+            self.assertRaises(
+                CloudifyHelmSDKError, values.parse_set_name, name)
+
+    def test_render_set_values(self):
+        rendered = values.render_set_values([
+            {'name': 'image.repository', 'value': 'nginx'},
+            {'name': 'image.tag', 'value': 1.25},
+            {'name': 'ingress.hosts[1].host', 'value': 'b.example.com'},
+            {'name': 'ingress.hosts[0].host', 'value': 'a.example.com'},
+            {'name': 'nodeSelector.kubernetes\\.io/os', 'value': 'linux'},
+            {'name': 'resources', 'value': {'limits': {'cpu': '1'}}},
+            {'name': 'image.tag', 'value': '1.26'},
+        ])
+        self.assertEqual(rendered, {
+            'image': {'repository': 'nginx', 'tag': '1.26'},
+            'ingress': {'hosts': [{'host': 'a.example.com'},
+                                  {'host': 'b.example.com'}]},
+            'nodeSelector': {'kubernetes.io/os': 'linux'},
+            'resources': {'limits': {'cpu': '1'}},
+        })
+
+    def test_render_set_values_missing_value(self):
+        self.assertRaises(CloudifyHelmSDKError,
+                          values.render_set_values, [{'name': 'x'}])
+
+    def test_set_values_file(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        set_values = [{'name': 'a.b', 'value': 'c'}]
+        with mock.patch('helm_sdk.utils.tempfile.gettempdir',
+                        return_value=temp_dir):
+            path = values.set_values_file(set_values)
+            self.assertEqual(values.set_values_file(list(set_values)), path)
+            self.assertNotEqual(
+                values.set_values_file([{'name': 'a.b', 'value': 'd'}]),
+                path)
+        with open(path) as values_file:
+            self.assertEqual(yaml.safe_load(values_file), {'a': {'b': 'c'}})
@@ -16,7 +16,7 @@
 import os
 import json
 import copy
-from cloudify import ctx
+import tempfile
 from cloudify_common_sdk.filters import obfuscate_passwords
 from cloudify_common_sdk.processes import general_executor, process_execution
 from helm_sdk.exceptions import CloudifyHelmSDKError
@@ -114,9 +114,20 @@ def validate_no_collisions_between_params_and_flags(flags):
                 flags_list=FLAGS_LIST_TO_VALIDATE))
 
 
-def validate_flags_for_status(flags):
-    for flag in list(flags):
-        if flag['name'] not in STATUS_FLAGS:
-            ctx.logger.error('Removing flag {} for status check. (This will'
-                             ' not affect install or update.)'.format(flag))
-            flags.remove(flag)
+def write_once(directory, name, content, mode=0o600):
+    """Write content to directory/name unless it's already there.
+    Files are named by their content digest, so an existing file is
+    always up to date.
+    """
+    directory = os.path.join(tempfile.gettempdir(), directory)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # makedirs applies the umask and leaves an existing directory as is.
+    os.chmod(directory, 0o700)
+    path = os.path.join(directory, name)
+    if not os.path.isfile(path):
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(content)
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    return path
@@ -0,0 +1,129 @@
+########
+# Copyright (c) 2019 - 2023 Cloudify Platform Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import re
+import json
+import hashlib
+
+import yaml
+
+from .utils import write_once
+from .exceptions import CloudifyHelmSDKError
+
+SET_VALUES_DIR_NAME = 'cloudify-helm-set-values'
+INDEX_PATTERN = re.compile(r'\[(\d+)\]')
+
+
+def parse_set_name(name):
+    """Split a --set name into keys, the way helm strvals does.
+    'a.b[1].c' -> ['a', 'b', 1, 'c'], dots escaped with a backslash are
+    part of the key, 'a\\.b' -> ['a.b'].
+    """
+    keys = []
+    key = ''
+    position = 0
+    while position < len(name):
+        char = name[position]
+        if char == '\\' and position + 1 < len(name):
+            key += name[position + 1]
+            position += 2
+            continue
+        if char == '.':
+            keys.append(key)
+            key = ''
+        elif char == '[':
+            match = INDEX_PATTERN.match(name, position)
+            if not match:
+                raise CloudifyHelmSDKError(
+                    'Invalid list index in "set" parameter {0}.'.format(name))
+            if key:
+                keys.append(key)
+                key = ''
+            keys.append(int(match.group(1)))
+            position = match.end()
+            if position < len(name) and name[position] == '.':
+                position += 1
+            continue
+        else:
+            key += char
+        position += 1
+    if key:
+        keys.append(key)
+    if not keys or '' in keys or isinstance(keys[0], int):
+        raise CloudifyHelmSDKError(
+            'Invalid "set" parameter name {0}.'.format(name))
+    return keys
+
+
+def _empty_like(key):
+    return [] if isinstance(key, int) else {}
+
+
+def _set_in(values, keys, value):
+    current = values
+    for key, next_key in zip(keys, keys[1:] + [None]):
+        child = value if next_key is None else _empty_like(next_key)
+        if isinstance(key, int):
+            if not isinstance(current, list):
+                raise CloudifyHelmSDKError(
+                    'Conflicting "set" parameters, expected a list.')
+            current.extend([None] * (key + 1 - len(current)))
+            if next_key is not None and \
+                    isinstance(current[key], type(child)):
+                child = current[key]
+            current[key] = child
+        else:
+            if not isinstance(current, dict):
+                raise CloudifyHelmSDKError(
+                    'Conflicting "set" parameters, expected a map.')
+            if next_key is not None and \
+                    isinstance(current.get(key), type(child)):
+                child = current[key]
+            current[key] = child
+        current = child
+
+
+def render_set_values(set_values):
+    """Render a set_values list into a nested values dictionary.
+    Values keep their type, unlike --set which parses them as strings.
+    Unlike --set, lists in the overlay replace the lists of previous
+    values files instead of setting single items.
+    :param set_values: list of dictionaries with name and value.
+    :return values dictionary.
+    """
+    values = {}
+    for set_dict in set_values:
+        try:
+            name, value = set_dict['name'], set_dict['value']
+        except KeyError:
+            raise CloudifyHelmSDKError(
+                "\"set\" parameter name or value is missing.")
+        _set_in(values, parse_set_name(name), value)
+    return values
+
+
+def set_values_file(set_values):
+    """Write set_values as a values overlay file, for --values.
+    Files are named by the digest of set_values, so identical overrides
+    reuse the same file.
+    :param set_values: list of dictionaries with name and value.
+    :return path of the values file.
+    """
+    digest = hashlib.sha256(json.dumps(
+        set_values, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    content = yaml.safe_dump(
+        render_set_values(set_values), default_flow_style=False)
+    return write_once(
+        SET_VALUES_DIR_NAME, digest + '.yaml', content.encode('utf-8'))